@@ -44,8 +44,9 @@ def filesystemstore_home(sse_endpoint: str, event_name: str, file_entries: List[
         </div>
     """
 
-def filesystemstore_viewer(content: str, box_header: str):
+def filesystemstore_viewer(content: str, box_header: str, download_endpoint: str = None):
+    download_link = f'<a href="{ download_endpoint }" download>Download</a>' if download_endpoint is not None else ""
     return f"""
-        <div class="block">{ box_header }</div>
+        <div class="block">{ box_header } { download_link }</div>
         <div class="block box">{ content }</div>
     """
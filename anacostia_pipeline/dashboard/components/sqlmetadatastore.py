@@ -111,6 +111,7 @@ def sqlmetadatastore_metrics_table(metrics: List[Dict[str, str]], metrics_endpoi
                     <th>Run ID</th>
                     <th>Metric</th>
                     <th>Value</th>
+                    <th>Step</th>
                 </tr>
             </thead>
             <tbody>
@@ -122,6 +123,7 @@ def sqlmetadatastore_metrics_table(metrics: List[Dict[str, str]], metrics_endpoi
                             <td>{ metric["run_id"] }</td>
                             <td>{ metric["key"] }</td>
                             <td>{ metric["value"] }</td>
+                            <td>{ metric.get("step") }</td>
                         </tr>
                         ''' for metric in metrics
                     ])
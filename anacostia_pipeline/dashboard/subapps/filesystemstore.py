@@ -1,6 +1,8 @@
 from fastapi import Request
 from fastapi.responses import HTMLResponse, StreamingResponse
 import asyncio
+import html
+import os
 from typing import List, Dict, Tuple, Union
 
 from anacostia_pipeline.dashboard.subapps.basenode import BaseNodeApp
@@ -10,13 +12,19 @@ from ..components.utils import format_html_for_sse
 
 
 class FilesystemStoreNodeApp(BaseNodeApp):
-    def __init__(self, node, use_default_file_renderer: str = True, *args, **kwargs):
+    def __init__(self, node, use_default_file_renderer: str = True, page_size: int = 100, preview_bytes: int = 64 * 1024, *args, **kwargs):
         super().__init__(node, use_default_router=False, *args, **kwargs)
 
         self.event_source = f"{self.get_prefix()}/table_update_events"
         self.event_name = "TableUpdate"
 
-        self.displayed_file_entries = None
+        # only the most recent page_size entries are loaded when the page is opened;
+        # after that, the table is updated by following the change feed of the metadata store from change_cursor
+        self.page_size = page_size
+        self.change_cursor = 0
+
+        # the file viewer only reads the first preview_bytes bytes of a file; the whole file is streamed by /download_file
+        self.preview_bytes = preview_bytes
 
         def format_file_entries(file_entries: Union[List[Dict], Dict]) -> Union[List[Dict], Dict]:
             # adding on file_display_endpoint to each entry to get the contents of the file when user clicks on row 
@@ -41,9 +49,9 @@ class FilesystemStoreNodeApp(BaseNodeApp):
 
         @self.get("/home", response_class=HTMLResponse)
         async def endpoint(request: Request):
-            file_entries = self.node.metadata_store.get_entries()
-            self.displayed_file_entries = file_entries
-            file_entries.reverse()
+            # read the cursor before the entries so that no change made in between is missed
+            self.change_cursor = self.node.metadata_store.latest_change_cursor()
+            file_entries = self.node.metadata_store.query_entries(self.node, limit=self.page_size, descending=True)["rows"]
             file_entries = format_file_entries(file_entries)
 
             return filesystemstore_home(
@@ -55,21 +63,42 @@ class FilesystemStoreNodeApp(BaseNodeApp):
         @self.get("/table_update_events", response_class=HTMLResponse)
         async def samples(request: Request):
 
+            # each connection follows the change feed with its own cursor
+            cursor = self.change_cursor
+
             def get_table_update_events() -> Tuple[List[Dict]]:
-                file_entries = self.node.metadata_store.get_entries()
+                nonlocal cursor
+                metadata_store = self.node.metadata_store
+
+                feed = metadata_store.changes_since(cursor, limit=self.page_size, resource_node=self.node, tables=["samples", "runs"])
+                cursor = feed["cursor"]
+
+                inserted_ids = []
+                updated_ids = []
+                run_changed = False
+                for change in feed["changes"]:
+                    if change["table_name"] == "runs":
+                        run_changed = True
+                    elif change["operation"] == "insert":
+                        inserted_ids.append(change["row_id"])
+                    elif change["operation"] == "update" and change["row_id"] not in inserted_ids and change["row_id"] not in updated_ids:
+                        updated_ids.append(change["row_id"])
+
+                # when the metadata store derives the state of samples from their run (the 'run_range' state model),
+                # starting or ending a run changes the state of samples without updating their rows, so the displayed page is refreshed
+                if run_changed is True:
+                    displayed_rows = metadata_store.query_entries(self.node, limit=self.page_size, descending=True)["rows"]
+                    for row in displayed_rows:
+                        if row["id"] not in inserted_ids and row["id"] not in updated_ids:
+                            updated_ids.append(row["id"])
 
                 added_rows = []
-                entry_ids = [displayed_entry["id"] for displayed_entry in self.displayed_file_entries]
-                for retrieved_entry in file_entries:
-                    if retrieved_entry["id"] not in entry_ids:
-                        added_rows.append(retrieved_entry)
+                if len(inserted_ids) > 0:
+                    added_rows = metadata_store.query_entries(self.node, ids=inserted_ids, limit=len(inserted_ids))["rows"]
 
                 state_changes = []
-                for displayed_entry, retrieved_entry in zip(self.displayed_file_entries, file_entries):
-                    if displayed_entry["state"] != retrieved_entry["state"]:
-                        state_changes.append(retrieved_entry)
-                
-                self.displayed_file_entries = file_entries
+                if len(updated_ids) > 0:
+                    state_changes = metadata_store.query_entries(self.node, ids=updated_ids, limit=len(updated_ids))["rows"]
                 
                 return added_rows, state_changes
             
@@ -113,7 +142,39 @@ class FilesystemStoreNodeApp(BaseNodeApp):
             @self.get("/retrieve_file", response_class=HTMLResponse)
             async def sample(request: Request, file_id: int):
                 artifact_path = self.node.get_artifact(file_id)["location"]
-                content = self.node.load_artifact(artifact_path)
-                x = filesystemstore_viewer(content, f"Content of {artifact_path}")
+                size = os.path.getsize(artifact_path)
+
+                # compressed artifacts are previewed decompressed; previews are cached, so a file is not read again on every click
+                def _load_preview() -> bytes:
+                    chunks = self.node.iter_artifact_chunks(artifact_path, chunk_size=self.preview_bytes, end=self.preview_bytes, decompress=True)
+                    return b"".join(chunks)
+
+                if self.node.artifact_cache is not None:
+                    preview = self.node.artifact_cache.get_or_load(artifact_path, _load_preview, kind=f"preview:{self.preview_bytes}")
+                else:
+                    preview = _load_preview()
+
+                if b"\x00" in preview:
+                    content = f"Binary file ({size} bytes stored)"
+                else:
+                    content = html.escape(preview.decode("utf-8", errors="replace"))
+                    if len(preview) == self.preview_bytes:
+                        content += f"\n... (showing the first {len(preview)} bytes, {size} bytes stored)"
+
+                download_endpoint = f"{self.get_prefix()}/download_file?file_id={file_id}"
+                x = filesystemstore_viewer(f"<pre>{content}</pre>", f"Content of {artifact_path}", download_endpoint)
                 return x
+
+        @self.get("/download_file")
+        async def download_file(request: Request, file_id: int):
+            # the file is streamed in chunks, so files larger than memory can be downloaded
+            artifact_path = self.node.get_artifact(file_id)["location"]
+            return StreamingResponse(
+                self.node.iter_artifact_chunks(artifact_path),
+                media_type="application/octet-stream",
+                headers={
+                    "Content-Disposition": f'attachment; filename="{os.path.basename(artifact_path)}"',
+                    "Content-Length": str(os.path.getsize(artifact_path))
+                }
+            )
     
\ No newline at end of file
@@ -7,12 +7,15 @@ from ..components.sqlmetadatastore import *
 
 
 class SqliteMetadataStoreApp(BaseNodeApp):
-    def __init__(self, node, *args, **kwargs):
+    def __init__(self, node, page_size: int = 100, *args, **kwargs):
         # Create backend server for node by inheriting the BaseNodeApp (i.e., overriding the default router).
         # IMPORTANT: set use_default_router=False to prevent the default /home route from being used
         # after the super().__init__() call inside the constructor
         super().__init__(node, use_default_router=False, *args, **kwargs)
 
+        # the tables are refreshed every second, so only the most recent page_size rows of each table are queried and displayed
+        self.page_size = page_size
+
         self.data_options = {
             "runs": f"{self.get_prefix()}/runs",
             "metrics": f"{self.get_prefix()}/metrics",
@@ -23,7 +26,7 @@ class SqliteMetadataStoreApp(BaseNodeApp):
 
         @self.get("/home", response_class=HTMLResponse)
         async def endpoint(request: Request):
-            runs = self.node.get_runs()
+            runs = self.node.query_runs(limit=self.page_size, descending=True)["rows"]
             for run in runs:
                 run['start_time'] = run['start_time'].strftime("%m/%d/%Y, %H:%M:%S")
                 if run['end_time'] is not None:
@@ -33,7 +36,7 @@ class SqliteMetadataStoreApp(BaseNodeApp):
         
         @self.get("/runs", response_class=HTMLResponse)
         async def runs(request: Request):
-            runs = self.node.get_runs()
+            runs = self.node.query_runs(limit=self.page_size, descending=True)["rows"]
             for run in runs:
                 run['start_time'] = run['start_time'].strftime("%m/%d/%Y, %H:%M:%S")
                 if run['end_time'] is not None:
@@ -43,7 +46,7 @@ class SqliteMetadataStoreApp(BaseNodeApp):
         
         @self.get("/samples", response_class=HTMLResponse)
         async def samples(request: Request):
-            samples = self.node.get_entries(resource_node="all", state="all")
+            samples = self.node.query_entries(resource_node="all", state="all", limit=self.page_size, descending=True)["rows"]
             for sample in samples:
                 sample['created_at'] = sample['created_at'].strftime("%m/%d/%Y, %H:%M:%S")
                 if sample['end_time'] is not None:
@@ -53,15 +56,15 @@ class SqliteMetadataStoreApp(BaseNodeApp):
         
         @self.get("/metrics", response_class=HTMLResponse)
         async def metrics(request: Request):
-            rows = self.node.get_metrics(resource_node="all", state="all")
+            rows = self.node.query_metrics(limit=self.page_size, descending=True)["rows"]
             return sqlmetadatastore_metrics_table(rows, self.data_options["metrics"])
         
         @self.get("/params", response_class=HTMLResponse)
         async def params(request: Request):
-            rows = self.node.get_params(resource_node="all", state="all")
+            rows = self.node.query_params(limit=self.page_size, descending=True)["rows"]
             return sqlmetadatastore_params_table(rows, self.data_options["params"])
 
         @self.get("/tags", response_class=HTMLResponse)
         async def tags(request: Request):
-            rows = self.node.get_tags(resource_node="all", state="all")
+            rows = self.node.query_tags(limit=self.page_size, descending=True)["rows"]
             return sqlmetadatastore_tags_table(rows, self.data_options["tags"])
\ No newline at end of file
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import os
+import json
 from threading import Thread, Lock, RLock
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Iterator, TYPE_CHECKING
 import time
 from logging import Logger
 from datetime import datetime
@@ -12,7 +13,11 @@ from pydantic import BaseModel, ConfigDict
 
 from .constants import Status, Result, Work
 from .utils import Signal, SignalTable
-from ..dashboard.subapps.basenode import BaseNodeApp
+
+# note: the dashboard (FastAPI and Starlette) is only imported when get_app() is called,
+# so pipelines that never serve the dashboard do not pay for loading the web stack
+if TYPE_CHECKING:
+    from ..dashboard.subapps.basenode import BaseNodeApp
 
 
 
@@ -57,7 +62,8 @@ class BaseNode(Thread):
 
         super().__init__(name=name)
     
-    def get_app(self):
+    def get_app(self) -> BaseNodeApp:
+        from ..dashboard.subapps.basenode import BaseNodeApp
         return BaseNodeApp(self)
 
     def __hash__(self) -> int:
@@ -260,13 +266,18 @@ class BaseMetadataStoreNode(BaseNode):
         self,
         name: str,
         uri: str,
-        loggers: Union[Logger, List[Logger]] = None
+        loggers: Union[Logger, List[Logger]] = None,
+        manifest_path: str = None
     ) -> None:
     
         super().__init__(name, predecessors=[], loggers=loggers)
         self.uri = uri
         self.run_id = 0
         self.resource_lock = RLock()
+
+        # when manifest_path is given, a read-only manifest of the 'current' entries of every resource node is written when a run starts
+        # (manifest_path/run_<run_id>/<node name>.jsonl), so what a run used can be read back later without querying the samples
+        self.manifest_path = os.path.abspath(manifest_path) if manifest_path is not None else None
     
     def resource_uri(self, r_node: BaseResourceNode):
         raise NotImplementedError
@@ -289,10 +300,49 @@ class BaseMetadataStoreNode(BaseNode):
     def create_resource_tracker(self, resource_node: 'BaseResourceNode') -> None:
         raise NotImplementedError
     
+    @metadata_accessor
+    def allocate_sequence(self, resource_node: 'BaseResourceNode', count: int = 1) -> int:
+        """
+        Override to reserve count consecutive values of a persistent, monotonically increasing per-node sequence; returns the first value.
+        """
+        raise NotImplementedError
+
     @metadata_accessor
     def create_entry(self, resource_node: 'BaseResourceNode', **kwargs) -> None:
         raise NotImplementedError
 
+    @metadata_accessor
+    def create_entries(
+        self, resource_node: 'BaseResourceNode', filepaths: List[str], state: str = "new", run_id: int = None, skip_existing: bool = True,
+        batch_size: int = 10000, content_hashes: List[str] = None, codec: str = None
+    ) -> int:
+        """
+        Override to record many files in large batches of batch_size files; returns the number of entries created.
+        content_hashes holds the content hash of every file (None if the files are not hashed), codec is the codec the files are compressed with.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def get_entry_by_location(self, resource_node: 'BaseResourceNode', filepath: str) -> dict:
+        """
+        Override to return the entry of the resource node for the file at filepath, or None if the file is not recorded.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def find_entries_by_hash(self, resource_node: 'BaseResourceNode', content_hash: str) -> List[dict]:
+        """
+        Override to return the entries of the resource node whose content hash is content_hash.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def known_hashes(self, resource_node: 'BaseResourceNode', content_hashes: List[str]) -> set:
+        """
+        Override to return the subset of content_hashes that the resource node has already recorded.
+        """
+        raise NotImplementedError
+
     @metadata_accessor
     def get_entries(self, resource_node: 'BaseResourceNode') -> List[dict]:
         pass
@@ -305,10 +355,139 @@ class BaseMetadataStoreNode(BaseNode):
     def get_num_entries(self, resource_node: 'BaseResourceNode') -> int:
         pass
 
+    @metadata_accessor
+    def delete_entries(self, resource_node: 'BaseResourceNode', entry_ids: List[int]) -> int:
+        """
+        Override to delete the entries with the given ids in as few transactions as possible; returns the number of entries deleted.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def vacuum(self, max_pages: int = None) -> int:
+        """
+        Override to reclaim the storage freed by deleted entries; returns the number of bytes reclaimed.
+        """
+        return 0
+
+    @metadata_accessor
+    def query_runs(self, run_range: tuple = None, after_id: int = None, limit: int = 100, descending: bool = False) -> dict:
+        """
+        Override to return one page of runs using keyset pagination on the run id.
+        Query methods return a dictionary with the keys 'rows', 'next_cursor' (the after_id of the next page, or None), and 'approximate_total'.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def query_entries(
+        self, resource_node: 'BaseResourceNode' = "all", state: str = "all", run_range: tuple = None, ids: List[int] = None,
+        after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> dict:
+        """
+        Override to return one page of entries (samples) filtered by resource node, state, run range, and ids.
+        """
+        raise NotImplementedError
+
+    @metadata_accessor
+    def query_metrics(self, key: str = None, run_range: tuple = None, after_id: int = None, limit: int = 100, descending: bool = False) -> dict:
+        raise NotImplementedError
+
+    @metadata_accessor
+    def query_params(self, key: str = None, run_range: tuple = None, after_id: int = None, limit: int = 100, descending: bool = False) -> dict:
+        raise NotImplementedError
+
+    @metadata_accessor
+    def query_tags(self, key: str = None, run_range: tuple = None, after_id: int = None, limit: int = 100, descending: bool = False) -> dict:
+        raise NotImplementedError
+
+    @metadata_accessor
+    def latest_change_cursor(self) -> int:
+        raise NotImplementedError
+
+    @metadata_accessor
+    def changes_since(self, cursor: int = 0, limit: int = 1000, resource_node: 'BaseResourceNode' = None, tables: List[str] = None) -> dict:
+        """
+        Override to return the changes made to the metadata store after cursor.
+        Must return a dictionary with the keys 'changes' (a list of changes in sequence order) and 'cursor' (the cursor for the next call).
+        """
+        raise NotImplementedError
+
+    def manifest_file(self, resource_node: 'BaseResourceNode', run_id: int) -> str:
+        return os.path.join(self.manifest_path, f"run_{run_id}", f"{resource_node.name}.jsonl")
+
+    @metadata_accessor
+    def write_manifests(self) -> None:
+        """
+        Writes the manifest of the current run for every resource node: a header line with the run id, the node name, and the number of entries,
+        followed by one line per 'current' entry with its id, location, size in bytes (None if the file is missing), content hash, and codec.
+        A manifest is written to a temporary file, renamed into place, and made read-only; an existing manifest is never rewritten.
+        """
+        if self.manifest_path is None:
+            return
+
+        run_id = self.get_run_id()
+        for successor in self.successors:
+            if isinstance(successor, BaseResourceNode) is False:
+                continue
+
+            manifest_file = self.manifest_file(successor, run_id)
+            if os.path.exists(manifest_file) is True:
+                continue
+            os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+
+            entries = self.get_entries(successor, "current")
+            temp_file = f"{manifest_file}.tmp"
+            with open(temp_file, "w") as f:
+                f.write(json.dumps({"run_id": run_id, "node": successor.name, "num_entries": len(entries)}) + "\n")
+                for entry in entries:
+                    try:
+                        size = os.stat(entry["location"]).st_size
+                    except FileNotFoundError:
+                        size = None
+                    record = {
+                        "id": entry["id"], "location": entry["location"], "size": size, 
+                        "content_hash": entry.get("content_hash"), "codec": entry.get("codec")
+                    }
+                    f.write(json.dumps(record) + "\n")
+            os.chmod(temp_file, 0o444)
+            os.replace(temp_file, manifest_file)
+
+    def iter_manifest(self, resource_node: 'BaseResourceNode', run_id: int = None) -> Iterator[dict]:
+        """
+        Returns an iterator over the entries recorded in the manifest of resource_node for run_id (the current run if run_id is None), in id order;
+        only the manifest file is read. Raises a FileNotFoundError if no manifest was written for the run.
+        Note: the manifest is opened when iter_manifest() is called, so errors are raised here rather than when the iterator is first used;
+        the entries are read lazily, and the file is closed once the iterator is exhausted or garbage collected.
+        """
+        if self.manifest_path is None:
+            raise ValueError(f"metadata store '{self.name}' does not write manifests, set manifest_path to enable them.")
+
+        run_id = self.get_run_id() if run_id is None else run_id
+        f = open(self.manifest_file(resource_node, run_id), "r")
+
+        def entries() -> Iterator[dict]:
+            with f:
+                # the first line is the header of the manifest
+                next(f)
+                for line in f:
+                    yield json.loads(line)
+
+        return entries()
+
     @metadata_accessor
     def log_metrics(self, **kwargs) -> None:
         pass
     
+    @metadata_accessor
+    def log_metric_series(self, key: str, values: list, steps: list = None, wall_times: list = None) -> None:
+        raise NotImplementedError
+
+    @metadata_accessor
+    def get_metric_series(self, run_id: int, key: str) -> dict:
+        """
+        Override to return the series of one metric of a run as a dictionary of NumPy arrays with the keys 'step', 'value', and 'wall_time'.
+        """
+        raise NotImplementedError
+    
     @metadata_accessor
     def log_params(self, **kwargs) -> None:
         pass
@@ -366,6 +545,7 @@ class BaseMetadataStoreNode(BaseNode):
             self.work_list.append(Work.STARTING_RUN)
             self.start_run()
             self.add_run_id()
+            self.write_manifests()
             self.work_list.remove(Work.STARTING_RUN)
 
             # signal to all successors that the run has been created; i.e., begin pipeline execution
@@ -469,6 +649,22 @@ class BaseResourceNode(BaseNode):
     def trigger_condition(self) -> bool:
         return True
 
+    @BaseNode.log_exception
+    def on_run_start(self) -> None:
+        """
+        override to do something after the metadata store has created the run, before the successors are signalled;
+        e.g., start loading the resources of the run in the background.
+        """
+        pass
+
+    @BaseNode.log_exception
+    def on_run_end(self) -> None:
+        """
+        override to do something after the metadata store has ended the run, before the node starts waiting for the next run;
+        e.g., enforce retention policies, release resources held for the run, etc.
+        """
+        pass
+
     def run(self) -> None:
         # if the node is not monitoring the resource, then we don't need to start the observer / monitoring thread
         if self.monitoring is True:
@@ -514,6 +710,9 @@ class BaseResourceNode(BaseNode):
                 time.sleep(0.2)
             self.work_list.remove(Work.WAITING_PREDECESSORS)
 
+            self.trap_interrupts()
+            self.on_run_start()
+
             # signalling to all successors that the resource is ready to be used for the current run
             self.trap_interrupts()
             self.signal_successors(Result.SUCCESS)
@@ -537,6 +736,9 @@ class BaseResourceNode(BaseNode):
                 self.trap_interrupts()
                 time.sleep(0.2)
             self.work_list.remove(Work.WAITING_PREDECESSORS)
+
+            self.trap_interrupts()
+            self.on_run_end()
             
 
 
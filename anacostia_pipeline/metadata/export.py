@@ -0,0 +1,227 @@
+import os
+import json
+from typing import Any, Dict, List
+
+from ..engine.base import BaseMetadataStoreNode
+
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+        import pyarrow.compute
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("RunHistoryExporter requires pyarrow, install it with 'pip install pyarrow'.") from e
+
+def _table_schema(pa, table_name: str):
+    """
+    Returns the schema of an exported table (without the run_id partition column), matching the columns of the metadata stores;
+    the schema is given explicitly because a column that is None in every row of a run (e.g., the step of metrics logged with log_metrics)
+    would otherwise be inferred as null for that partition, and a dataset cannot combine null with the type of the other partitions.
+    """
+    timestamp = pa.timestamp("us")
+    columns = {
+        "runs": [("id", pa.int64()), ("start_time", timestamp), ("end_time", timestamp)],
+        "metrics": [("id", pa.int64()), ("key", pa.string()), ("value", pa.float64()), ("step", pa.int64()), ("wall_time", pa.float64())],
+        "params": [("id", pa.int64()), ("key", pa.string()), ("value", pa.float64())],
+        "tags": [("id", pa.int64()), ("key", pa.string()), ("value", pa.string())],
+        "samples": [
+            ("id", pa.int64()), ("node_id", pa.int64()), ("location", pa.string()), ("state", pa.string()), ("end_time", timestamp),
+            ("created_at", timestamp), ("content_hash", pa.string()), ("codec", pa.string())
+        ],
+    }
+    return pa.schema(columns[table_name])
+
+
+class RunHistoryExporter:
+    """
+    Exports the run history of a metadata store into Parquet files and runs analytical queries over the exported files.
+
+    The export is partitioned by run id (hive-style, e.g., metrics/run_id=12/part-0.parquet) and incremental:
+    each call to export() only exports the runs that ended since the previous call.
+    The queries read the exported files only, so heavy analytics never touch the live metadata store.
+    Requires pyarrow.
+    """
+    TABLES = ("runs", "metrics", "params", "tags", "samples")
+    STATE_FILENAME = "_export_state.json"
+
+    def __init__(self, metadata_store: BaseMetadataStoreNode, export_path: str, page_size: int = 10000) -> None:
+        self.metadata_store = metadata_store
+        self.export_path = os.path.abspath(export_path)
+        self.page_size = page_size
+        os.makedirs(self.export_path, exist_ok=True)
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.export_path, self.STATE_FILENAME)
+
+    def last_exported_run_id(self) -> int:
+        if os.path.exists(self.state_path) is False:
+            return 0
+        with open(self.state_path, "r") as f:
+            return json.load(f)["last_run_id"]
+
+    def _save_state(self, last_run_id: int) -> None:
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"last_run_id": last_run_id}, f)
+        os.replace(temp_path, self.state_path)
+
+    def _read_all(self, query, **kwargs) -> List[Dict[str, Any]]:
+        rows = []
+        after_id = None
+        while True:
+            page = query(after_id=after_id, limit=self.page_size, **kwargs)
+            rows.extend(page["rows"])
+            after_id = page["next_cursor"]
+            if after_id is None:
+                return rows
+
+    def _write_partition(self, table_name: str, run_id: int, rows: List[Dict[str, Any]]) -> None:
+        pa = _import_pyarrow()
+
+        # the run id is encoded in the partition directory, so it is not repeated inside the file (the schema has no run_id column)
+        partition_path = os.path.join(self.export_path, table_name, f"run_id={run_id}")
+        os.makedirs(partition_path, exist_ok=True)
+
+        # note: pyarrow datasets skip files starting with '.', so a partially written file is never read
+        temp_path = os.path.join(partition_path, ".part-0.parquet.tmp")
+        pa.parquet.write_table(pa.Table.from_pylist(rows, schema=_table_schema(pa, table_name)), temp_path)
+        os.replace(temp_path, os.path.join(partition_path, "part-0.parquet"))
+
+    def export(self) -> Dict[str, int]:
+        """
+        Exports every run that has ended since the last export, along with its metrics, params, tags, and samples.
+        Returns the number of rows exported per table.
+        """
+        _import_pyarrow()
+
+        store = self.metadata_store
+        start_run_id = self.last_exported_run_id() + 1
+
+        # stop at the first run that has not ended, so that a run is never skipped by the next export
+        runs = []
+        for run in self._read_all(store.query_runs, run_range=(start_run_id, None)):
+            if run["end_time"] is None:
+                break
+            runs.append(run)
+        ended_run_ids = [run["id"] for run in runs]
+
+        counts = {table_name: 0 for table_name in self.TABLES}
+        if len(ended_run_ids) == 0:
+            return counts
+
+        run_range = (ended_run_ids[0], ended_run_ids[-1])
+        rows_by_table = {
+            "runs": [{**run, "run_id": run["id"]} for run in runs],
+            "metrics": self._read_all(store.query_metrics, run_range=run_range),
+            "params": self._read_all(store.query_params, run_range=run_range),
+            "tags": self._read_all(store.query_tags, run_range=run_range),
+            "samples": self._read_all(store.query_entries, run_range=run_range),
+        }
+
+        for table_name, rows in rows_by_table.items():
+            rows_by_run: Dict[int, List[Dict[str, Any]]] = dict()
+            for row in rows:
+                rows_by_run.setdefault(row["run_id"], []).append(row)
+
+            for run_id, run_rows in rows_by_run.items():
+                self._write_partition(table_name, run_id, run_rows)
+                counts[table_name] += len(run_rows)
+
+        self._save_state(ended_run_ids[-1])
+        return counts
+
+    def read_table(self, table_name: str):
+        """
+        Returns an exported table as a pyarrow.Table, with the run_id partition column restored.
+        """
+        pa = _import_pyarrow()
+
+        if table_name not in self.TABLES:
+            raise ValueError(f"table_name must be one of {self.TABLES}, not '{table_name}'.")
+
+        table_path = os.path.join(self.export_path, table_name)
+        if os.path.exists(table_path) is False:
+            return pa.table({"run_id": pa.array([], type=pa.int64())})
+
+        dataset = pa.dataset.dataset(table_path, format="parquet", partitioning="hive")
+        return dataset.to_table()
+
+    def best_metric_per_run(self, key: str, mode: str = "min"):
+        """
+        Returns a pyarrow.Table with the columns run_id and value holding the best value of metric key for each run.
+        """
+        pa = _import_pyarrow()
+        pc = pa.compute
+
+        if mode not in ("min", "max"):
+            raise ValueError(f"mode must be either 'min' or 'max', not '{mode}'.")
+
+        metrics = self.read_table("metrics")
+        if metrics.num_rows == 0:
+            return pa.table({"run_id": pa.array([], type=pa.int64()), "value": pa.array([], type=pa.float64())})
+
+        metrics = metrics.filter(pc.equal(metrics["key"], key))
+        best = metrics.group_by("run_id").aggregate([("value", mode)])
+        return best.rename_columns(["run_id", "value"]).sort_by("run_id")
+
+    def param_sweep(self, metric_key: str, param_keys: List[str] = None, mode: str = "min"):
+        """
+        Returns a pyarrow.Table with one row per run: the run_id, one column per parameter in param_keys (all parameters by default),
+        and the best value of metric_key for the run. Useful for comparing the results of hyperparameter sweeps.
+        """
+        pa = _import_pyarrow()
+        pc = pa.compute
+
+        result = self.best_metric_per_run(metric_key, mode).rename_columns(["run_id", metric_key])
+
+        params = self.read_table("params")
+        if params.num_rows == 0:
+            return result
+
+        if param_keys is None:
+            param_keys = pc.unique(params["key"]).to_pylist()
+
+        for param_key in param_keys:
+            param = params.filter(pc.equal(params["key"], param_key)).select(["run_id", "value"])
+            param = param.group_by("run_id").aggregate([("value", "max")]).rename_columns(["run_id", param_key])
+            result = result.join(param, keys="run_id", join_type="left outer")
+
+        return result.sort_by("run_id")
+
+    def sample_throughput(self):
+        """
+        Returns a pyarrow.Table with one row per resource node: node_id, num_samples, num_runs, run_seconds (total duration of those runs),
+        and samples_per_second.
+        """
+        pa = _import_pyarrow()
+        pc = pa.compute
+
+        samples = self.read_table("samples")
+        runs = self.read_table("runs")
+        if samples.num_rows == 0 or runs.num_rows == 0:
+            return pa.table({
+                "node_id": pa.array([], type=pa.int64()), "num_samples": pa.array([], type=pa.int64()),
+                "num_runs": pa.array([], type=pa.int64()), "run_seconds": pa.array([], type=pa.float64()),
+                "samples_per_second": pa.array([], type=pa.float64()),
+            })
+
+        durations = pc.divide(
+            pc.cast(pc.subtract(runs["end_time"], runs["start_time"]), pa.duration("us")).cast(pa.int64()),
+            1e6
+        )
+        runs = pa.table({"run_id": runs["run_id"], "run_seconds": durations})
+
+        per_run = samples.group_by(["node_id", "run_id"]).aggregate([("id", "count")]).rename_columns(["node_id", "run_id", "num_samples"])
+        per_run = per_run.join(runs, keys="run_id", join_type="inner")
+
+        per_node = per_run.group_by("node_id").aggregate([
+            ("num_samples", "sum"), ("run_id", "count"), ("run_seconds", "sum")
+        ]).rename_columns(["node_id", "num_samples", "num_runs", "run_seconds"])
+
+        throughput = pc.divide(pc.cast(per_node["num_samples"], pa.float64()), per_node["run_seconds"])
+        return per_node.append_column("samples_per_second", throughput).sort_by("node_id")
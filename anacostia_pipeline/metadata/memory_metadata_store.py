@@ -0,0 +1,616 @@
+from logging import Logger
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence, Set, Tuple, TYPE_CHECKING
+from datetime import datetime
+from threading import Thread, Event, RLock
+import os
+import time
+import pickle
+import bisect
+
+from ..engine.base import BaseMetadataStoreNode, BaseResourceNode
+
+if TYPE_CHECKING:
+    from ..dashboard.subapps.sqlmetadatastore import SqliteMetadataStoreApp
+
+
+
+class SortedIds(dict):
+    """
+    A set of ids (a dictionary with None values) that is read in ascending order with ascending().
+    Ids are almost always added in ascending order and then appended in O(1);
+    an id added out of order (e.g., a sample whose state changed) marks the set unsorted, and the set is sorted again the next time it is read.
+    """
+    __slots__ = ("is_sorted",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.is_sorted = True
+
+    def add(self, item_id: int) -> None:
+        if self.is_sorted is True and len(self) > 0 and item_id not in self and item_id < next(reversed(self)):
+            self.is_sorted = False
+        self[item_id] = None
+
+    def discard(self, item_id: int) -> None:
+        self.pop(item_id, None)
+
+    def ascending(self) -> 'SortedIds':
+        if self.is_sorted is False:
+            item_ids = sorted(self)
+            self.clear()
+            self.update(dict.fromkeys(item_ids))
+            self.is_sorted = True
+        return self
+
+
+class InMemoryMetadataStore(BaseMetadataStoreNode):
+    """
+    Metadata store that keeps runs, samples, metrics, params, tags, and resource trackers in in-process dictionaries.
+    It has the same API as SqliteMetadataStore, but every call is a few dictionary operations instead of a database transaction,
+    which makes it suitable for tests, benchmarks, and latency-sensitive pipelines.
+
+    Samples are indexed by node, by node and state, by node and location, and by node and run,
+    so the calls made at every run boundary and on every detected file never scan the whole store.
+
+    When snapshot_path is given, the store is saved to snapshot_path every snapshot_interval seconds and when the pipeline exits,
+    and setup() reloads the last snapshot, so the store survives restarts (losing at most snapshot_interval seconds of metadata).
+    The change log is not saved in snapshots, only its sequence number, so cursors keep increasing across restarts;
+    it keeps the max_changes most recent changes (None keeps every change).
+    """
+    TABLES = ("nodes", "runs", "samples", "metrics", "params", "tags")
+
+    def __init__(
+        self, name: str, snapshot_path: str = None, snapshot_interval: float = 60.0, loggers: Logger | List[Logger] = None,
+        manifest_path: str = None, max_changes: int = 100000
+    ) -> None:
+        super().__init__(name, uri=snapshot_path if snapshot_path is not None else ":memory:", loggers=loggers, manifest_path=manifest_path)
+        self.max_changes = max_changes
+
+        self.snapshot_path = os.path.abspath(snapshot_path) if snapshot_path is not None else None
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_thread: Thread = None
+        self.snapshot_stop_event = Event()
+
+        self.store_lock = RLock()
+        self.active_run_id = None
+        self.reset()
+
+    # Note: the dashboard of the SQLite store only uses the query API, so it is reused as is
+    def get_app(self) -> 'SqliteMetadataStoreApp':
+        from ..dashboard.subapps.sqlmetadatastore import SqliteMetadataStoreApp
+        return SqliteMetadataStoreApp(self)
+
+    def reset(self) -> None:
+        self.tables: Dict[str, Dict[int, Dict[str, Any]]] = {table_name: dict() for table_name in self.TABLES}
+        self.last_ids: Dict[str, int] = {table_name: 0 for table_name in self.TABLES}
+        self.changes: List[Dict[str, Any]] = []
+        self.last_change_id = 0
+        self.build_indexes()
+
+    def build_indexes(self) -> None:
+        # samples move between the sets of the sample indexes when they are updated, so they are SortedIds read with ascending();
+        # metrics, params, and tags are never updated, dictionaries with None values (insertion-ordered sets) keep their ids in ascending order
+        self.node_ids: Dict[str, int] = dict()
+        self.samples_by_node: Dict[int, SortedIds] = dict()
+        self.samples_by_state: Dict[Tuple[int, str], SortedIds] = dict()
+        self.samples_by_location: Dict[Tuple[int, str], SortedIds] = dict()
+        self.samples_by_run: Dict[Tuple[int, int], SortedIds] = dict()
+        self.samples_by_hash: Dict[Tuple[int, str], SortedIds] = dict()
+        self.rows_by_key: Dict[Tuple[str, str], Dict[int, None]] = dict()
+        self.metric_series: Dict[Tuple[int, str], Dict[int, None]] = dict()
+
+        for node in self.tables["nodes"].values():
+            self.node_ids[node["name"]] = node["id"]
+        for sample in self.tables["samples"].values():
+            self.index_sample(sample)
+        for table_name in ("metrics", "params", "tags"):
+            for row in self.tables[table_name].values():
+                self.index_row(table_name, row)
+
+    def sample_index_keys(self, sample: Dict[str, Any]) -> Dict[str, Hashable]:
+        """
+        Returns the key of sample in every sample index, by name of the index.
+        """
+        node_id = sample["node_id"]
+        keys = {
+            "samples_by_node": node_id, "samples_by_state": (node_id, sample["state"]),
+            "samples_by_location": (node_id, sample["location"]), "samples_by_run": (node_id, sample["run_id"])
+        }
+        if sample.get("content_hash") is not None:
+            keys["samples_by_hash"] = (node_id, sample["content_hash"])
+        return keys
+
+    def index_sample(self, sample: Dict[str, Any], keys: Dict[str, Hashable] = None) -> None:
+        keys = self.sample_index_keys(sample) if keys is None else keys
+        for index_name, key in keys.items():
+            getattr(self, index_name).setdefault(key, SortedIds()).add(sample["id"])
+
+    def unindex_sample(self, sample: Dict[str, Any], keys: Dict[str, Hashable] = None) -> None:
+        keys = self.sample_index_keys(sample) if keys is None else keys
+        for index_name, key in keys.items():
+            getattr(self, index_name)[key].discard(sample["id"])
+
+    def index_row(self, table_name: str, row: Dict[str, Any]) -> None:
+        self.rows_by_key.setdefault((table_name, row["key"]), dict())[row["id"]] = None
+        if table_name == "metrics":
+            self.metric_series.setdefault((row["run_id"], row["key"]), dict())[row["id"]] = None
+
+    def insert(self, table_name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        self.last_ids[table_name] += 1
+        row["id"] = self.last_ids[table_name]
+        self.tables[table_name][row["id"]] = row
+        return row
+
+    def record_change(
+        self, table_name: str, operation: str, row_id: int, node_id: int = None, run_id: int = None, state: str = None, coalesce: bool = False
+    ) -> None:
+        # with coalesce, an insert following an insert into the same table for the same run replaces it (see SqliteMetadataStore)
+        if coalesce is True and len(self.changes) > 0:
+            last_change = self.changes[-1]
+            if last_change["table_name"] == table_name and last_change["operation"] == operation and last_change["run_id"] == run_id:
+                self.changes.pop()
+
+        self.last_change_id += 1
+        self.changes.append({
+            "id": self.last_change_id, "table_name": table_name, "operation": operation,
+            "row_id": row_id, "node_id": node_id, "run_id": run_id, "state": state
+        })
+
+        # the log is trimmed once it holds twice the changes it keeps, so trimming costs O(1) per change
+        if self.max_changes is not None and len(self.changes) > 2 * self.max_changes:
+            self.prune_changes()
+
+    def prune_changes(self) -> int:
+        with self.store_lock:
+            if self.max_changes is None or len(self.changes) <= self.max_changes:
+                return 0
+            pruned = len(self.changes) - self.max_changes
+            del self.changes[:pruned]
+            return pruned
+
+    def update_sample(self, sample: Dict[str, Any], **values) -> None:
+        # only the indexes whose key changed are updated, the sample keeps its place in the others
+        previous_keys = self.sample_index_keys(sample)
+        sample.update(values)
+        keys = self.sample_index_keys(sample)
+        self.unindex_sample(sample, {index_name: key for index_name, key in previous_keys.items() if keys.get(index_name) != key})
+        self.index_sample(sample, {index_name: key for index_name, key in keys.items() if previous_keys.get(index_name) != key})
+        self.record_change("samples", "update", sample["id"], sample["node_id"], sample["run_id"], sample["state"])
+
+    def setup(self) -> None:
+        if self.snapshot_path is not None:
+            if os.path.exists(self.snapshot_path) is True:
+                self.load_snapshot()
+                self.log(f"Node '{self.name}' loaded snapshot {self.snapshot_path}", level="INFO")
+
+            if self.snapshot_interval is not None:
+                self.snapshot_thread = Thread(name=f"{self.name}_snapshot", target=self.snapshot_loop, daemon=True)
+                self.snapshot_thread.start()
+
+    def on_exit(self) -> None:
+        if self.snapshot_thread is not None:
+            self.snapshot_stop_event.set()
+            self.snapshot_thread.join()
+            self.snapshot_thread = None
+
+        if self.snapshot_path is not None:
+            self.snapshot()
+
+    def snapshot_loop(self) -> None:
+        while self.snapshot_stop_event.wait(self.snapshot_interval) is False:
+            try:
+                self.snapshot()
+            except Exception as e:
+                self.log(f"Node '{self.name}' failed to write snapshot: {e}", level="ERROR")
+
+    def snapshot(self) -> None:
+        """
+        Writes the store to snapshot_path; the snapshot is written to a temporary file and then renamed,
+        so a crash while writing never corrupts the previous snapshot.
+        """
+        # the store is only locked while it is serialized, not while the snapshot is written to disk
+        with self.store_lock:
+            data = pickle.dumps(
+                {"tables": self.tables, "last_ids": self.last_ids, "last_change_id": self.last_change_id},
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+    def load_snapshot(self) -> None:
+        with open(self.snapshot_path, "rb") as f:
+            data = pickle.load(f)
+
+        with self.store_lock:
+            self.tables = data["tables"]
+            self.last_ids = data["last_ids"]
+            self.changes = []
+            # snapshots written by older versions hold the whole change log
+            if "last_change_id" in data:
+                self.last_change_id = data["last_change_id"]
+            else:
+                self.last_change_id = data["changes"][-1]["id"] if len(data["changes"]) > 0 else 0
+            self.build_indexes()
+
+            # a run that was open when the snapshot was taken was interrupted, so it is resumed like SqliteMetadataStore resumes it
+            open_runs = [run["id"] for run in self.tables["runs"].values() if run["end_time"] is None]
+            self.active_run_id = open_runs[-1] if len(open_runs) > 0 else None
+
+    def flush(self) -> None:
+        """
+        Writes are applied immediately, so there is nothing to flush; provided for API compatibility with SqliteMetadataStore.
+        """
+        pass
+
+    def get_node_id(self, resource_node: BaseResourceNode) -> int:
+        return self.node_ids[resource_node.name]
+
+    def allocate_sequence(self, resource_node: BaseResourceNode, count: int = 1) -> int:
+        if count < 1:
+            raise ValueError(f"count must be at least 1, not '{count}'.")
+
+        with self.store_lock:
+            node = self.tables["nodes"][self.get_node_id(resource_node)]
+            if node.get("sequence") is None:
+                node["sequence"] = len(self.samples_by_node.get(node["id"], ()))
+            first = node["sequence"]
+            node["sequence"] += count
+            return first
+
+    def get_run_id(self) -> int:
+        with self.store_lock:
+            if self.active_run_id is not None:
+                return self.active_run_id
+            for run in self.tables["runs"].values():
+                if run["end_time"] is None:
+                    return run["id"]
+
+    def get_runs(self) -> List[Dict]:
+        with self.store_lock:
+            return [dict(run) for run in self.tables["runs"].values()]
+
+    def create_resource_tracker(self, resource_node: BaseResourceNode) -> None:
+        with self.store_lock:
+            # a tracker reloaded from a snapshot is reused, so the node keeps its samples across restarts
+            if resource_node.name in self.node_ids:
+                return
+            node = self.insert("nodes", {"name": resource_node.name, "type": type(resource_node).__name__, "init_time": datetime.utcnow()})
+            self.node_ids[node["name"]] = node["id"]
+
+    def create_entry(
+        self, resource_node: BaseResourceNode, filepath: str, state: str = "new", run_id: int = None, content_hash: str = None, codec: str = None
+    ) -> None:
+        with self.store_lock:
+            sample = self.insert("samples", {
+                "run_id": run_id, "node_id": self.get_node_id(resource_node), "location": filepath,
+                "state": state, "end_time": None, "created_at": datetime.utcnow(), "content_hash": content_hash, "codec": codec
+            })
+            self.index_sample(sample)
+            self.record_change("samples", "insert", sample["id"], sample["node_id"], sample["run_id"], sample["state"])
+
+    def create_entries(
+        self, resource_node: BaseResourceNode, filepaths: Sequence[str], state: str = "new", run_id: int = None, 
+        skip_existing: bool = True, batch_size: int = 10000, content_hashes: Sequence[str] = None, codec: str = None
+    ) -> int:
+        if content_hashes is None:
+            content_hashes = [None] * len(filepaths)
+
+        created = 0
+        node_id = self.get_node_id(resource_node)
+        for i in range(0, len(filepaths), batch_size):
+            created_at = datetime.utcnow()
+            with self.store_lock:
+                for filepath, content_hash in zip(filepaths[i:i + batch_size], content_hashes[i:i + batch_size]):
+                    if skip_existing is True and len(self.samples_by_location.get((node_id, filepath), ())) > 0:
+                        continue
+                    sample = self.insert("samples", {
+                        "run_id": run_id, "node_id": node_id, "location": filepath, "state": state, "end_time": None, 
+                        "created_at": created_at, "content_hash": content_hash, "codec": codec
+                    })
+                    self.index_sample(sample)
+                    self.record_change("samples", "insert", sample["id"], node_id, run_id, state)
+                    created += 1
+        return created
+
+    def entry_ids(self, resource_node: BaseResourceNode = "all", state: str = "all") -> Iterable[int]:
+        if resource_node == "all":
+            if state == "all":
+                return self.tables["samples"].keys()
+            node_ids = self.node_ids.values()
+            return sorted(sample_id for node_id in node_ids for sample_id in self.samples_by_state.get((node_id, state), ()))
+
+        node_id = self.get_node_id(resource_node)
+        if state == "all":
+            return self.samples_by_node.get(node_id, SortedIds()).ascending().keys()
+        return self.samples_by_state.get((node_id, state), SortedIds()).ascending().keys()
+
+    def get_entries(self, resource_node: BaseResourceNode = "all", state: str = "all") -> List[Dict]:
+        with self.store_lock:
+            samples = self.tables["samples"]
+            return [dict(samples[sample_id]) for sample_id in self.entry_ids(resource_node, state)]
+
+    def get_num_entries(self, resource_node: BaseResourceNode, state: str) -> int:
+        with self.store_lock:
+            return len(self.entry_ids(resource_node, state))
+
+    def get_entry(self, resource_node: BaseResourceNode, id: int) -> Dict:
+        with self.store_lock:
+            sample = self.tables["samples"].get(id)
+            if sample is None or sample["node_id"] != self.get_node_id(resource_node):
+                return None
+            return dict(sample)
+
+    def get_entry_by_location(self, resource_node: BaseResourceNode, filepath: str) -> Dict:
+        with self.store_lock:
+            sample_ids = self.samples_by_location.get((self.get_node_id(resource_node), filepath), SortedIds())
+            for sample_id in sample_ids.ascending():
+                return dict(self.tables["samples"][sample_id])
+            return None
+
+    def entry_exists(self, resource_node: BaseResourceNode, filepath: str) -> bool:
+        with self.store_lock:
+            return len(self.samples_by_location.get((self.get_node_id(resource_node), filepath), ())) > 0
+
+    def find_entries_by_hash(self, resource_node: BaseResourceNode, content_hash: str) -> List[Dict]:
+        with self.store_lock:
+            samples = self.tables["samples"]
+            sample_ids = self.samples_by_hash.get((self.get_node_id(resource_node), content_hash), SortedIds())
+            return [dict(samples[sample_id]) for sample_id in sample_ids.ascending()]
+
+    def known_hashes(self, resource_node: BaseResourceNode, content_hashes: Sequence[str], batch_size: int = 500) -> Set[str]:
+        with self.store_lock:
+            node_id = self.get_node_id(resource_node)
+            return {content_hash for content_hash in content_hashes if len(self.samples_by_hash.get((node_id, content_hash), ())) > 0}
+
+    def delete_entries(self, resource_node: BaseResourceNode, entry_ids: List[int], batch_size: int = 500) -> int:
+        with self.store_lock:
+            node_id = self.get_node_id(resource_node)
+            deleted = 0
+            for entry_id in entry_ids:
+                sample = self.tables["samples"].get(entry_id)
+                if sample is None or sample["node_id"] != node_id:
+                    continue
+                self.unindex_sample(sample)
+                del self.tables["samples"][entry_id]
+                self.record_change("samples", "delete", sample["id"], sample["node_id"], sample["run_id"], sample["state"])
+                deleted += 1
+            return deleted
+
+    def vacuum(self, max_pages: int = None) -> int:
+        # deleted rows are freed immediately, there is no storage to reclaim
+        self.prune_changes()
+        return 0
+
+    def log_metrics(self, step: int = None, wall_time: float = None, **kwargs) -> None:
+        if wall_time is None:
+            wall_time = time.time()
+
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for key, value in kwargs.items():
+                self.log_row("metrics", {"run_id": run_id, "key": key, "value": value, "step": step, "wall_time": wall_time})
+
+    def log_metric_series(
+        self, key: str, values: Sequence[float], steps: Sequence[int] = None, wall_times: Sequence[float] = None
+    ) -> None:
+        values = [float(value) for value in values]
+        steps = range(len(values)) if steps is None else steps
+        if wall_times is None:
+            now = time.time()
+            wall_times = [now] * len(values)
+
+        if len(steps) != len(values) or len(wall_times) != len(values):
+            raise ValueError(f"values, steps, and wall_times must have the same length, got {len(values)}, {len(steps)}, and {len(wall_times)}.")
+
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for value, step, wall_time in zip(values, steps, wall_times):
+                self.log_row("metrics", {"run_id": run_id, "key": key, "value": value, "step": int(step), "wall_time": float(wall_time)})
+
+    def get_metric_series(self, run_id: int, key: str) -> Dict:
+        import numpy as np
+
+        with self.store_lock:
+            metrics = self.tables["metrics"]
+            rows = [metrics[metric_id] for metric_id in self.metric_series.get((run_id, key), ())]
+
+        rows.sort(key=lambda row: (row["step"] is not None, row["step"] if row["step"] is not None else 0, row["id"]))
+        return {
+            "step": np.array([row["step"] if row["step"] is not None else -1 for row in rows], dtype=np.int64),
+            "value": np.array([row["value"] for row in rows], dtype=np.float64),
+            "wall_time": np.array([row["wall_time"] if row["wall_time"] is not None else np.nan for row in rows], dtype=np.float64),
+        }
+
+    def log_params(self, **kwargs) -> None:
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for key, value in kwargs.items():
+                self.log_row("params", {"run_id": run_id, "key": key, "value": value})
+
+    def set_tags(self, **kwargs) -> None:
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for key, value in kwargs.items():
+                self.log_row("tags", {"run_id": run_id, "key": key, "value": value})
+
+    def log_row(self, table_name: str, row: Dict[str, Any]) -> None:
+        row = self.insert(table_name, row)
+        self.index_row(table_name, row)
+        self.record_change(table_name, "insert", row["id"], run_id=row["run_id"], coalesce=True)
+
+    # note: metrics, params, and tags belong to runs, not to resource nodes, so resource_node and state are accepted for compatibility only
+    def get_metrics(self, resource_node: BaseResourceNode = "all", state: str = "all") -> List[Dict]:
+        with self.store_lock:
+            return [dict(row) for row in self.tables["metrics"].values()]
+
+    def get_params(self, resource_node: BaseResourceNode = "all", state: str = "all") -> List[Dict]:
+        with self.store_lock:
+            return [dict(row) for row in self.tables["params"].values()]
+
+    def get_tags(self, resource_node: BaseResourceNode = "all", state: str = "all") -> List[Dict]:
+        with self.store_lock:
+            return [dict(row) for row in self.tables["tags"].values()]
+
+    def query_page(
+        self, rows: Dict[int, Dict[str, Any]], ids: Iterable[int], predicate: Callable[[Dict[str, Any]], bool] = None,
+        after_id: int = None, limit: int = 100, descending: bool = False, count_cap: int = 10000
+    ) -> Dict:
+        """
+        Returns one page of the rows whose ids are in ids (in ascending order) and that satisfy predicate,
+        in the same format as SqliteMetadataStore.query_page().
+        """
+        ordered_ids = reversed(ids) if descending is True else ids
+
+        page = []
+        total = 0
+        for row_id in ordered_ids:
+            row = rows[row_id]
+            if predicate is not None and predicate(row) is False:
+                continue
+            if total < count_cap:
+                total += 1
+            if after_id is not None and (row_id >= after_id if descending is True else row_id <= after_id):
+                continue
+            if len(page) < limit:
+                page.append(dict(row))
+            elif total >= count_cap:
+                break
+
+        return {
+            "rows": page,
+            "next_cursor": page[-1]["id"] if len(page) == limit else None,
+            "approximate_total": total,
+        }
+
+    def run_range_predicate(self, run_range: Tuple[int, int] = None, column: str = "run_id") -> Callable[[Dict[str, Any]], bool]:
+        if run_range is None:
+            return None
+        start, end = run_range
+
+        def predicate(row: Dict[str, Any]) -> bool:
+            if row[column] is None:
+                return False
+            if start is not None and row[column] < start:
+                return False
+            if end is not None and row[column] > end:
+                return False
+            return True
+        return predicate
+
+    def query_runs(
+        self, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        with self.store_lock:
+            runs = self.tables["runs"]
+            return self.query_page(runs, runs.keys(), self.run_range_predicate(run_range, "id"), after_id, limit, descending)
+
+    def query_entries(
+        self, resource_node: BaseResourceNode = "all", state: str = "all", run_range: Tuple[int, int] = None, ids: List[int] = None,
+        after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        with self.store_lock:
+            samples = self.tables["samples"]
+            candidate_ids = self.entry_ids(resource_node, state)
+            if ids is not None:
+                candidates = set(candidate_ids) if isinstance(candidate_ids, list) else candidate_ids
+                candidate_ids = [sample_id for sample_id in sorted(set(ids)) if sample_id in candidates]
+            return self.query_page(samples, candidate_ids, self.run_range_predicate(run_range), after_id, limit, descending)
+
+    def query_rows(
+        self, table_name: str, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        with self.store_lock:
+            rows = self.tables[table_name]
+            candidate_ids = rows.keys() if key is None else self.rows_by_key.get((table_name, key), dict()).keys()
+            return self.query_page(rows, candidate_ids, self.run_range_predicate(run_range), after_id, limit, descending)
+
+    def query_metrics(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        return self.query_rows("metrics", key, run_range, after_id, limit, descending)
+
+    def query_params(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        return self.query_rows("params", key, run_range, after_id, limit, descending)
+
+    def query_tags(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        return self.query_rows("tags", key, run_range, after_id, limit, descending)
+
+    def latest_change_cursor(self) -> int:
+        with self.store_lock:
+            return self.last_change_id
+
+    def changes_since(
+        self, cursor: int = 0, limit: int = 1000, resource_node: BaseResourceNode = None, tables: List[str] = None
+    ) -> Dict:
+        """
+        Returns the changes made after cursor, in the same format as SqliteMetadataStore.changes_since().
+        Note: the changes are sorted by id, so the first change after cursor is found with a binary search.
+        """
+        with self.store_lock:
+            node_id = self.get_node_id(resource_node) if resource_node is not None else None
+
+            changes = []
+            next_cursor = cursor
+            start = bisect.bisect_right(self.changes, cursor, key=lambda change: change["id"])
+            for index in range(start, len(self.changes)):
+                change = self.changes[index]
+                next_cursor = change["id"]
+                if node_id is not None and change["node_id"] is not None and change["node_id"] != node_id:
+                    continue
+                if tables is not None and change["table_name"] not in tables:
+                    continue
+                changes.append(dict(change))
+                if len(changes) == limit:
+                    break
+
+            return {"changes": changes, "cursor": next_cursor}
+
+    def add_run_id(self) -> None:
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for successor in self.successors:
+                if isinstance(successor, BaseResourceNode):
+                    node_id = self.get_node_id(successor)
+                    samples = self.tables["samples"]
+                    for sample_id in list(self.samples_by_run.get((node_id, None), SortedIds()).ascending()):
+                        if samples[sample_id]["state"] == "new":
+                            self.update_sample(samples[sample_id], run_id=run_id, state="current")
+
+    def add_end_time(self) -> None:
+        with self.store_lock:
+            run_id = self.get_run_id()
+            for successor in self.successors:
+                if isinstance(successor, BaseResourceNode):
+                    node_id = self.get_node_id(successor)
+                    samples = self.tables["samples"]
+                    for sample_id in list(self.samples_by_run.get((node_id, run_id), SortedIds()).ascending()):
+                        sample = samples[sample_id]
+                        if sample["end_time"] is None:
+                            self.update_sample(sample, end_time=datetime.utcnow(), state="old")
+
+    def start_run(self) -> None:
+        with self.store_lock:
+            run = self.insert("runs", {"start_time": datetime.utcnow(), "end_time": None})
+            self.record_change("runs", "insert", run["id"], run_id=run["id"])
+            self.active_run_id = run["id"]
+        self.log(f"--------------------------- started run {run['id']} at {datetime.now()}")
+
+    def end_run(self) -> None:
+        with self.store_lock:
+            run_id = self.get_run_id()
+            run = self.tables["runs"][run_id]
+            run["end_time"] = datetime.utcnow()
+            self.record_change("runs", "update", run["id"], run_id=run["id"])
+            self.active_run_id = None
+            self.prune_changes()
+        self.log(f"--------------------------- ended run {run['id']} at {datetime.now()}")
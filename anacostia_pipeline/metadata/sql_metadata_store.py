@@ -1,15 +1,21 @@
 from logging import Logger
-from typing import List, Dict
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float
+from typing import List, Dict, Set, Tuple, Sequence, TYPE_CHECKING
+from sqlalchemy import create_engine, insert, select, delete, func, text, inspect, or_, and_, literal, null, bindparam, MetaData, Table, Column, Integer, String, DateTime, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.engine import Engine
 from datetime import datetime
 import os
+import time
+from threading import Lock
 from contextlib import contextmanager
 import traceback
 
 from ..engine.base import BaseMetadataStoreNode, BaseResourceNode, BaseNode
-from ..dashboard.subapps.sqlmetadatastore import SqliteMetadataStoreApp
+from .write_queue import WriteBehindQueue
+
+if TYPE_CHECKING:
+    from ..dashboard.subapps.sqlmetadatastore import SqliteMetadataStoreApp
 
 
 
@@ -26,10 +32,13 @@ class Run(Base):
 
 class Metric(Base):
     __tablename__ = 'metrics'
+    __table_args__ = (Index("ix_metrics_series", "run_id", "key", "step"),)
     id = Column(Integer, primary_key=True)
-    run_id = Column(Integer)
-    key = Column(String)
+    run_id = Column(Integer, index=True)
+    key = Column(String, index=True)
     value = Column(Float)
+    step = Column(Integer)
+    wall_time = Column(Float)
 
     def as_dict(self):
        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -37,8 +46,8 @@ class Metric(Base):
 class Param(Base):
     __tablename__ = 'params'
     id = Column(Integer, primary_key=True)
-    run_id = Column(Integer)
-    key = Column(String)
+    run_id = Column(Integer, index=True)
+    key = Column(String, index=True)
     value = Column(Float)
 
     def as_dict(self):
@@ -47,8 +56,8 @@ class Param(Base):
 class Tag(Base):
     __tablename__ = 'tags'
     id = Column(Integer, primary_key=True)
-    run_id = Column(Integer)
-    key = Column(String)
+    run_id = Column(Integer, index=True)
+    key = Column(String, index=True)
     value = Column(String)
 
     def as_dict(self):
@@ -56,13 +65,55 @@ class Tag(Base):
 
 class Sample(Base):
     __tablename__ = 'samples'
+    __table_args__ = (
+        Index("ix_samples_node_state", "node_id", "state"), 
+        Index("ix_samples_node_location", "node_id", "location"), 
+        Index("ix_samples_node_hash", "node_id", "content_hash")
+    )
     id = Column(Integer, primary_key=True)
-    run_id = Column(Integer)
-    node_id = Column(Integer)
-    location = Column(String)
-    state = Column(String, default="new")
+    run_id = Column(Integer, index=True)
+    node_id = Column(Integer, index=True)
+    location = Column(String, index=True)
+    state = Column(String, default="new", index=True)
     end_time = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String)
+    codec = Column(String)
+
+    def as_dict(self):
+       return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+class RunRange(Base):
+    """
+    Boundary of a run for one resource node, used by the 'run_range' state model.
+    The samples of node_id that were not given a run_id explicitly and whose id is at most max_sample_id
+    (and above the max_sample_id of the node's previous run) belong to run_id.
+    """
+    __tablename__ = 'run_ranges'
+    __table_args__ = (Index("ix_run_ranges_boundary", "node_id", "max_sample_id"),)
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, index=True)
+    node_id = Column(Integer)
+    max_sample_id = Column(Integer)
+
+    def as_dict(self):
+       return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+class Change(Base):
+    """
+    Change log of the metadata store; the id of a change is its sequence number.
+    Rows are written by the triggers in CHANGE_TRIGGERS, not by the store.
+    Note: sqlite_autoincrement guarantees ids are never reused, so the sequence is monotonically increasing.
+    """
+    __tablename__ = 'changes'
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String)
+    operation = Column(String)
+    row_id = Column(Integer)
+    node_id = Column(Integer)
+    run_id = Column(Integer)
+    state = Column(String)
 
     def as_dict(self):
        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -73,11 +124,221 @@ class Node(Base):
     name = Column(String)
     type = Column(String)
     init_time = Column(DateTime, default=datetime.utcnow)
+    sequence = Column(Integer)      # the next value allocate_sequence() hands out for the node
 
     def as_dict(self):
        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
+def _change_trigger(name: str, event: str, table: str, operation: str, row: str, node_id: str, run_id: str, state: str, when: str = None) -> str:
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+        {f"WHEN {when}" if when is not None else ""}
+        BEGIN
+            INSERT INTO changes (table_name, operation, row_id, node_id, run_id, state)
+            VALUES ('{table}', '{operation}', {row}.id, {node_id}, {run_id}, {state});
+        END;
+    """
+
+# every insert and state transition is recorded in the changes table by SQLite itself, 
+# so writes made through the ORM, through Core statements, and through the write-behind queue are all captured
+SAMPLE_CHANGE_TRIGGERS = [
+    _change_trigger("samples_insert_change", "INSERT", "samples", "insert", "NEW", "NEW.node_id", "NEW.run_id", "NEW.state"),
+    _change_trigger(
+        "samples_update_change", "UPDATE OF state, run_id", "samples", "update", "NEW", "NEW.node_id", "NEW.run_id", "NEW.state",
+        when="OLD.state IS NOT NEW.state OR OLD.run_id IS NOT NEW.run_id"
+    ),
+    _change_trigger("samples_delete_change", "DELETE", "samples", "delete", "OLD", "OLD.node_id", "OLD.run_id", "OLD.state"),
+]
+
+def _coalesced_change_trigger(name: str, table: str) -> str:
+    # consecutive inserts into the table for the same run are coalesced into one change: 
+    # the previous change is replaced by a change with a new sequence number, so a follower still sees the latest insert,
+    # but logging a series of a million points leaves one row in the change log instead of a million
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER INSERT ON {table}
+        BEGIN
+            DELETE FROM changes WHERE id = (SELECT MAX(id) FROM changes) AND table_name = '{table}' AND run_id IS NEW.run_id;
+            INSERT INTO changes (table_name, operation, row_id, node_id, run_id, state)
+            VALUES ('{table}', 'insert', NEW.id, NULL, NEW.run_id, NULL);
+        END;
+    """
+
+CHANGE_TRIGGERS = SAMPLE_CHANGE_TRIGGERS + [
+    _change_trigger("runs_insert_change", "INSERT", "runs", "insert", "NEW", "NULL", "NEW.id", "NULL"),
+    _change_trigger("runs_update_change", "UPDATE OF end_time", "runs", "update", "NEW", "NULL", "NEW.id", "NULL"),
+    _coalesced_change_trigger("metrics_insert_coalesced_change", "metrics"),
+    _coalesced_change_trigger("params_insert_coalesced_change", "params"),
+    _coalesced_change_trigger("tags_insert_coalesced_change", "tags"),
+]
+
+# triggers of older versions that recorded one change per metric, param, and tag; setup() drops them
+LEGACY_CHANGE_TRIGGERS = ["metrics_insert_change", "params_insert_change", "tags_insert_change"]
+
+# deletes the changes older than the b_keep most recent ones
+PRUNE_CHANGES = delete(Change.__table__).where(
+    Change.__table__.c.id <= select(func.max(Change.__table__.c.id)).scalar_subquery() - bindparam("b_keep")
+)
+
+
+# the sample_states view derives the run, state, and end time of every sample from the run_ranges and runs tables;
+# a sample whose stored state is 'old' and that has no run (e.g., a file that already existed when the pipeline was set up) stays 'old'.
+# note: the view is created in every database, but it is only read by stores using the 'run_range' state model;
+# it is dropped and created again by setup(), so a database created by an older version gets the columns added since
+SAMPLE_STATES_VIEW = """
+    CREATE VIEW sample_states AS
+    SELECT
+        samples.id AS id,
+        COALESCE(samples.run_id, boundary.run_id) AS run_id,
+        samples.node_id AS node_id,
+        samples.location AS location,
+        CASE
+            WHEN samples.state = 'old' AND samples.run_id IS NULL THEN 'old'
+            WHEN runs.id IS NULL THEN 'new'
+            WHEN runs.end_time IS NULL THEN 'current'
+            ELSE 'old'
+        END AS state,
+        COALESCE(samples.end_time, runs.end_time) AS end_time,
+        samples.created_at AS created_at,
+        samples.content_hash AS content_hash,
+        samples.codec AS codec
+    FROM samples
+    LEFT JOIN run_ranges AS boundary ON samples.run_id IS NULL AND samples.state IS NULL AND boundary.id = (
+        SELECT run_ranges.id FROM run_ranges
+        WHERE run_ranges.node_id = samples.node_id AND run_ranges.max_sample_id >= samples.id
+        ORDER BY run_ranges.max_sample_id, run_ranges.run_id
+        LIMIT 1
+    )
+    LEFT JOIN runs ON runs.id = COALESCE(samples.run_id, boundary.run_id);
+"""
+
+view_metadata = MetaData()
+
+sample_states_view = Table(
+    "sample_states", view_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("run_id", Integer),
+    Column("node_id", Integer),
+    Column("location", String),
+    Column("state", String),
+    Column("end_time", DateTime),
+    Column("created_at", DateTime),
+    Column("content_hash", String),
+    Column("codec", String),
+)
+
+
+# schema of a sample shard (see the sharded argument of SqliteMetadataStore): the samples table and the change log of its samples.
+# the shard's samples table uses AUTOINCREMENT so that its ids can start at the shard's offset (node_id * SHARD_ID_STRIDE),
+# which keeps sample ids unique across shards
+SHARD_ID_STRIDE = 10 ** 12
+shard_metadata = MetaData()
+shard_samples_table = Sample.__table__.to_metadata(shard_metadata)
+shard_samples_table.dialect_options["sqlite"]["autoincrement"] = True
+Change.__table__.to_metadata(shard_metadata)
+
+SEED_SHARD_IDS = """
+    INSERT INTO sqlite_sequence (name, seq)
+    SELECT 'samples', :offset WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'samples')
+"""
+
+
+# the statements of the hot paths (detecting files, counting and listing entries, logging metrics) are built once;
+# SQLAlchemy caches the compiled form of each statement, and rows are returned as lightweight mappings instead of ORM objects
+def sample_statements(table: Table) -> Dict:
+    by_node = table.c.node_id == bindparam("node_id")
+    by_state = table.c.state == bindparam("state")
+    return {
+        "count_node": select(func.count()).select_from(table).where(by_node),
+        "count_node_state": select(func.count()).select_from(table).where(by_node, by_state),
+        "select_all": select(table).order_by(table.c.id),
+        "select_state": select(table).where(by_state).order_by(table.c.id),
+        "select_node": select(table).where(by_node).order_by(table.c.id),
+        "select_node_state": select(table).where(by_node, by_state).order_by(table.c.id),
+        "select_entry": select(table).where(by_node, table.c.id == bindparam("id")),
+        "select_location": select(table).where(by_node, table.c.location == bindparam("location")).order_by(table.c.id).limit(1),
+    }
+
+SAMPLE_STATEMENTS = sample_statements(Sample.__table__)
+SAMPLE_STATE_STATEMENTS = sample_statements(sample_states_view)
+
+
+# with the 'run_range' state model, the 'new' and 'current' samples of a node are found with range predicates on samples.id
+# against the node's two latest boundaries, instead of deriving the state of every sample through the sample_states view:
+# 'new' samples have no run and an id above the latest boundary (b_upper);
+# 'current' samples belong to the open run, either explicitly (run_id) or by falling between the previous boundary (b_lower) and b_upper.
+# the (node_id, state) index stores the sample id after its columns, so both ranges are index range scans.
+def run_range_statements() -> Dict:
+    samples = Sample.__table__
+    runs = Run.__table__
+    run_ranges = RunRange.__table__
+
+    unassigned = and_(samples.c.node_id == bindparam("b_node_id"), samples.c.run_id.is_(None), samples.c.state.is_(None))
+    new = and_(unassigned, samples.c.id > bindparam("b_upper"))
+    current = or_(
+        and_(unassigned, samples.c.id > bindparam("b_lower"), samples.c.id <= bindparam("b_upper")),
+        and_(samples.c.node_id == bindparam("b_node_id"), samples.c.run_id == bindparam("b_run_id")),
+    )
+
+    def columns(state: str, run_id) -> List:
+        return [
+            samples.c.id, run_id.label("run_id"), samples.c.node_id, samples.c.location, literal(state).label("state"),
+            samples.c.end_time, samples.c.created_at, samples.c.content_hash, samples.c.codec
+        ]
+
+    return {
+        "boundaries": select(run_ranges.c.run_id, run_ranges.c.max_sample_id, runs.c.end_time).select_from(
+            run_ranges.outerjoin(runs, runs.c.id == run_ranges.c.run_id)
+        ).where(run_ranges.c.node_id == bindparam("b_node_id")).order_by(run_ranges.c.run_id.desc()).limit(2),
+        "count_new": select(func.count()).select_from(samples).where(new),
+        "count_current": select(func.count()).select_from(samples).where(current),
+        "select_new": select(*columns("new", null())).where(new).order_by(samples.c.id),
+        "select_current": select(*columns("current", func.coalesce(samples.c.run_id, bindparam("b_run_id")))).where(current).order_by(samples.c.id),
+    }
+
+RUN_RANGE_STATEMENTS = run_range_statements()
+
+NODE_IDS = select(Node.__table__.c.id).order_by(Node.__table__.c.id)
+
+NODE_ID = select(Node.__table__.c.id).where(Node.__table__.c.name == bindparam("name")).order_by(Node.__table__.c.id).limit(1)
+
+NODE_SEQUENCE = select(Node.__table__.c.sequence).where(Node.__table__.c.id == bindparam("node_id"))
+
+# the block is reserved and its end is read back in one statement, so concurrent allocations never overlap
+ALLOCATE_SEQUENCE = Node.__table__.update().where(Node.__table__.c.id == bindparam("b_node_id")).values(
+    sequence=func.coalesce(Node.__table__.c.sequence, bindparam("b_seed")) + bindparam("b_count")
+).returning(Node.__table__.c.sequence)
+
+ENTRY_EXISTS = select(Sample.__table__.c.id).where(
+    Sample.__table__.c.node_id == bindparam("node_id"), Sample.__table__.c.location == bindparam("location")
+).limit(1)
+
+# bulk inserts of create_entries() run on the DB-API cursor with positional parameters,
+# which skips the per-row parameter processing of SQLAlchemy; the second statement skips the locations the node already has
+BULK_INSERT_SAMPLES = "INSERT INTO samples (node_id, location, state, run_id, created_at, content_hash, codec) VALUES (?, ?, ?, ?, ?, ?, ?)"
+BULK_INSERT_MISSING_SAMPLES = """
+    INSERT INTO samples (node_id, location, state, run_id, created_at, content_hash, codec) SELECT ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM samples WHERE node_id = ? AND location = ?)
+"""
+
+# note: bind parameters of UPDATE statements cannot be named after columns;
+# samples recorded as 'old' (e.g., files backfilled with init_state='old') have no run but must not join the next run
+START_RUN_SAMPLES = Sample.__table__.update().where(
+    Sample.__table__.c.node_id == bindparam("b_node_id"), Sample.__table__.c.run_id.is_(None), Sample.__table__.c.state == "new"
+).values(run_id=bindparam("b_run_id"), state="current")
+
+END_RUN_SAMPLES = Sample.__table__.update().where(
+    Sample.__table__.c.node_id == bindparam("b_node_id"), Sample.__table__.c.run_id == bindparam("b_run_id"), Sample.__table__.c.end_time.is_(None)
+).values(end_time=bindparam("b_end_time"), state="old")
+
+INSERT_ROW = {
+    "sample": insert(Sample.__table__),
+    "metric": insert(Metric.__table__),
+    "param": insert(Param.__table__),
+    "tag": insert(Tag.__table__),
+}
+
+
 @contextmanager
 def scoped_session_manager(session_factory: sessionmaker, node: BaseNode) -> scoped_session: # type: ignore
     ScopedSession = scoped_session(session_factory)
@@ -96,11 +357,54 @@ def scoped_session_manager(session_factory: sessionmaker, node: BaseNode) -> sco
 
 
 class SqliteMetadataStore(BaseMetadataStoreNode):
-    def __init__(self, name: str, uri: str, loggers: Logger | List[Logger] = None) -> None:
-        super().__init__(name, uri, loggers)
+    def __init__(
+        self, name: str, uri: str, loggers: Logger | List[Logger] = None,
+        write_behind: bool = False, write_batch_size: int = 500, write_flush_interval: float = 0.05,
+        state_model: str = "column", sharded: bool = False, manifest_path: str = None, max_changes: int = 100000
+    ) -> None:
+        super().__init__(name, uri, loggers, manifest_path=manifest_path)
+
+        # state_model controls how the state of a sample ('new', 'current', or 'old') is stored:
+        # 'column': the state is stored on every sample and rewritten for every sample of the run when a run starts and ends.
+        # 'run_range': starting a run records one boundary per resource node (the largest sample id of the node) in the run_ranges table,
+        # and the state of a sample is derived from the run its id falls into and whether that run has ended (see the sample_states view);
+        # starting and ending a run touch a constant number of rows however many samples were ingested.
+        # a database can be switched between the two models; setup() converts the stored states.
+        if state_model not in ("column", "run_range"):
+            raise ValueError(f"state_model must be either 'column' or 'run_range', not '{state_model}'.")
+        self.state_model = state_model
+
+        # when sharded is enabled, the samples of every resource node are stored in a database of their own
+        # (next to the main database, e.g., metadata.samples.2.db for the node with id 2), while runs, metrics, params, tags,
+        # and resource trackers stay in the main database. SQLite locks a whole database file for writing,
+        # so with one file per node, the observers of several resource nodes record files in parallel instead of waiting for each other.
+        # queries over all nodes read every shard and merge the results by sample id.
+        if sharded is True and state_model == "run_range":
+            raise ValueError("the 'run_range' state model joins samples with runs, so it cannot be used with sharded=True.")
+        self.sharded = sharded
+        self.shards: Dict[int, Engine] = dict()
+        self.shards_lock = Lock()
+
+        # when write_behind is enabled, log_metrics, log_params, set_tags, and create_entry enqueue their records and return immediately;
+        # a writer thread commits the queued records in one transaction every write_batch_size records or every write_flush_interval seconds.
+        # reads flush the queue first, so callers always see their own writes (entry_exists() checks the queued samples in memory instead).
+        # a batch that fails is retried, then its records are returned in the WriteBehindError raised by the next flush().
+        self.write_behind = write_behind
+        self.write_batch_size = write_batch_size
+        self.write_flush_interval = write_flush_interval
+        self.write_queue: WriteBehindQueue = None
+
+        # the change log keeps the max_changes most recent changes of every database (None keeps every change);
+        # older changes are pruned when a run ends and by vacuum(), so a follower lagging further behind misses them
+        self.max_changes = max_changes
+
+        self.engine = None
+        self.active_run_id = None
+        self.node_ids: Dict[str, int] = dict()
 
     # Note: override the get_app() method to return the custom router
-    def get_app(self) -> SqliteMetadataStoreApp:
+    def get_app(self) -> 'SqliteMetadataStoreApp':
+        from ..dashboard.subapps.sqlmetadatastore import SqliteMetadataStoreApp
         return SqliteMetadataStoreApp(self)
 
     def setup(self) -> None:
@@ -113,49 +417,366 @@ class SqliteMetadataStore(BaseMetadataStoreNode):
         # Create an engine that stores data in the local directory's sqlite.db file.
         engine = create_engine(f'{self.uri}', connect_args={"check_same_thread": False})
 
+        # incremental auto-vacuum lets vacuum() return the pages freed by deleted rows to the filesystem a few pages at a time;
+        # note: the setting only takes effect on a new database, it is a no-op on a database that already has tables
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.commit()
+
         # Create all tables in the engine (this is equivalent to "Create Table" statements in raw SQL).
         Base.metadata.create_all(engine)
+        self.add_missing_columns(engine)
+
+        # create_all() only creates the indexes of tables it creates, so add any index missing from a database created by an older version
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+
+        with engine.begin() as conn:
+            for trigger in LEGACY_CHANGE_TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+            for trigger in CHANGE_TRIGGERS:
+                conn.execute(text(trigger))
+            conn.execute(text("DROP VIEW IF EXISTS sample_states"))
+            conn.execute(text(SAMPLE_STATES_VIEW))
+
+        self.convert_sample_states(engine)
 
         # Create a sessionmaker, binding it to the engine
         self.session_factory = sessionmaker(bind=engine)
+        self.engine = engine
+
+        if self.sharded is True:
+            self.open_shards()
+
+        if self.write_behind is True:
+            self.write_queue = WriteBehindQueue(
+                commit = self.commit_records,
+                batch_size = self.write_batch_size,
+                flush_interval = self.write_flush_interval,
+                name = f"{self.name}_writer",
+                on_error = lambda e: self.log(f"Write-behind commit failed in node '{self.name}': {e}", level="ERROR")
+            )
+            self.write_queue.start()
+
+    def add_missing_columns(self, engine, metadata: MetaData = Base.metadata) -> None:
+        """
+        create_all() does not alter existing tables, so add the columns that a database created by an older version does not have.
+        """
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table in metadata.sorted_tables:
+                existing_columns = [column["name"] for column in inspector.get_columns(table.name)]
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_type = column.type.compile(dialect=engine.dialect)
+                        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+    def convert_sample_states(self, engine) -> None:
+        """
+        Converts the stored sample states of a database last used with the other state model.
+        """
+        with engine.begin() as conn:
+            if self.state_model == "run_range":
+                # the state of a sample with a run is derived from its run; only the 'old' samples without a run keep their stored state
+                conn.execute(text(
+                    "UPDATE samples SET state = NULL WHERE state IS NOT NULL AND (run_id IS NOT NULL OR state != 'old')"
+                ))
+            else:
+                # materialize the derived run, state, and end time of the samples written with the 'run_range' model
+                conn.execute(text("""
+                    UPDATE samples SET
+                        run_id = (SELECT sample_states.run_id FROM sample_states WHERE sample_states.id = samples.id),
+                        end_time = (SELECT sample_states.end_time FROM sample_states WHERE sample_states.id = samples.id),
+                        state = (SELECT sample_states.state FROM sample_states WHERE sample_states.id = samples.id)
+                    WHERE state IS NULL
+                """))
+
+    @property
+    def samples_table(self) -> Table:
+        """
+        The table to read samples from: the samples table itself, or the sample_states view with the 'run_range' state model.
+        """
+        if self.state_model == "run_range":
+            return sample_states_view
+        return Sample.__table__
+
+    @property
+    def entry_statements(self) -> Dict:
+        return SAMPLE_STATE_STATEMENTS if self.state_model == "run_range" else SAMPLE_STATEMENTS
+
+    def stored_state(self, state: str, run_id: int = None) -> str:
+        """
+        Returns the state to store for a new sample; with the 'run_range' state model, only an 'old' sample without a run stores its state.
+        """
+        if self.state_model == "run_range":
+            return state if state == "old" and run_id is None else None
+        return state
+
+    def open_shard(self, node_id: int) -> Engine:
+        """
+        Returns the engine of the sample shard of a node, creating the shard database if it does not exist.
+        """
+        engine = self.shards.get(node_id)
+        if engine is not None:
+            return engine
+
+        with self.shards_lock:
+            engine = self.shards.get(node_id)
+            if engine is not None:
+                return engine
+
+            base, extension = os.path.splitext(self.uri)
+            engine = create_engine(f"{base}.samples.{node_id}{extension}", connect_args={"check_same_thread": False})
+            with engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.commit()
+
+            shard_metadata.create_all(engine)
+            self.add_missing_columns(engine, shard_metadata)
+            for index in shard_samples_table.indexes:
+                index.create(engine, checkfirst=True)
+            with engine.begin() as conn:
+                for trigger in SAMPLE_CHANGE_TRIGGERS:
+                    conn.execute(text(trigger))
+                conn.execute(text(SEED_SHARD_IDS), {"offset": node_id * SHARD_ID_STRIDE})
+
+            self.shards[node_id] = engine
+            return engine
+
+    def open_shards(self) -> List[Engine]:
+        """
+        Returns the engines of the sample shards of every resource node, in node id order.
+        """
+        with self.engine.connect() as conn:
+            node_ids = conn.execute(NODE_IDS).scalars().all()
+        return [self.open_shard(node_id) for node_id in node_ids]
+
+    def sample_engine(self, resource_node: BaseResourceNode) -> Engine:
+        """
+        Returns the engine that stores the samples of resource_node: its shard when sharded is enabled, otherwise the main engine.
+        """
+        if self.sharded is True:
+            return self.open_shard(self.get_node_id(resource_node))
+        return self.engine
+
+    def sample_engines(self, resource_node: BaseResourceNode = "all") -> List[Engine]:
+        if resource_node != "all":
+            return [self.sample_engine(resource_node)]
+        if self.sharded is True:
+            return self.open_shards()
+        return [self.engine]
+
+    def on_exit(self) -> None:
+        if self.write_queue is not None:
+            self.write_queue.stop()
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued write has been committed; a no-op when write_behind is disabled.
+        """
+        if self.write_queue is not None:
+            self.write_queue.flush()
+
+    def get_write_queue_stats(self) -> Dict:
+        if self.write_queue is None:
+            return dict()
+        return self.write_queue.stats()
+
+    def commit_records(self, records: List[tuple]) -> None:
+        """
+        Commits a batch of (kind, record) tuples from the write-behind queue in a single transaction.
+        """
+        rows_by_kind: Dict[str, List[Dict]] = dict()
+        samples_by_node: Dict[int, List[Dict]] = dict()
+        for kind, record in records:
+            if kind == "sample" and self.sharded is True:
+                samples_by_node.setdefault(record["node_id"], []).append(record)
+            else:
+                rows_by_kind.setdefault(kind, []).append(record)
+
+        with self.engine.begin() as conn:
+            for kind, rows in rows_by_kind.items():
+                conn.execute(INSERT_ROW[kind], rows)
+
+        for node_id, rows in samples_by_node.items():
+            with self.open_shard(node_id).begin() as conn:
+                conn.execute(INSERT_ROW["sample"], rows)
+
+    def get_node_id(self, resource_node: BaseResourceNode) -> int:
+        node_id = self.node_ids.get(resource_node.name)
+        if node_id is None:
+            with self.engine.connect() as conn:
+                node_id = conn.execute(NODE_ID, {"name": resource_node.name}).scalar()
+            self.node_ids[resource_node.name] = node_id
+        return node_id
+
+    def allocate_sequence(self, resource_node: BaseResourceNode, count: int = 1) -> int:
+        """
+        Reserves count consecutive values of the node's sequence and returns the first one.
+        The sequence is stored with the node, so a value is never handed out twice, even across restarts;
+        it starts at the number of entries the node had when the first value was allocated.
+        """
+        if count < 1:
+            raise ValueError(f"count must be at least 1, not '{count}'.")
+
+        node_id = self.get_node_id(resource_node)
+        with self.engine.connect() as conn:
+            current = conn.execute(NODE_SEQUENCE, {"node_id": node_id}).scalar()
+
+        # a node that has never allocated a value starts after its existing entries (e.g., files named by counting the entries)
+        seed = self.get_num_entries(resource_node, "all") if current is None else 0
+
+        with self.engine.begin() as conn:
+            next_value = conn.execute(ALLOCATE_SEQUENCE, {"b_node_id": node_id, "b_seed": seed, "b_count": count}).scalar()
+        return next_value - count
 
     def get_run_id(self) -> int:
+        if self.active_run_id is not None:
+            return self.active_run_id
+
+        # None if no run is active, like BaseMetadataStoreNode.get_run_id()
         with scoped_session_manager(self.session_factory, self) as session:
             run = session.query(Run).filter_by(end_time=None).first()
-            return run.id
+            return run.id if run is not None else None
     
     def get_runs(self) -> List[Dict]:
+        self.flush()
         with scoped_session_manager(self.session_factory, self) as session:
             runs = session.query(Run).all()
             runs = [run.as_dict() for run in runs]
             return runs
     
+    def run_range_params(self, conn, resource_node: BaseResourceNode) -> Dict:
+        """
+        Returns the parameters of RUN_RANGE_STATEMENTS for a node: its two latest boundaries and its open run (None if no run is open).
+        """
+        node_id = self.get_node_id(resource_node)
+        boundaries = conn.execute(RUN_RANGE_STATEMENTS["boundaries"], {"b_node_id": node_id}).all()
+        return {
+            "b_node_id": node_id,
+            "b_upper": boundaries[0].max_sample_id if len(boundaries) > 0 else 0,
+            "b_lower": boundaries[1].max_sample_id if len(boundaries) > 1 else 0,
+            "b_run_id": boundaries[0].run_id if len(boundaries) > 0 and boundaries[0].end_time is None else None,
+        }
+
+    def count_run_range_entries(self, resource_node: BaseResourceNode, state: str) -> int:
+        with self.engine.connect() as conn:
+            if state == "all":
+                return conn.execute(SAMPLE_STATEMENTS["count_node"], {"node_id": self.get_node_id(resource_node)}).scalar()
+
+            params = self.run_range_params(conn, resource_node)
+            num_new = conn.execute(RUN_RANGE_STATEMENTS["count_new"], params).scalar() if state in ("new", "old") else 0
+            num_current = 0
+            if state in ("current", "old") and params["b_run_id"] is not None:
+                num_current = conn.execute(RUN_RANGE_STATEMENTS["count_current"], params).scalar()
+
+            if state == "new":
+                return num_new
+            if state == "current":
+                return num_current
+            # every sample that is neither 'new' nor 'current' is 'old'
+            num_all = conn.execute(SAMPLE_STATEMENTS["count_node"], {"node_id": params["b_node_id"]}).scalar()
+            return num_all - num_new - num_current
+
     def get_num_entries(self, resource_node: BaseResourceNode, state: str) -> int:
         # add some assertion statements here to check if state is "new", "current", "old", or "all"
-        with scoped_session_manager(self.session_factory, resource_node) as session:
-            node_id = session.query(Node).filter_by(name=resource_node.name).first().id
+        self.flush()
+        if self.state_model == "run_range" and state in ("new", "current", "old", "all"):
+            return self.count_run_range_entries(resource_node, state)
+
+        statements = self.entry_statements
+        with self.sample_engine(resource_node).connect() as conn:
             if state == "all":
-                return session.query(Sample).filter_by(node_id=node_id).count()
+                return conn.execute(statements["count_node"], {"node_id": self.get_node_id(resource_node)}).scalar()
             else:
-                return session.query(Sample).filter_by(node_id=node_id, state=state).count()
-    
+                return conn.execute(statements["count_node_state"], {"node_id": self.get_node_id(resource_node), "state": state}).scalar()
+
     def create_resource_tracker(self, resource_node: BaseResourceNode) -> None:
         with scoped_session_manager(self.session_factory, resource_node) as session:
             resource_name = resource_node.name
+
+            # a node restarted on an existing database keeps its tracker, so its samples are found again
+            if session.query(Node).filter_by(name=resource_name).first() is not None:
+                return
+
             type_name = type(resource_node).__name__
             node = Node(name=resource_name, type=type_name)
             session.add(node)
             session.commit()
 
-    def log_metrics(self, **kwargs) -> None:
-        with scoped_session_manager(self.session_factory, self) as session:
-            run_id = self.get_run_id()
-            for key, value in kwargs.items():
-                metric = Metric(run_id=run_id, key=key, value=value)
-                session.add(metric)
-            session.commit()
+        if self.sharded is True:
+            self.sample_engine(resource_node)
+
+    def log_metrics(self, step: int = None, wall_time: float = None, **kwargs) -> None:
+        """
+        Logs each keyword argument as a metric of the current run.
+        step is the optional training step the values belong to, wall_time defaults to the current time (seconds since the epoch).
+        Note: because of this, 'step' and 'wall_time' cannot be used as metric names.
+        """
+        if wall_time is None:
+            wall_time = time.time()
+
+        run_id = self.get_run_id()
+        rows = [{"run_id": run_id, "key": key, "value": value, "step": step, "wall_time": wall_time} for key, value in kwargs.items()]
+        self.log_rows("metric", rows)
+
+    def log_metric_series(
+        self, key: str, values: Sequence[float], steps: Sequence[int] = None, wall_times: Sequence[float] = None
+    ) -> None:
+        """
+        Logs a whole series of values (e.g., a list or a NumPy array) for one metric of the current run in a single transaction.
+        steps defaults to 0, 1, 2, ...; wall_times defaults to the current time for every value.
+        """
+        values = [float(value) for value in values]
+        steps = range(len(values)) if steps is None else steps
+        if wall_times is None:
+            now = time.time()
+            wall_times = [now] * len(values)
+
+        if len(steps) != len(values) or len(wall_times) != len(values):
+            raise ValueError(f"values, steps, and wall_times must have the same length, got {len(values)}, {len(steps)}, and {len(wall_times)}.")
+
+        run_id = self.get_run_id()
+        rows = [
+            {"run_id": run_id, "key": key, "value": value, "step": int(step), "wall_time": float(wall_time)}
+            for value, step, wall_time in zip(values, steps, wall_times)
+        ]
+        self.log_rows("metric", rows)
+
+    def get_metric_series(self, run_id: int, key: str) -> Dict:
+        """
+        Returns the series of one metric of a run as NumPy arrays ordered by step:
+            step: int64 array, -1 where the value was logged without a step.
+            value: float64 array.
+            wall_time: float64 array, NaN where the value was logged without a wall time.
+        Note: the rows are read with the raw DB-API cursor straight into an array, without building ORM objects or dictionaries.
+        """
+        import numpy as np
+
+        self.flush()
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT COALESCE(step, -1), value, wall_time FROM metrics WHERE run_id = ? AND key = ? ORDER BY step, id",
+                (run_id, key)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 3)
+        return {
+            "step": table[:, 0].astype(np.int64),
+            "value": table[:, 1],
+            "wall_time": table[:, 2],
+        }
     
     def get_metrics(self, resource_node: BaseResourceNode, state: str = "all") -> List[Dict]:
+        self.flush()
         with scoped_session_manager(self.session_factory, resource_node) as session:
             if (resource_node != "all") and (state != "all"):
                 node_id = session.query(Node).filter_by(name=resource_node.name).first().id
@@ -175,6 +796,7 @@ class SqliteMetadataStore(BaseMetadataStoreNode):
             return metrics
     
     def get_params(self, resource_node: BaseResourceNode, state: str = "all") -> List[Dict]:
+        self.flush()
         with scoped_session_manager(self.session_factory, resource_node) as session:
             if (resource_node != "all") and (state != "all"):
                 node_id = session.query(Node).filter_by(name=resource_node.name).first().id
@@ -194,6 +816,7 @@ class SqliteMetadataStore(BaseMetadataStoreNode):
             return params
     
     def get_tags(self, resource_node: BaseResourceNode, state: str = "all") -> List[Dict]:
+        self.flush()
         with scoped_session_manager(self.session_factory, resource_node) as session:
             if (resource_node != "all") and (state != "all"):
                 node_id = session.query(Node).filter_by(name=resource_node.name).first().id
@@ -213,92 +836,464 @@ class SqliteMetadataStore(BaseMetadataStoreNode):
             return tags
 
     def log_params(self, **kwargs) -> None:
-        with scoped_session_manager(self.session_factory, self) as session:
-            run_id = self.get_run_id()
-            for key, value in kwargs.items():
-                param = Param(run_id=run_id, key=key, value=value)
-                session.add(param)
-            session.commit()
-    
+        run_id = self.get_run_id()
+        self.log_rows("param", [{"run_id": run_id, "key": key, "value": value} for key, value in kwargs.items()])
+
+    def log_rows(self, kind: str, rows: List[Dict]) -> None:
+        """
+        Inserts rows of one kind ('metric', 'param', or 'tag') in a single executemany, or enqueues them when write_behind is enabled.
+        """
+        if len(rows) == 0:
+            return
+
+        if self.write_queue is not None:
+            for row in rows:
+                self.write_queue.put(kind, row)
+            return
+
+        with self.engine.begin() as conn:
+            conn.execute(INSERT_ROW[kind], rows)
+
     def set_tags(self, **kwargs) -> None:
-        with scoped_session_manager(self.session_factory, self) as session:
-            run_id = self.get_run_id()
-            for key, value in kwargs.items():
-                tag = Tag(run_id=run_id, key=key, value=value)
-                session.add(tag)
-            session.commit()
+        run_id = self.get_run_id()
+        self.log_rows("tag", [{"run_id": run_id, "key": key, "value": value} for key, value in kwargs.items()])
 
     def get_entries(self, resource_node: BaseResourceNode = "all", state: str = "all") -> List[Dict]:
-        with scoped_session_manager(self.session_factory, resource_node) as session:
-            if (resource_node != "all") and (state != "all"):
-                node_id = session.query(Node).filter_by(name=resource_node.name).first().id
-                samples = session.query(Sample).filter_by(node_id=node_id, state=state).all()
+        self.flush()
+        if self.state_model == "run_range" and resource_node != "all" and state in ("new", "current"):
+            with self.engine.connect() as conn:
+                params = self.run_range_params(conn, resource_node)
+                if state == "current" and params["b_run_id"] is None:
+                    return []
+                return [dict(row) for row in conn.execute(RUN_RANGE_STATEMENTS[f"select_{state}"], params).mappings()]
 
-            elif (resource_node != "all") and (state == "all"):
-                node_id = session.query(Node).filter_by(name=resource_node.name).first().id
-                samples = session.query(Sample).filter_by(node_id=node_id).all()
+        statements = self.entry_statements
+        if (resource_node != "all") and (state != "all"):
+            statement = statements["select_node_state"]
+            params = {"node_id": self.get_node_id(resource_node), "state": state}
 
-            elif (resource_node == "all") and (state == "all"):
-                samples = session.query(Sample).all()
-        
-            elif (resource_node == "all") and (state != "all"):
-                samples = session.query(Sample).filter_by(state=state).all()
+        elif (resource_node != "all") and (state == "all"):
+            statement = statements["select_node"]
+            params = {"node_id": self.get_node_id(resource_node)}
+
+        elif (resource_node == "all") and (state == "all"):
+            statement = statements["select_all"]
+            params = {}
+
+        elif (resource_node == "all") and (state != "all"):
+            statement = statements["select_state"]
+            params = {"state": state}
+
+        entries = []
+        for engine in self.sample_engines(resource_node):
+            with engine.connect() as conn:
+                entries.extend(dict(row) for row in conn.execute(statement, params).mappings())
+        return entries
+
+    def query_page(
+        self, table, filters: List, after_id: int = None, limit: int = 100, descending: bool = False, count_cap: int = 10000,
+        engines: List[Engine] = None
+    ) -> Dict:
+        """
+        Returns one page of rows from table using keyset pagination on the id column.
+        The returned dictionary contains:
+            rows: the rows of the page as dictionaries.
+            next_cursor: the id to pass as after_id to get the next page, or None if this is the last page.
+            approximate_total: the number of rows matching the filters, counted up to count_cap rows;
+            without filters, it is the largest id in the table, which is O(1) in SQLite but counts deleted rows.
+        engines defaults to the main engine; when several engines are given (sample shards), 
+        the page is read from each of them and the pages are merged by id.
+        """
+        self.flush()
+        engines = [self.engine] if engines is None else engines
+
+        statement = select(table).where(*filters)
+        if after_id is not None:
+            statement = statement.where(table.c.id < after_id if descending is True else table.c.id > after_id)
+        statement = statement.order_by(table.c.id.desc() if descending is True else table.c.id.asc()).limit(limit)
+
+        rows = []
+        total = 0
+        for engine in engines:
+            with engine.connect() as conn:
+                rows.extend(dict(row) for row in conn.execute(statement).mappings())
+
+                if len(filters) == 0 and len(engines) == 1:
+                    total += conn.execute(select(func.max(table.c.id))).scalar() or 0
+                else:
+                    capped = select(table.c.id).where(*filters).limit(count_cap).subquery()
+                    total += conn.execute(select(func.count()).select_from(capped)).scalar()
+
+        if len(engines) > 1:
+            rows.sort(key=lambda row: row["id"], reverse=descending)
+            rows = rows[:limit]
+            total = min(total, count_cap)
+
+        return {
+            "rows": rows,
+            "next_cursor": rows[-1]["id"] if len(rows) == limit else None,
+            "approximate_total": total,
+        }
+
+    def run_range_filters(self, table, run_range: Tuple[int, int] = None) -> List:
+        filters = []
+        if run_range is not None:
+            start, end = run_range
+            if start is not None:
+                filters.append(table.c.run_id >= start)
+            if end is not None:
+                filters.append(table.c.run_id <= end)
+        return filters
+
+    def query_runs(
+        self, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        table = Run.__table__
+        filters = []
+        if run_range is not None:
+            start, end = run_range
+            if start is not None:
+                filters.append(table.c.id >= start)
+            if end is not None:
+                filters.append(table.c.id <= end)
+        return self.query_page(table, filters, after_id, limit, descending)
+
+    def query_entries(
+        self, resource_node: BaseResourceNode = "all", state: str = "all", run_range: Tuple[int, int] = None, ids: List[int] = None,
+        after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        table = self.samples_table
+        filters = self.run_range_filters(table, run_range)
+        if resource_node != "all":
+            filters.append(table.c.node_id == self.get_node_id(resource_node))
+        if state != "all":
+            filters.append(table.c.state == state)
+        if ids is not None:
+            filters.append(table.c.id.in_(ids))
+        return self.query_page(table, filters, after_id, limit, descending, engines=self.sample_engines(resource_node))
+
+    def query_metrics(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        table = Metric.__table__
+        filters = self.run_range_filters(table, run_range)
+        if key is not None:
+            filters.append(table.c.key == key)
+        return self.query_page(table, filters, after_id, limit, descending)
+
+    def query_params(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        table = Param.__table__
+        filters = self.run_range_filters(table, run_range)
+        if key is not None:
+            filters.append(table.c.key == key)
+        return self.query_page(table, filters, after_id, limit, descending)
+
+    def query_tags(
+        self, key: str = None, run_range: Tuple[int, int] = None, after_id: int = None, limit: int = 100, descending: bool = False
+    ) -> Dict:
+        table = Tag.__table__
+        filters = self.run_range_filters(table, run_range)
+        if key is not None:
+            filters.append(table.c.key == key)
+        return self.query_page(table, filters, after_id, limit, descending)
+
+    def latest_change_cursor(self) -> int | str:
+        """
+        Returns the sequence number of the most recent change; pass it to changes_since() to follow the store from now on.
+        Note: when sharded is enabled, every shard has its own change log and the cursor is a string holding one position per database;
+        callers should treat cursors as opaque values.
+        """
+        self.flush()
+        positions = dict()
+        for key, engine in self.change_sources():
+            with engine.connect() as conn:
+                positions[key] = conn.execute(select(func.max(Change.__table__.c.id))).scalar() or 0
+
+        if self.sharded is False:
+            return positions[0]
+        return ",".join(f"{key}:{position}" for key, position in positions.items())
+
+    def change_sources(self, resource_node: BaseResourceNode = None) -> List[Tuple[int, Engine]]:
+        """
+        Returns the (key, engine) pairs of the databases holding change logs: the main database (key 0) and, when sharded is enabled,
+        the shard of resource_node or of every node (keyed by node id).
+        """
+        sources = [(0, self.engine)]
+        if self.sharded is True:
+            if resource_node is not None:
+                sources.append((self.get_node_id(resource_node), self.sample_engine(resource_node)))
+            else:
+                with self.engine.connect() as conn:
+                    node_ids = conn.execute(NODE_IDS).scalars().all()
+                sources.extend((node_id, self.open_shard(node_id)) for node_id in node_ids)
+        return sources
+
+    def changes_since(
+        self, cursor: int | str = 0, limit: int = 1000, resource_node: BaseResourceNode = None, tables: List[str] = None
+    ) -> Dict:
+        """
+        Returns the changes (inserts, updates, and deletes) made after cursor, in sequence order.
+        resource_node only filters out the changes of other nodes; changes that are not tied to a node (e.g., to runs) are always returned.
+        The returned dictionary contains:
+            changes: up to limit changes as dictionaries with the keys id, table_name, operation, row_id, node_id, run_id, and state.
+            cursor: the cursor to pass to the next call.
+        The cost of a call is proportional to the number of changes returned, not to the size of the tables.
+        Consecutive inserts into metrics, params, and tags for the same run are reported as one change (the latest insert),
+        and only the max_changes most recent changes are kept.
+        Note: when sharded is enabled, changes are in sequence order within each database (see latest_change_cursor()).
+        """
+        self.flush()
+
+        if isinstance(cursor, str) and ":" in cursor:
+            positions = {int(key): int(position) for key, position in (item.split(":") for item in cursor.split(","))}
+        else:
+            positions = {0: int(cursor)}
+
+        table = Change.__table__
+        changes = []
+        for key, engine in self.change_sources(resource_node):
+            if len(changes) == limit:
+                break
+
+            position = positions.get(key, 0)
+            statement = select(table).where(table.c.id > position)
+            if resource_node is not None:
+                node_id = self.get_node_id(resource_node)
+                statement = statement.where(or_(table.c.node_id == node_id, table.c.node_id.is_(None)))
+            if tables is not None:
+                statement = statement.where(table.c.table_name.in_(tables))
+            statement = statement.order_by(table.c.id.asc()).limit(limit - len(changes))
+
+            with engine.connect() as conn:
+                source_changes = [dict(row) for row in conn.execute(statement).mappings()]
+
+            if len(source_changes) > 0:
+                positions[key] = source_changes[-1]["id"]
+            changes.extend(source_changes)
+
+        if self.sharded is False:
+            next_cursor = positions[0]
+        else:
+            next_cursor = ",".join(f"{key}:{position}" for key, position in positions.items())
+
+        return {
+            "changes": changes,
+            "cursor": next_cursor
+        }
 
-            samples = [sample.as_dict() for sample in samples]
-            return samples
-    
     def get_entry(self, resource_node: BaseResourceNode, id: int) -> Dict:
-        with scoped_session_manager(self.session_factory, resource_node) as session:
-            node_id = session.query(Node).filter_by(name=resource_node.name).first().id
-            sample = session.query(Sample).filter_by(node_id=node_id, id=id).first()
-            return sample.as_dict()
-        
+        self.flush()
+        with self.sample_engine(resource_node).connect() as conn:
+            row = conn.execute(self.entry_statements["select_entry"], {"node_id": self.get_node_id(resource_node), "id": id}).mappings().first()
+            return dict(row) if row is not None else None
+
+    def get_entry_by_location(self, resource_node: BaseResourceNode, filepath: str) -> Dict:
+        self.flush()
+        with self.sample_engine(resource_node).connect() as conn:
+            row = conn.execute(self.entry_statements["select_location"], {"node_id": self.get_node_id(resource_node), "location": filepath}).mappings().first()
+            return dict(row) if row is not None else None
+
     def entry_exists(self, resource_node: BaseResourceNode, filepath: str) -> bool:
-        with scoped_session_manager(self.session_factory, resource_node) as session:
-            node_id = session.query(Node).filter_by(name=resource_node.name).first().id
-            return session.query(Sample).filter_by(node_id=node_id, location=filepath).count() > 0
+        node_id = self.get_node_id(resource_node)
+        # a queued sample is committed before the queue forgets it, so the database is only read for files that are not queued
+        if self.write_queue is not None and self.write_queue.is_pending((node_id, filepath)) is True:
+            return True
+        with self.sample_engine(resource_node).connect() as conn:
+            return conn.execute(ENTRY_EXISTS, {"node_id": node_id, "location": filepath}).first() is not None
+
+    def create_entry(
+        self, resource_node: BaseResourceNode, filepath: str, state: str = "new", run_id: int = None, content_hash: str = None, codec: str = None
+    ) -> None:
+        # in the future, refactor this by changing filepath to uri 
+        record = {
+            "node_id": self.get_node_id(resource_node), "location": filepath, "state": self.stored_state(state, run_id), 
+            "run_id": run_id, "created_at": datetime.utcnow(), "content_hash": content_hash, "codec": codec
+        }
+        if self.write_queue is not None:
+            self.write_queue.put("sample", record, key=(record["node_id"], filepath))
+            return
+
+        with self.sample_engine(resource_node).begin() as conn:
+            conn.execute(INSERT_ROW["sample"], record)
+
+    def create_entries(
+        self, resource_node: BaseResourceNode, filepaths: Sequence[str], state: str = "new", run_id: int = None, 
+        skip_existing: bool = True, batch_size: int = 10000, content_hashes: Sequence[str] = None, codec: str = None
+    ) -> int:
+        """
+        Records many files at once in transactions of batch_size rows; returns the number of entries created.
+        content_hashes, if given, holds the content hash of each file in filepaths; codec is the compression codec of all of the files.
+        With skip_existing, a file the node has already recorded is skipped (checked with an index lookup inside the insert);
+        pass skip_existing=False when the node is known to have no entries yet to insert the rows directly.
+        Note: the rows bypass the write-behind queue, they are already batched.
+        """
+        self.flush()
+
+        node_id = self.get_node_id(resource_node)
+        stored_state = self.stored_state(state, run_id)
+
+        if content_hashes is None:
+            content_hashes = [None] * len(filepaths)
+
+        engine = self.sample_engine(resource_node)
+        created = 0
+        for i in range(0, len(filepaths), batch_size):
+            # stored in the same format as the DateTime columns written by SQLAlchemy
+            created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+            batch = zip(filepaths[i:i + batch_size], content_hashes[i:i + batch_size])
+            if skip_existing is True:
+                rows = [(node_id, filepath, stored_state, run_id, created_at, content_hash, codec, node_id, filepath) for filepath, content_hash in batch]
+            else:
+                rows = [(node_id, filepath, stored_state, run_id, created_at, content_hash, codec) for filepath, content_hash in batch]
+
+            with engine.begin() as conn:
+                result = conn.exec_driver_sql(BULK_INSERT_MISSING_SAMPLES if skip_existing is True else BULK_INSERT_SAMPLES, rows)
+                created += result.rowcount
+        return created
+
+    def find_entries_by_hash(self, resource_node: BaseResourceNode, content_hash: str) -> List[Dict]:
+        """
+        Returns the entries of resource_node whose content hash is content_hash, oldest first.
+        """
+        self.flush()
+        table = self.samples_table
+        statement = select(table).where(table.c.node_id == bindparam("node_id"), table.c.content_hash == bindparam("content_hash")).order_by(table.c.id)
+        with self.sample_engine(resource_node).connect() as conn:
+            rows = conn.execute(statement, {"node_id": self.get_node_id(resource_node), "content_hash": content_hash}).mappings().all()
+            return [dict(row) for row in rows]
+
+    def known_hashes(self, resource_node: BaseResourceNode, content_hashes: Sequence[str], batch_size: int = 500) -> Set[str]:
+        """
+        Returns the subset of content_hashes that resource_node has already recorded.
+        """
+        self.flush()
+        table = Sample.__table__
+        node_id = self.get_node_id(resource_node)
+        content_hashes = list(content_hashes)
+
+        known = set()
+        with self.sample_engine(resource_node).connect() as conn:
+            for i in range(0, len(content_hashes), batch_size):
+                statement = select(table.c.content_hash).where(table.c.node_id == node_id, table.c.content_hash.in_(content_hashes[i:i + batch_size]))
+                known.update(conn.execute(statement).scalars())
+        return known
+
+    def delete_entries(self, resource_node: BaseResourceNode, entry_ids: List[int], batch_size: int = 500) -> int:
+        self.flush()
+
+        table = Sample.__table__
+        node_id = self.get_node_id(resource_node)
+
+        deleted = 0
+        with self.sample_engine(resource_node).begin() as conn:
+            for i in range(0, len(entry_ids), batch_size):
+                batch = entry_ids[i:i + batch_size]
+                result = conn.execute(delete(table).where(table.c.node_id == node_id, table.c.id.in_(batch)))
+                deleted += result.rowcount
+        return deleted
+
+    def vacuum(self, max_pages: int = None) -> int:
+        """
+        Runs an incremental vacuum, releasing up to max_pages free pages (all free pages if max_pages is None) back to the filesystem.
+        Returns the number of bytes reclaimed; always 0 for databases created before incremental auto-vacuum was enabled.
+        When sharded is enabled, every shard is vacuumed as well.
+        """
+        self.flush()
+        self.prune_changes()
+
+        engines = [self.engine] + (self.open_shards() if self.sharded is True else [])
+        return sum(self.vacuum_database(engine, max_pages) for engine in engines)
+
+    def prune_changes(self) -> int:
+        """
+        Deletes the changes older than the max_changes most recent changes of every database; returns the number of changes deleted.
+        """
+        if self.max_changes is None:
+            return 0
+
+        deleted = 0
+        for _, engine in self.change_sources():
+            with engine.begin() as conn:
+                deleted += conn.execute(PRUNE_CHANGES, {"b_keep": self.max_changes}).rowcount
+        return deleted
+
+    def vacuum_database(self, engine: Engine, max_pages: int = None) -> int:
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+            free_pages_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+            # note: the pragma frees one page per step, so the statement must be stepped to completion for the vacuum to finish
+            pages = f"({int(max_pages)})" if max_pages is not None else ""
+            cursor.execute(f"PRAGMA incremental_vacuum{pages}").fetchall()
+            connection.commit()
+
+            free_pages_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+
+        return (free_pages_before - free_pages_after) * page_size
 
-    def create_entry(self, resource_node: BaseResourceNode, filepath: str, state: str = "new", run_id: int = None) -> None:
-        with scoped_session_manager(self.session_factory, resource_node) as session:
-            # in the future, refactor this by changing filepath to uri 
-            node_id = session.query(Node).filter_by(name=resource_node.name).first().id
-            sample = Sample(node_id=node_id, location=filepath, state=state, run_id=run_id)
-            session.add(sample)
-            session.commit()
-    
     def add_run_id(self) -> None:
-        with scoped_session_manager(self.session_factory, self) as session:
-            for successor in self.successors:
-                if isinstance(successor, BaseResourceNode):
-                    node_id = session.query(Node).filter_by(name=successor.name).first().id
-                    samples = session.query(Sample).filter_by(node_id=node_id, run_id=None).all()
-                    for sample in samples:
-                        sample.run_id = self.get_run_id()
-                        sample.state = "current"
-                        session.commit()
+        self.flush()
+        if self.state_model == "run_range":
+            self.add_run_ranges()
+            return
+
+        # one UPDATE per resource node, in the node's shard when sharded is enabled
+        run_id = self.get_run_id()
+        for successor in self.successors:
+            if isinstance(successor, BaseResourceNode):
+                with self.sample_engine(successor).begin() as conn:
+                    conn.execute(START_RUN_SAMPLES, {"b_node_id": self.get_node_id(successor), "b_run_id": run_id})
+
+    def add_run_ranges(self) -> None:
+        """
+        Records the boundary of the current run for every resource node: one row per node, found with an index lookup.
+        """
+        run_id = self.get_run_id()
+        samples = Sample.__table__
+        node_ids = [self.get_node_id(successor) for successor in self.successors if isinstance(successor, BaseResourceNode)]
+
+        # the boundary is read and written in the same statement, so a sample created concurrently falls on one side of it
+        with self.engine.begin() as conn:
+            for node_id in node_ids:
+                boundary = select(literal(run_id), literal(node_id), func.coalesce(func.max(samples.c.id), 0)).where(samples.c.node_id == node_id)
+                conn.execute(insert(RunRange.__table__).from_select(["run_id", "node_id", "max_sample_id"], boundary))
 
     def add_end_time(self) -> None:
-        with scoped_session_manager(self.session_factory, self) as session:
-            run_id = self.get_run_id()
-            for successor in self.successors:
-                if isinstance(successor, BaseResourceNode):
-                    node_id = session.query(Node).filter_by(name=successor.name).first().id
-                    samples = session.query(Sample).filter_by(node_id=node_id, run_id=run_id, end_time=None).all()
-                    for sample in samples:
-                        sample.end_time = datetime.utcnow()
-                        sample.state = "old"
-                        session.commit()
+        self.flush()
+        if self.state_model == "run_range":
+            # the samples of the run become 'old' and get their end time when end_run() sets the end time of the run
+            return
+
+        run_id = self.get_run_id()
+        for successor in self.successors:
+            if isinstance(successor, BaseResourceNode):
+                with self.sample_engine(successor).begin() as conn:
+                    conn.execute(END_RUN_SAMPLES, {"b_node_id": self.get_node_id(successor), "b_run_id": run_id, "b_end_time": datetime.utcnow()})
 
     def start_run(self) -> None:
         with scoped_session_manager(self.session_factory, self) as session:
             run = Run()
             session.add(run)
             session.commit()
+            self.active_run_id = run.id
             self.log(f"--------------------------- started run {run.id} at {datetime.now()}")
     
     def end_run(self) -> None:
+        # make sure everything logged during the run is committed before the run is closed
+        self.flush()
+
         with scoped_session_manager(self.session_factory, self) as session:
             run: Run = session.query(Run).filter_by(end_time=None).first()
             run.end_time = datetime.utcnow()
             session.commit()
+            self.active_run_id = None
             self.log(f"--------------------------- ended run {run.id} at {datetime.now()}")
+
+        self.prune_changes()
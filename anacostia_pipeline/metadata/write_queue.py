@@ -0,0 +1,207 @@
+import time
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+
+_STOP = object()
+
+
+class WriteBehindError(Exception):
+    """
+    Raised by WriteBehindQueue.flush() when batches could not be committed after every retry;
+    records holds the (kind, record) tuples that were not written, so the caller can replay them with put().
+    """
+    def __init__(self, error: Exception, records: List[Tuple[str, Dict[str, Any]]]) -> None:
+        super().__init__(f"{len(records)} queued records could not be committed: {error}")
+        self.error = error
+        self.records = records
+
+
+class WriteBehindQueue:
+    """
+    Queue that decouples metadata writes from the threads that produce them.
+    Producers call put() and return immediately; a single writer thread collects the records
+    and hands them to the commit function in batches (group commit).
+    A batch is committed when it holds batch_size records or when its oldest record has waited flush_interval seconds,
+    whichever comes first.
+    A batch whose commit fails is retried max_retries times, waiting retry_backoff seconds (doubled after every attempt);
+    if it still fails, its records are kept and handed to the caller in the WriteBehindError raised by the next flush().
+    """
+    def __init__(
+        self, commit: Callable[[List[Tuple[str, Dict[str, Any]]]], None],
+        batch_size: int = 500, flush_interval: float = 0.05, name: str = "metadata_writer",
+        on_error: Callable[[Exception], None] = None, max_retries: int = 3, retry_backoff: float = 0.05
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError(f"batch_size argument of WriteBehindQueue must be at least 1, not '{batch_size}'.")
+
+        self.commit = commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self.on_error = on_error
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue = Queue()
+        self._thread: Optional[Thread] = None
+
+        self._stats_lock = Lock()
+        self._pending = 0
+        self._max_depth = 0
+        self._enqueued = 0
+        self._committed = 0
+        self._batches = 0
+        self._failed = 0
+        self._last_commit_seconds = 0.0
+        self._error: Optional[Exception] = None
+        self._failed_records: List[Tuple[str, Dict[str, Any]]] = []
+
+        # the number of records of every key that are queued and not committed yet, see is_pending()
+        self._pending_keys: Dict[Hashable, int] = dict()
+
+    def start(self) -> None:
+        self._thread = Thread(name=self.name, target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, kind: str, record: Dict[str, Any], key: Hashable = None) -> None:
+        """
+        Queues a record; a record put with a key is reported by is_pending(key) until it is committed (or its commit fails).
+        """
+        with self._stats_lock:
+            self._pending += 1
+            self._enqueued += 1
+            if self._pending > self._max_depth:
+                self._max_depth = self._pending
+            if key is not None:
+                self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+        self._queue.put((kind, record, key))
+
+    def is_pending(self, key: Hashable) -> bool:
+        """
+        Returns True if a record put with key is queued and not committed yet; answers from memory, without waiting for the writer.
+        """
+        with self._stats_lock:
+            return key in self._pending_keys
+
+    def flush(self, timeout: float = None) -> None:
+        """
+        Blocks until every record put before the call has been committed.
+        Raises a WriteBehindError with the records of every batch that failed since the previous flush(), if any.
+        """
+        with self._stats_lock:
+            pending = self._pending
+
+        if pending > 0 and self._thread is not None and self._thread.is_alive():
+            barrier = Event()
+            self._queue.put(barrier)
+            barrier.wait(timeout)
+
+        with self._stats_lock:
+            error = self._error
+            failed_records = self._failed_records
+            self._error = None
+            self._failed_records = []
+        if error is not None:
+            raise WriteBehindError(error, failed_records)
+
+    def stop(self) -> None:
+        """
+        Commits the records still in the queue and stops the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._pending,
+                "max_queue_depth": self._max_depth,
+                "enqueued": self._enqueued,
+                "committed": self._committed,
+                "failed": self._failed,
+                "batches": self._batches,
+                "last_commit_seconds": self._last_commit_seconds,
+            }
+
+    def _release_keys(self, batch: List[Tuple[str, Dict[str, Any], Hashable]]) -> None:
+        for _, _, key in batch:
+            if key is None:
+                continue
+            count = self._pending_keys.get(key, 0) - 1
+            if count > 0:
+                self._pending_keys[key] = count
+            else:
+                self._pending_keys.pop(key, None)
+
+    def _commit_batch(self, batch: List[Tuple[str, Dict[str, Any], Hashable]]) -> None:
+        records = [(kind, record) for kind, record, _ in batch]
+        backoff = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self.commit(records)
+                break
+            except Exception as e:
+                if attempt < self.max_retries:
+                    time.sleep(backoff)
+                    backoff *= 2
+                    continue
+
+                with self._stats_lock:
+                    self._pending -= len(batch)
+                    self._failed += len(batch)
+                    self._error = e
+                    self._failed_records.extend(records)
+                    self._release_keys(batch)
+                if self.on_error is not None:
+                    self.on_error(e)
+                return
+
+        with self._stats_lock:
+            self._pending -= len(batch)
+            self._committed += len(batch)
+            self._batches += 1
+            self._last_commit_seconds = time.perf_counter() - start
+            self._release_keys(batch)
+
+    def _run(self) -> None:
+        batch: List[Tuple[str, Dict[str, Any], Hashable]] = []
+        barriers: List[Event] = []
+        batch_started = None
+        stopping = False
+
+        while stopping is False:
+            if batch_started is None:
+                timeout = None
+            else:
+                timeout = max(0.0, batch_started + self.flush_interval - time.monotonic())
+
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, Event):
+                barriers.append(item)
+            elif item is not None:
+                batch.append(item)
+                if batch_started is None:
+                    batch_started = time.monotonic()
+
+            deadline_passed = batch_started is not None and time.monotonic() - batch_started >= self.flush_interval
+            if stopping or len(barriers) > 0 or len(batch) >= self.batch_size or deadline_passed:
+                if len(batch) > 0:
+                    self._commit_batch(batch)
+                batch = []
+                batch_started = None
+
+                for barrier in barriers:
+                    barrier.set()
+                barriers = []
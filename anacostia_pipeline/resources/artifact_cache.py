@@ -0,0 +1,138 @@
+import os
+import sys
+import copy
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+
+class ArtifactCache:
+    """
+    An in-process LRU cache of loaded artifacts with a budget of max_bytes bytes.
+
+    Entries are keyed by (kind, path, mtime_ns, size): an artifact that is modified or replaced gets a new key,
+    so a stale value is never returned and is evicted once it becomes the least recently used entry.
+    kind separates the values produced from the same file by different loaders (e.g., the whole text and a dashboard preview).
+    A value larger than max_bytes is returned but not cached.
+    The cache is thread-safe and can be shared by several nodes.
+
+    Every caller shares the cached values, so only values whose size is known exactly and that cannot be modified are cached by default:
+    str and bytes, and NumPy arrays (without Python objects), which are cached and returned as read-only views.
+    Other objects (e.g., the dictionaries loaded from JSON or unpickled models) are only cached with cache_objects=True;
+    their size is the size of their file, and every caller gets a deep copy of the cached object.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, cache_objects: bool = False) -> None:
+        if max_bytes < 0:
+            raise ValueError(f"max_bytes argument of ArtifactCache must be at least 0, not '{max_bytes}'.")
+
+        self.max_bytes = max_bytes
+        self.cache_objects = cache_objects
+        self.entries: OrderedDict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self.lock = Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(path: str, kind: str = "load_artifact") -> Tuple[str, str, int, int]:
+        stat = os.stat(path)
+        return (kind, path, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def is_array(value: Any) -> bool:
+        # numpy is only imported by the loaders, the type of the value is enough to recognize an array
+        return type(value).__module__.split(".")[0] == "numpy" and type(value).__name__ in ("ndarray", "memmap") \
+            and value.dtype.hasobject is False
+
+    def cached_entry(self, key: Hashable, value: Any) -> Optional[Tuple[Any, int]]:
+        """
+        Returns the value to cache for value and its size in bytes, or None if value must not be cached.
+        """
+        if isinstance(value, bytes):
+            return value, len(value)
+        if isinstance(value, str):
+            # a str does not reference other objects, so its size is exact
+            return value, sys.getsizeof(value)
+        if self.is_array(value):
+            view = value.view()
+            view.flags.writeable = False
+            return view, value.nbytes
+        if self.cache_objects is True:
+            # the size of the file the object was loaded from (the last item of the key)
+            return value, key[-1]
+        return None
+
+    def shared_value(self, value: Any) -> Any:
+        """
+        Returns what a caller gets for a cached value: the value itself if it cannot be modified, a deep copy otherwise.
+        """
+        if isinstance(value, (bytes, str)) or self.is_array(value):
+            return value
+        return copy.deepcopy(value)
+
+    def get_or_load(self, path: str, load: Callable[[], Any], kind: str = "load_artifact") -> Any:
+        """
+        Returns the cached value of the file at path, or calls load(), caches its result, and returns it.
+        Note: load() runs without the cache lock held, so two threads missing on the same key may both load it.
+        """
+        key = self.key(path, kind)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            return self.shared_value(entry[0])
+
+        value = load()
+        cached = self.cached_entry(key, value)
+        if cached is None:
+            return value
+        self.put(key, *cached)
+        return self.shared_value(cached[0])
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, path: str = None) -> None:
+        """
+        Drops every cached value of the file at path (of every file if path is None).
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.current_bytes = 0
+                return
+
+            for key in [key for key in self.entries if key[1] == path]:
+                self.current_bytes -= self.entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes
+            }
+
+
+# the cache shared by the nodes created with the default artifact_cache=True
+default_artifact_cache = ArtifactCache()
@@ -0,0 +1,126 @@
+import gzip
+import os
+from typing import BinaryIO, Dict, List
+
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError as e:
+        raise ImportError("The 'zstd' codec requires zstandard, install it with 'pip install zstandard'.") from e
+
+def _import_lz4_frame():
+    try:
+        import lz4.frame
+        return lz4.frame
+    except ImportError as e:
+        raise ImportError("The 'lz4' codec requires lz4, install it with 'pip install lz4'.") from e
+
+
+class Codec:
+    """
+    A compression format for stored artifacts.
+    writer() wraps a binary file opened for writing and compresses what is written to it;
+    reader() wraps a binary file opened for reading and decompresses it as it is read, so neither side holds the whole artifact in memory.
+    The identity codec ('none') returns the file itself.
+    """
+    name = "none"
+    extension = ""
+
+    def available(self) -> bool:
+        return True
+
+    def writer(self, fileobj: BinaryIO) -> BinaryIO:
+        return fileobj
+
+    def reader(self, fileobj: BinaryIO) -> BinaryIO:
+        return fileobj
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    extension = ".gz"
+
+    def __init__(self, level: int = 6) -> None:
+        self.level = level
+
+    def writer(self, fileobj: BinaryIO) -> BinaryIO:
+        # mtime=0 and an empty filename keep the output deterministic, so the same content always has the same content hash;
+        # without filename, GzipFile stores the name of fileobj (the temporary file the artifact is written to) in the header
+        return gzip.GzipFile(filename="", fileobj=fileobj, mode="wb", compresslevel=self.level, mtime=0)
+
+    def reader(self, fileobj: BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    extension = ".zst"
+
+    def __init__(self, level: int = 3) -> None:
+        self.level = level
+
+    def available(self) -> bool:
+        try:
+            _import_zstandard()
+            return True
+        except ImportError:
+            return False
+
+    def writer(self, fileobj: BinaryIO) -> BinaryIO:
+        zstandard = _import_zstandard()
+        return zstandard.ZstdCompressor(level=self.level).stream_writer(fileobj, closefd=False)
+
+    def reader(self, fileobj: BinaryIO) -> BinaryIO:
+        zstandard = _import_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    extension = ".lz4"
+
+    def available(self) -> bool:
+        try:
+            _import_lz4_frame()
+            return True
+        except ImportError:
+            return False
+
+    def writer(self, fileobj: BinaryIO) -> BinaryIO:
+        lz4_frame = _import_lz4_frame()
+        return lz4_frame.LZ4FrameFile(fileobj, mode="wb")
+
+    def reader(self, fileobj: BinaryIO) -> BinaryIO:
+        lz4_frame = _import_lz4_frame()
+        return lz4_frame.LZ4FrameFile(fileobj, mode="rb")
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in (Codec(), GzipCodec(), ZstdCodec(), Lz4Codec())}
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the codec called name ('none', 'gzip', 'zstd', or 'lz4'); raises a ValueError if the codec is unknown or not installed.
+    """
+    codec = CODECS.get(name if name is not None else "none")
+    if codec is None:
+        raise ValueError(f"codec must be one of {sorted(CODECS)}, not '{name}'.")
+    if codec.available() is False:
+        raise ValueError(f"codec '{name}' is not available, available codecs are {available_codecs()}.")
+    return codec
+
+def available_codecs() -> List[str]:
+    return [name for name, codec in CODECS.items() if codec.available() is True]
+
+def codec_for_path(path: str) -> Codec:
+    """
+    Returns the codec of a file from its extension, the identity codec for an extension no codec uses.
+    """
+    extension = os.path.splitext(path)[1]
+    for codec in CODECS.values():
+        if codec.extension != "" and codec.extension == extension:
+            return codec
+    return CODECS["none"]
@@ -1,31 +1,67 @@
+import io
 import os
-from typing import List, Any, Union, Dict
-from datetime import datetime
+import errno
+import mmap
+import uuid
+import hashlib
+import shutil
+from contextlib import contextmanager
+from typing import List, Any, Union, Dict, Iterator, Tuple, TYPE_CHECKING
+from datetime import datetime, timedelta
 from logging import Logger
-from threading import Thread
+from threading import Thread, Lock, Event, local
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty, Full
 import time
+import sys
 
 from ..engine.base import BaseMetadataStoreNode, BaseResourceNode
-from ..dashboard.subapps.filesystemstore import FilesystemStoreNodeApp
 from ..engine.constants import Status
+from .inotify import InotifyWatcher, inotify_available, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_ISDIR, IN_DELETE_SELF, IN_MOVE_SELF
+from .scanner import DirectoryScanner
+from .codecs import Codec, get_codec, codec_for_path
+from .artifact_cache import ArtifactCache, default_artifact_cache
+from .serializers import Serializer, MMAP_MODES, get_serializer, serializer_for_path
 
+if TYPE_CHECKING:
+    from ..dashboard.subapps.filesystemstore import FilesystemStoreNodeApp
+
+
+# artifacts are written to a temporary file next to their final path and renamed into place once they are complete;
+# the temporary files are excluded from scans, so the observer never records a half-written artifact
+TEMP_FILE_SUFFIX = ".anacostia-tmp"
 
 
 class FilesystemStoreNode(BaseResourceNode):
     def __init__(
         self, name: str, resource_path: str, metadata_store: BaseMetadataStoreNode, 
-        init_state: str = "new", max_old_samples: int = None, loggers: Union[Logger, List[Logger]] = None, monitoring: bool = True
+        init_state: str = "new", max_old_samples: int = None, loggers: Union[Logger, List[Logger]] = None, monitoring: bool = True,
+        watcher: str = "auto", recursive: bool = False, include: List[str] = None, exclude: List[str] = None, scan_workers: int = 1,
+        max_old_age: float = None, max_old_bytes: int = None, archive_path: str = None,
+        backfill: bool = True, backfill_batch_size: int = 10000, hash_content: bool = False, dedup: str = "off", hash_workers: int = 4,
+        codec: str = "none", artifact_cache: Union[bool, ArtifactCache] = True, sequence_block_size: int = 1,
+        prefetch: int = 0, prefetch_workers: int = 4, serializer: str = "text", mmap_mode: str = None
     ) -> None:
 
-        # TODO: add max_old_samples functionality
-        self.max_old_samples = max_old_samples
-        
         # note: the resource_path must be a path for a directory.
         # we may want to rename this node to be a directory watch node;
         # this means this node should only be used to monitor filesystem directories and S3 buckets
         self.path = os.path.abspath(resource_path)
         if os.path.exists(self.path) is False:
             os.makedirs(self.path, exist_ok=True)
+
+        # retention policy for 'old' samples, enforced at the end of every run:
+        # keep at most max_old_samples old samples, none older than max_old_age seconds (measured from the end of their run),
+        # and at most max_old_bytes bytes of old samples; the newest old samples are kept first.
+        # expired files are moved into archive_path if it is given, otherwise they are deleted.
+        self.max_old_samples = max_old_samples
+        self.max_old_age = max_old_age
+        self.max_old_bytes = max_old_bytes
+        self.archive_path = os.path.abspath(archive_path) if archive_path is not None else None
+        if self.archive_path is not None:
+            if os.path.commonpath([self.path, self.archive_path]) == self.path:
+                raise ValueError(f"archive_path '{self.archive_path}' must not be inside the resource_path '{self.path}'.")
+            os.makedirs(self.archive_path, exist_ok=True)
         
         self.observer_thread = None
 
@@ -33,60 +69,795 @@ class FilesystemStoreNode(BaseResourceNode):
             raise ValueError(f"init_state argument of DataStoreNode must be either 'new' or 'old', not '{init_state}'.")
         self.init_state = init_state
         self.init_time = str(datetime.now())
+
+        # backfill records the files already in resource_path when the node is set up, in large batches and with the init_state;
+        # the observer then only has to detect the files added afterwards
+        self.backfill_enabled = backfill
+        self.backfill_batch_size = backfill_batch_size
+
+        # hash_content stores the SHA-256 of every file the node records, computed by a pool of hash_workers threads;
+        # dedup decides what happens to a detected file with the same content as a file the node already recorded:
+        # "off" records it, "skip" leaves it in place without recording it, "link" replaces it with a hard link to the recorded file.
+        # a duplicate is not recorded, so it does not trigger a run. dedup implies hash_content.
+        if dedup not in ("off", "skip", "link"):
+            raise ValueError(f"dedup argument of FilesystemStoreNode must be either 'off', 'skip', or 'link', not '{dedup}'.")
+        self.dedup = dedup
+        self.hash_content = hash_content is True or dedup != "off"
+        self.hash_workers = hash_workers
+        self.hash_pool: ThreadPoolExecutor = None
+
+        # the duplicates that were skipped, with the (mtime, size) they had, so they are not hashed again until they change
+        self.duplicates: Dict[str, Tuple[int, int]] = dict()
+
+        # codec compresses the artifacts written by save_artifact ('none', 'gzip', 'zstd' or 'lz4', see resources/codecs.py);
+        # the codec of every recorded file is stored in the metadata store, detected files get the codec matching their extension
+        self.codec = get_codec(codec)
+
+        # serializer converts the artifacts saved and loaded by the node ('text', 'bytes', 'json', 'pickle', 'mmap_pickle', 'npy', 'npz', or 'arrow',
+        # see resources/serializers.py); with 'auto', the serializer is chosen from the extension of every file, 'text' for unknown extensions.
+        # every artifact is text unless the node asks for another serializer: files dropped into a watched directory must not be unpickled by default.
+        # mmap_mode ('r' or 'c') maps uncompressed npy, mmap_pickle, and arrow artifacts into memory when they are loaded instead of reading them
+        if mmap_mode not in MMAP_MODES:
+            raise ValueError(f"mmap_mode argument of FilesystemStoreNode must be one of {MMAP_MODES}, not '{mmap_mode}'.")
+        # self.serializer is None with 'auto'
+        self.serializer = get_serializer(serializer) if serializer != "auto" else None
+        self.mmap_mode = mmap_mode
+
+        # artifact_cache keeps the artifacts returned by load_artifact in memory, keyed by path, mtime, and size:
+        # True uses the cache shared by every node of the process, False disables caching, an ArtifactCache is used as is;
+        # the shared cache only keeps text, bytes, and arrays, pass ArtifactCache(cache_objects=True) to also cache other objects
+        if artifact_cache is True:
+            self.artifact_cache = default_artifact_cache
+        elif artifact_cache is False or artifact_cache is None:
+            self.artifact_cache = None
+        else:
+            self.artifact_cache = artifact_cache
+
+        # watcher is the backend used to detect new files: 
+        # "inotify" uses kernel events (Linux only), "polling" lists the directory every 100ms, 
+        # "auto" uses inotify when it is available and falls back to polling otherwise,
+        # including when inotify fails at runtime (e.g., the max_user_instances or max_user_watches limits are reached).
+        if watcher not in ("auto", "inotify", "polling"):
+            raise ValueError(f"watcher argument of FilesystemStoreNode must be either 'auto', 'inotify', or 'polling', not '{watcher}'.")
+        if watcher == "inotify" and inotify_available() is False:
+            raise ValueError(f"watcher 'inotify' is not available on platform '{sys.platform}', use 'polling' instead.")
+        self.watcher_fallback = watcher == "auto"
+        if watcher == "auto":
+            watcher = "inotify" if inotify_available() is True else "polling"
+        self.watcher = watcher
+
+        # recursive enables monitoring of subdirectories (e.g., partitioned datasets like date=YYYY-MM-DD/part-*.parquet);
+        # include and exclude are glob patterns matched against the path relative to resource_path and against the file name;
+        # scan_workers is the number of threads used to list directories when the tree is scanned.
+        exclude = list(exclude) if exclude is not None else list()
+        self.scanner = DirectoryScanner(
+            self.path, recursive=recursive, include=include, exclude=exclude + [f"*{TEMP_FILE_SUFFIX}"], workers=scan_workers
+        )
+
+        # the artifacts written inside artifact_batch() by each thread, committed when the batch ends
+        self.write_batch = local()
+
+        # create_filename() numbers files with a sequence persisted by the metadata store;
+        # sequence_block_size values are reserved at a time, so only one in sequence_block_size names costs a metadata transaction
+        # (the unused values of a block are skipped after a restart)
+        if sequence_block_size < 1:
+            raise ValueError(f"sequence_block_size argument of FilesystemStoreNode must be at least 1, not '{sequence_block_size}'.")
+        self.sequence_block_size = sequence_block_size
+        self.sequence_lock = Lock()
+        self.sequence_next: int = None
+        self.sequence_end: int = None
+
+        # prefetch is the number of loaded 'current' artifacts buffered ahead of iter_current_artifacts() (0 disables prefetching);
+        # when a run starts, prefetch_workers threads load the artifacts of the run in the background, 
+        # so the action nodes compute on one artifact while the next ones are read
+        if prefetch < 0:
+            raise ValueError(f"prefetch argument of FilesystemStoreNode must be at least 0, not '{prefetch}'.")
+        if prefetch_workers < 1:
+            raise ValueError(f"prefetch_workers argument of FilesystemStoreNode must be at least 1, not '{prefetch_workers}'.")
+        self.prefetch = prefetch
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_buffer: Queue = None
+        self.prefetch_stop: Event = None
+        self.prefetch_thread: Thread = None
         
         super().__init__(name=name, resource_path=resource_path, metadata_store=metadata_store, loggers=loggers, monitoring=monitoring)
     
-    def get_app(self) -> FilesystemStoreNodeApp:
+    def get_app(self) -> 'FilesystemStoreNodeApp':
+        from ..dashboard.subapps.filesystemstore import FilesystemStoreNodeApp
         return FilesystemStoreNodeApp(self)
 
     @BaseResourceNode.resource_accessor
     def setup(self) -> None:
         self.log(f"Setting up node '{self.name}'")
         self.metadata_store.create_resource_tracker(self)
+        if self.backfill_enabled is True:
+            self.backfill()
         self.log(f"Node '{self.name}' setup complete.")
+
+    @BaseResourceNode.resource_accessor
+    def backfill(self) -> Dict:
+        """
+        Records every file already in the directory tree with the init_state, batch_size files per transaction.
+        Files recorded before (e.g., by a previous run of the pipeline on the same metadata store) are skipped.
+        Returns a report with the number of files found and recorded and the time it took.
+        Note: the scan also fills the scanner's directory cache, so the observer's first scan skips the directories listed here.
+        """
+        start = time.perf_counter()
+        report = {"files_found": 0, "files_recorded": 0, "seconds": 0.0}
+
+        # an empty tracker cannot have recorded any of the files, so the existence check can be skipped
+        skip_existing = self.metadata_store.get_num_entries(self, "all") > 0
+
+        def _record(batch: List[str]) -> None:
+            content_hashes = None
+            if self.hash_content is True:
+                # hashing is far more expensive than the existence check, so the files recorded before are left out first
+                if skip_existing is True:
+                    batch = [filepath for filepath in batch if self.metadata_store.entry_exists(self, filepath) is False]
+                batch, content_hashes = self.deduplicate(batch, self.hash_files(batch))
+
+            # the files of a batch are recorded per codec (i.e., per compressed file extension)
+            groups: Dict[str, Tuple[List[str], List[str]]] = dict()
+            for i, filepath in enumerate(batch):
+                filepaths, hashes = groups.setdefault(codec_for_path(filepath).name, ([], []))
+                filepaths.append(filepath)
+                hashes.append(content_hashes[i] if content_hashes is not None else None)
+
+            for codec, (filepaths, hashes) in groups.items():
+                report["files_recorded"] += self.metadata_store.create_entries(
+                    self, filepaths, state=self.init_state, skip_existing=skip_existing, batch_size=self.backfill_batch_size, 
+                    content_hashes=hashes, codec=codec
+                )
+            elapsed = time.perf_counter() - start
+            self.log(
+                f"Backfill of node '{self.name}': recorded {report['files_recorded']} of {report['files_found']} files found so far "
+                f"({report['files_found'] / elapsed:,.0f} files/s)", 
+                level="INFO"
+            )
+
+        batch = []
+        try:
+            for entries in self.scanner.scan():
+                batch.extend(entry.path for entry in entries)
+                report["files_found"] += len(entries)
+                if len(batch) >= self.backfill_batch_size:
+                    _record(batch)
+                    batch = []
+
+            if len(batch) > 0:
+                _record(batch)
+        except Exception as e:
+            # forget the listed directories so the observer records the files the backfill did not get to
+            self.scanner.invalidate()
+            raise e
+
+        report["seconds"] = time.perf_counter() - start
+        self.log(
+            f"Backfill of node '{self.name}' complete: recorded {report['files_recorded']} new files as '{self.init_state}' "
+            f"out of {report['files_found']} files in {report['seconds']:.2f}s", 
+            level="INFO"
+        )
+        return report
     
     @BaseResourceNode.resource_accessor
-    def record_new(self, filepath: str) -> Dict:
-        self.metadata_store.create_entry(self, filepath=filepath, state="new")
+    def record_new(self, filepath: str, content_hash: str = None) -> Dict:
+        self.metadata_store.create_entry(self, filepath=filepath, state="new", content_hash=content_hash, codec=codec_for_path(filepath).name)
 
     @BaseResourceNode.resource_accessor
     def record_current(self, filepath: str) -> None:
         self.metadata_store.create_entry(self, filepath=filepath, state="current", run_id=self.metadata_store.get_run_id())
     
+    def record_detected(self, filepath: str) -> None:
+        if self.hash_content is True:
+            self.record_detected_files([filepath])
+            return
+
+        if self.metadata_store.entry_exists(self, filepath) is False:
+            self.log(f"'{self.name}' detected file: {filepath}")
+            self.record_new(filepath)
+
+    def record_detected_files(self, filepaths: List[str]) -> None:
+        """
+        Records the files the metadata store has not seen yet along with their content hashes; 
+        the files are hashed in parallel and duplicates are handled according to dedup.
+        """
+        filepaths = [
+            filepath for filepath in filepaths 
+            if self.metadata_store.entry_exists(self, filepath) is False and self.is_known_duplicate(filepath) is False
+        ]
+        filepaths, content_hashes = self.deduplicate(filepaths, self.hash_files(filepaths))
+        for filepath, content_hash in zip(filepaths, content_hashes):
+            self.log(f"'{self.name}' detected file: {filepath}")
+            self.record_new(filepath, content_hash)
+
+    def hash_file(self, filepath: str) -> str:
+        """
+        Returns the SHA-256 of the file as a hex string, or None if the file was removed before it could be hashed.
+        """
+        # hashlib releases the GIL while it hashes large buffers, so files are hashed in parallel by the threads of the hash pool
+        digest = hashlib.sha256()
+        try:
+            for chunk in self.iter_artifact_chunks(filepath):
+                digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        return digest.hexdigest()
+
+    def hash_files(self, filepaths: List[str]) -> List[str]:
+        if len(filepaths) <= 1 or self.hash_workers <= 1:
+            return [self.hash_file(filepath) for filepath in filepaths]
+
+        if self.hash_pool is None:
+            self.hash_pool = ThreadPoolExecutor(max_workers=self.hash_workers, thread_name_prefix=f"{self.name}_hasher")
+        return list(self.hash_pool.map(self.hash_file, filepaths))
+
+    def deduplicate(self, filepaths: List[str], content_hashes: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Returns the files (and their hashes) that should be recorded: all of them when dedup is "off", 
+        otherwise the files whose content is not already recorded by the node or held by an earlier file of the same list.
+        """
+        # files removed before they were hashed are not recorded
+        if None in content_hashes:
+            pairs = [(filepath, content_hash) for filepath, content_hash in zip(filepaths, content_hashes) if content_hash is not None]
+            filepaths = [filepath for filepath, _ in pairs]
+            content_hashes = [content_hash for _, content_hash in pairs]
+
+        if self.dedup == "off" or len(filepaths) == 0:
+            return filepaths, content_hashes
+
+        known = self.metadata_store.known_hashes(self, set(content_hashes))
+        originals: Dict[str, str] = dict()
+        kept_filepaths = []
+        kept_hashes = []
+        for filepath, content_hash in zip(filepaths, content_hashes):
+            original = originals.get(content_hash)
+            if original is None and content_hash in known:
+                original = self.recorded_copy(content_hash)
+
+            # a file is never a duplicate of itself, and a duplicate of a recorded file that no longer exists is recorded
+            if original is not None and original != filepath:
+                self.skip_duplicate(filepath, original)
+                continue
+
+            originals.setdefault(content_hash, filepath)
+            kept_filepaths.append(filepath)
+            kept_hashes.append(content_hash)
+        return kept_filepaths, kept_hashes
+
+    def recorded_copy(self, content_hash: str) -> str:
+        for entry in self.metadata_store.find_entries_by_hash(self, content_hash):
+            if os.path.exists(entry["location"]) is True:
+                return entry["location"]
+        return None
+
+    def skip_duplicate(self, filepath: str, original: str) -> None:
+        if self.dedup == "link":
+            temp_path = f"{filepath}.{uuid.uuid4().hex}{TEMP_FILE_SUFFIX}"
+            try:
+                os.link(original, temp_path)
+                os.replace(temp_path, filepath)
+            except OSError as e:
+                # e.g., the filesystem does not support hard links; the duplicate is kept as is
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                self.log(f"'{self.name}' could not link duplicate file {filepath} to {original}: {e}", level="WARNING")
+
+        stat = os.stat(filepath)
+        self.duplicates[filepath] = (stat.st_mtime_ns, stat.st_size)
+        self.log(f"'{self.name}' skipped duplicate file {filepath} (same content as {original})")
+
+    def is_known_duplicate(self, filepath: str) -> bool:
+        """
+        Returns True if filepath was skipped as a duplicate and has not changed since.
+        """
+        known_stat = self.duplicates.get(filepath)
+        if known_stat is None:
+            return False
+
+        try:
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            del self.duplicates[filepath]
+            return True
+
+        if (stat.st_mtime_ns, stat.st_size) != known_stat:
+            del self.duplicates[filepath]
+            return False
+        return True
+
+    def scan_directory(self, root: str = None) -> None:
+        """
+        Scans the directory tree (or the subtree at root) and records every file the metadata store has not seen yet.
+        Used by the polling watcher on every poll and by the inotify watcher to recover from an overflowed event queue.
+        Note: the resource lock is held per directory rather than for the whole scan, 
+        so a scan of a very large tree does not block other calls to the node.
+        """
+        for entries in self.scanner.scan(root):
+            with self.resource_lock:
+                try:
+                    if self.hash_content is True:
+                        self.record_detected_files([entry.path for entry in entries])
+                    else:
+                        for entry in entries:
+                            self.record_detected(entry.path)
+                except Exception as e:
+                    # make sure the directory is listed again on the next scan so the files that were not recorded are not skipped
+                    self.scanner.invalidate(os.path.dirname(entries[0].path))
+                    raise e
+
     def start_monitoring(self) -> None:
 
-        def _monitor_thread_func():
-            self.log(f"Starting observer thread for node '{self.name}'")
+        def _polling_thread_func():
+            self.log(f"Starting polling observer thread for node '{self.name}'")
             while self.status == Status.RUNNING:
-                with self.resource_lock:
-                    for filename in os.listdir(self.path):
-                        filepath = os.path.join(self.path, filename)
-                        if self.metadata_store.entry_exists(self, filepath) is False:
-                            self.log(f"'{self.name}' detected file: {filepath}")
-                            self.record_new(filepath)
-
-                # put this sleep here so that the _monitor_thread_func stops acquiring the lock, 
-                # thus preventing _monitor_thread_func from being a greedy thread.
+                self.scan_directory()
+
+                # put this sleep here so that the _polling_thread_func stops acquiring the lock, 
+                # thus preventing _polling_thread_func from being a greedy thread.
                 # without this sleep, the @BaseResourceNode.resource_accessor will take too long to run for methods like .get_artifact()
                 time.sleep(0.1)
-                
-        self.observer_thread = Thread(name=f"{self.name}_observer", target=_monitor_thread_func)
+
+        def _add_watch(watcher: InotifyWatcher, directory: str) -> None:
+            try:
+                watcher.add_watch(directory)
+            except OSError as e:
+                # running out of watches or memory affects every directory, the observer cannot continue with inotify
+                if e.errno in (errno.ENOSPC, errno.EMFILE, errno.ENFILE, errno.ENOMEM):
+                    raise e
+                # e.g., the directory was removed before its watch was added
+                self.log(f"Could not watch directory '{directory}' for node '{self.name}', skipping it: {e}", level="WARNING")
+
+        def _inotify_thread_func():
+            try:
+                _inotify_observer()
+            except OSError as e:
+                if self.watcher_fallback is False:
+                    self.log(f"inotify observer of node '{self.name}' failed: {e}", level="ERROR")
+                    self.status = Status.ERROR
+                    return
+                self.log(f"inotify observer of node '{self.name}' failed, falling back to polling: {e}", level="WARNING")
+                self.watcher = "polling"
+                _polling_thread_func()
+
+        def _inotify_observer():
+            self.log(f"Starting inotify observer thread for node '{self.name}'")
+            watcher = InotifyWatcher(self.path)
+            try:
+                # files created before the watch was added do not generate events, so pick them up with one full scan
+                self.scan_directory()
+
+                if self.scanner.recursive is True:
+                    for directory in self.scanner.directories():
+                        if directory != self.path:
+                            _add_watch(watcher, directory)
+
+                    # rescan to pick up the files created in subdirectories before their watches were added;
+                    # directories that have not changed since the first scan are pruned by the scanner
+                    self.scan_directory()
+
+                while self.status == Status.RUNNING:
+                    # the timeout bounds how long it takes for the thread to notice the node is exiting
+                    events, overflowed = watcher.read_events(timeout=0.1)
+
+                    if overflowed is True:
+                        self.log(f"inotify event queue overflowed for node '{self.name}', rescanning '{self.path}'", level="WARNING")
+                        self.scan_directory()
+                        continue
+
+                    for filepath, mask in events:
+                        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                            self.log(f"Directory '{filepath}' watched by node '{self.name}' was removed or moved", level="WARNING")
+                            continue
+
+                        if mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO) and self.scanner.matches_directory(filepath) is True:
+                                # watch the new subdirectory and everything below it, then record the files already inside it
+                                for directory in [filepath, *self._list_subdirectories(filepath)]:
+                                    _add_watch(watcher, directory)
+                                self.scan_directory(filepath)
+                            continue
+
+                        # ignore IN_CREATE events; half-written files are recorded once the writer closes them
+                        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) == 0:
+                            continue
+
+                        if os.path.isfile(filepath) is False or self.scanner.matches_file(filepath) is False:
+                            continue
+
+                        with self.resource_lock:
+                            self.record_detected(filepath)
+            finally:
+                watcher.close()
+
+        if self.watcher == "inotify":
+            target = _inotify_thread_func
+        else:
+            target = _polling_thread_func
+
+        self.observer_thread = Thread(name=f"{self.name}_observer", target=target)
         self.observer_thread.start()
 
+    def _list_subdirectories(self, root: str) -> List[str]:
+        subdirectories = []
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if self.scanner.matches_directory(os.path.join(dirpath, d)) is True]
+            subdirectories.extend(os.path.join(dirpath, d) for d in dirnames)
+        return subdirectories
+
+    def retention_enabled(self) -> bool:
+        return any(limit is not None for limit in (self.max_old_samples, self.max_old_age, self.max_old_bytes))
+
+    @BaseResourceNode.log_exception
+    def on_run_start(self) -> None:
+        if self.prefetch > 0:
+            self.start_prefetch()
+
+    @BaseResourceNode.log_exception
+    def on_run_end(self) -> None:
+        # artifacts of the run that were prefetched but not consumed are dropped
+        self.stop_prefetch()
+        if self.retention_enabled() is True:
+            self.enforce_retention()
+
+    @BaseResourceNode.log_exception
+    def start_prefetch(self) -> None:
+        """
+        Starts loading the 'current' artifacts of the run into the prefetch buffer, which holds at most prefetch artifacts;
+        the loader threads wait while the buffer is full, so memory stays bounded however many artifacts the run has.
+        """
+        self.stop_prefetch()
+
+        paths = Queue()
+        for artifact_path in self.list_artifacts("current"):
+            paths.put(artifact_path)
+
+        buffer = Queue(maxsize=self.prefetch)
+        stop = Event()
+
+        def _put(item: Tuple[str, Any]) -> bool:
+            while stop.is_set() is False:
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def _load_thread_func():
+            while stop.is_set() is False:
+                try:
+                    artifact_path = paths.get_nowait()
+                except Empty:
+                    return
+                try:
+                    item = (artifact_path, self.read_artifact(artifact_path))
+                except Exception as e:
+                    # the error is raised by iter_current_artifacts() when the consumer reaches the artifact
+                    item = (artifact_path, e)
+                if _put(item) is False:
+                    return
+
+        def _prefetch_thread_func():
+            workers = [
+                Thread(target=_load_thread_func, name=f"{self.name}-prefetch-{i}", daemon=True) 
+                for i in range(min(self.prefetch_workers, max(paths.qsize(), 1)))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            # None marks the end of the run's artifacts
+            _put(None)
+
+        self.prefetch_buffer = buffer
+        self.prefetch_stop = stop
+        self.prefetch_thread = Thread(target=_prefetch_thread_func, name=f"{self.name}-prefetch", daemon=True)
+        self.prefetch_thread.start()
+
+    def stop_prefetch(self) -> None:
+        if self.prefetch_thread is None:
+            return
+        self.prefetch_stop.set()
+        self.prefetch_thread.join()
+        self.prefetch_buffer = None
+        self.prefetch_stop = None
+        self.prefetch_thread = None
+
+    def iter_current_artifacts(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Yields (path, content) for every 'current' artifact of the run.
+        With prefetching enabled, the artifacts are yielded in the order they finish loading and the prefetch buffer is consumed,
+        so the buffer should be consumed by one iterator per run; 
+        any other iterator (or every iterator, without prefetching) loads the artifacts one after another with load_artifact().
+        """
+        buffer = self.prefetch_buffer
+        stop = self.prefetch_stop
+        if buffer is None or stop is None or stop.is_set() is True:
+            for artifact_path in self.list_artifacts("current"):
+                yield artifact_path, self.load_artifact(artifact_path)
+            return
+
+        # claim the buffer, later iterators fall back to loading the artifacts themselves
+        self.prefetch_buffer = None
+        while True:
+            try:
+                item = buffer.get(timeout=0.1)
+            except Empty:
+                if stop.is_set() is True:
+                    return
+                continue
+            if item is None:
+                return
+            artifact_path, content = item
+            if isinstance(content, Exception):
+                raise content
+            yield artifact_path, content
+
+    @BaseResourceNode.log_exception
+    @BaseResourceNode.resource_accessor
+    def enforce_retention(self) -> Dict:
+        """
+        Expires the old samples that exceed the retention policy: their files are archived or deleted,
+        their entries are deleted from the metadata store in batches, and the freed database pages are vacuumed.
+        Returns a report of what was expired and how much space was reclaimed.
+        Note: the files are removed before the entries, and the resource lock is held throughout,
+        so the observer can never see an expired file that is no longer recorded and record it again.
+        """
+        old_entries = []
+        after_id = None
+        while True:
+            page = self.metadata_store.query_entries(self, state="old", after_id=after_id, limit=1000, descending=True)
+            old_entries.extend(page["rows"])
+            after_id = page["next_cursor"]
+            if after_id is None:
+                break
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_old_age) if self.max_old_age is not None else None
+        kept_samples = 0
+        kept_bytes = 0
+        expired = []
+
+        # entries are ordered from newest to oldest, so once an entry exceeds the count or byte budget, every older entry does too
+        for entry in old_entries:
+            size = os.path.getsize(entry["location"]) if os.path.exists(entry["location"]) else 0
+
+            exceeds_count = self.max_old_samples is not None and kept_samples >= self.max_old_samples
+            exceeds_bytes = self.max_old_bytes is not None and kept_bytes + size > self.max_old_bytes
+            exceeds_age = cutoff is not None and entry["end_time"] is not None and entry["end_time"] < cutoff
+
+            if exceeds_count or exceeds_bytes or exceeds_age:
+                expired.append((entry, size))
+            else:
+                kept_samples += 1
+                kept_bytes += size
+
+        report = {"expired": 0, "archived_files": 0, "deleted_files": 0, "bytes_reclaimed": 0, "db_bytes_reclaimed": 0}
+        if len(expired) == 0:
+            return report
+
+        for entry, size in expired:
+            location = entry["location"]
+            if os.path.exists(location) is False:
+                continue
+
+            if self.artifact_cache is not None:
+                self.artifact_cache.invalidate(location)
+
+            if self.archive_path is not None:
+                destination = os.path.join(self.archive_path, os.path.relpath(location, self.path))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.move(location, destination)
+                report["archived_files"] += 1
+            else:
+                os.remove(location)
+                report["deleted_files"] += 1
+            report["bytes_reclaimed"] += size
+
+        report["expired"] = self.metadata_store.delete_entries(self, [entry["id"] for entry, _ in expired])
+        report["db_bytes_reclaimed"] = self.metadata_store.vacuum()
+
+        self.log(
+            f"Retention for node '{self.name}': expired {report['expired']} old samples "
+            f"({report['archived_files']} archived, {report['deleted_files']} deleted), "
+            f"reclaimed {report['bytes_reclaimed']} bytes of files and {report['db_bytes_reclaimed']} bytes of metadata",
+            level="INFO"
+        )
+        return report
+
     @BaseResourceNode.resource_accessor
     def trigger_condition(self) -> bool:
         # implement the triggering logic here
         return True
     
     @BaseResourceNode.log_exception
-    @BaseResourceNode.resource_accessor
     def create_filename(self) -> str:
-        return f"file{self.get_num_artifacts('all')}.txt"
+        # the name is unique even among concurrent writers and the artifacts of a batch that are not recorded yet;
+        # a number whose file already exists (e.g., a file copied into the directory by hand) is skipped
+        while True:
+            filename = f"file{self.next_sequence()}.txt"
+            if os.path.exists(os.path.join(self.path, filename + self.codec.extension)) is False:
+                return filename
+
+    def next_sequence(self) -> int:
+        """
+        Returns the next value of the node's sequence, reserving a new block from the metadata store when the current block is used up.
+        Note: the sequence lock is used instead of the resource lock, so naming a file does not wait for the observer.
+        """
+        with self.sequence_lock:
+            if self.sequence_next is None or self.sequence_next >= self.sequence_end:
+                self.sequence_next = self.metadata_store.allocate_sequence(self, self.sequence_block_size)
+                self.sequence_end = self.sequence_next + self.sequence_block_size
+            value = self.sequence_next
+            self.sequence_next += 1
+            return value
     
     @BaseResourceNode.log_exception
     @BaseResourceNode.resource_accessor
-    def save_artifact(self, content: str) -> None:
-        pass
+    def save_artifact(self, content: Any, filename: str = None, fsync: bool = True, serializer: str = None) -> str:
+        """
+        Writes content to filename (defaults to create_filename()) inside resource_path and records it as 'current'; returns the path of the artifact.
+        The content is converted with the serializer called serializer, or else the serializer of the node
+        (with serializer='auto', the serializer matching the extension of filename; a str is encoded as UTF-8 by default).
+        The content is written to a temporary file that is renamed into place, so a crash never leaves a partial artifact behind,
+        and the artifact is only recorded once it is durable (when fsync is True) and in place.
+        Inside artifact_batch(), the rename and the record are deferred to the end of the batch.
+        Artifacts can only be saved during a run; nothing is written if no run is active.
+        """
+        self.active_run_id()
+        artifact_serializer = get_serializer(serializer) if serializer is not None else self.serializer
+        if filename is None:
+            filepath = self.generate_filepath(artifact_serializer)
+        else:
+            filepath = os.path.join(self.path, filename)
+            if filepath.endswith(self.codec.extension) is False:
+                filepath += self.codec.extension
+        if artifact_serializer is None:
+            artifact_serializer = serializer_for_path(filepath)
+        temp_path = self.write_temp_file(filepath, content, artifact_serializer)
+
+        if getattr(self.write_batch, "depth", 0) > 0:
+            self.pending_artifacts().append((temp_path, filepath))
+        else:
+            self.commit_artifacts([(temp_path, filepath)], fsync=fsync)
+        return filepath
+
+    def generate_filepath(self, serializer: Serializer = None) -> str:
+        """
+        Returns the path of a new artifact named by create_filename(), with the extensions of serializer and of the codec.
+        """
+        while True:
+            filename = self.create_filename()
+            # generated names have the extension of the text serializer, they get the extension of the serializer used instead
+            if serializer is not None and serializer.name != "text":
+                filename = os.path.splitext(filename)[0] + serializer.extensions[0]
+
+            filepath = os.path.join(self.path, filename)
+            if filepath.endswith(self.codec.extension) is False:
+                filepath += self.codec.extension
+
+            # create_filename() only checks the name it generates, the final name must not replace an existing artifact either
+            if os.path.exists(filepath) is False:
+                return filepath
+
+    def write_temp_file(self, filepath: str, content: Any, serializer: Serializer = None) -> str:
+        directory, name = os.path.split(filepath)
+        os.makedirs(directory, exist_ok=True)
+
+        temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}{TEMP_FILE_SUFFIX}")
+        try:
+            with open(temp_path, "wb") as f:
+                writer = self.codec.writer(f)
+                (serializer if serializer is not None else serializer_for_path(filepath)).dump(content, writer)
+                if writer is not f:
+                    writer.close()
+        except BaseException:
+            self.remove_temp_files([temp_path])
+            raise
+        return temp_path
+
+    def remove_temp_files(self, temp_paths: List[str]) -> None:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def active_run_id(self) -> int:
+        """
+        Returns the id of the active run; raises a RuntimeError if no run is active.
+        """
+        run_id = self.metadata_store.get_run_id()
+        if run_id is None:
+            raise RuntimeError(f"node '{self.name}' can only save artifacts during a run, metadata store '{self.metadata_store.name}' has no active run.")
+        return run_id
+
+    def pending_artifacts(self) -> List[Tuple[str, str]]:
+        """
+        Returns the (temporary path, final path) pairs of the artifacts saved by this thread in the current batch.
+        """
+        if hasattr(self.write_batch, "pending") is False:
+            self.write_batch.pending = []
+        return self.write_batch.pending
+
+    @contextmanager
+    def artifact_batch(self, fsync: bool = True) -> Iterator[None]:
+        """
+        Defers the rename and the record of every artifact saved by this thread inside the with block to the end of the block, 
+        where the files are fsynced together, renamed into place, each directory is fsynced once, 
+        and all of the artifacts are recorded in a single metadata transaction.
+        If the block raises, none of the artifacts are kept. Nested batches are committed by the outermost batch.
+        Note: the artifacts cannot be read from their final path until the batch ends.
+        """
+        self.write_batch.depth = getattr(self.write_batch, "depth", 0) + 1
+        try:
+            yield
+        except BaseException:
+            if self.write_batch.depth == 1:
+                self.remove_temp_files([temp_path for temp_path, _ in self.pending_artifacts()])
+                self.pending_artifacts().clear()
+            raise
+        else:
+            if self.write_batch.depth == 1:
+                pending = list(self.pending_artifacts())
+                self.pending_artifacts().clear()
+                if len(pending) > 0:
+                    self.commit_artifacts(pending, fsync=fsync)
+        finally:
+            self.write_batch.depth -= 1
+
+    def commit_artifacts(self, artifacts: List[Tuple[str, str]], fsync: bool = True) -> None:
+        """
+        Moves the temporary files of the artifacts to their final paths and records the artifacts as 'current' in one call to the metadata store.
+        Note: the renames and the record happen while the resource lock is held, 
+        so the observer sees the artifacts only once they are recorded and does not record them again.
+        If the commit fails, the temporary files that were not moved into place yet are removed;
+        artifacts already in place but not recorded are left for the observer, which records them as 'new'.
+        """
+        try:
+            if fsync is True:
+                for temp_path, _ in artifacts:
+                    fd = os.open(temp_path, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+
+            # fails before any artifact is moved into place if there is no active run
+            run_id = self.active_run_id()
+
+            # the artifacts a node writes itself are hashed but never deduplicated
+            content_hashes = self.hash_files([temp_path for temp_path, _ in artifacts]) if self.hash_content is True else None
+
+            with self.resource_lock:
+                for temp_path, filepath in artifacts:
+                    os.replace(temp_path, filepath)
+
+                # the renames are only durable once the directories that hold the artifacts are fsynced
+                if fsync is True and sys.platform != "win32":
+                    for directory in {os.path.dirname(filepath) for _, filepath in artifacts}:
+                        fd = os.open(directory, os.O_RDONLY)
+                        try:
+                            os.fsync(fd)
+                        finally:
+                            os.close(fd)
+
+                self.metadata_store.create_entries(
+                    self, [filepath for _, filepath in artifacts], state="current", run_id=run_id, content_hashes=content_hashes, 
+                    codec=self.codec.name
+                )
+        except BaseException:
+            self.remove_temp_files([temp_path for temp_path, _ in artifacts])
+            raise
+        self.log(f"Saved {len(artifacts)} artifacts in node '{self.name}'")
+
+    def iter_manifest(self, run_id: int = None) -> Iterator[Dict]:
+        """
+        Returns an iterator over the 'current' artifacts of run run_id (the current run if run_id is None) as they were when the run started,
+        read from the manifest written by the metadata store, without querying the metadata store.
+        A manifest is never modified once written, so it is read without the resource lock, and errors are raised to the caller.
+        """
+        return self.metadata_store.iter_manifest(self, run_id)
+
+    def find_artifacts_by_hash(self, content_hash: str) -> List[Dict]:
+        return self.metadata_store.find_entries_by_hash(self, content_hash)
 
     @BaseResourceNode.log_exception
     @BaseResourceNode.resource_accessor
@@ -108,11 +879,141 @@ class FilesystemStoreNode(BaseResourceNode):
     @BaseResourceNode.log_exception
     @BaseResourceNode.resource_accessor
     def load_artifact(self, artifact_path: str) -> Any:
-        with open(artifact_path, "r") as f:
-            content = f.read()
-            return content
+        return self.read_artifact(artifact_path)
+
+    def read_artifact(self, artifact_path: str) -> Any:
+        """
+        Returns the content of the artifact decoded by its serializer (from the artifact cache if it is enabled);
+        unlike load_artifact(), the resource lock is not held and errors are raised, so several threads can read artifacts at once.
+        """
+        serializer = self.artifact_serializer(artifact_path)
+
+        def _load() -> Any:
+            codec = self.artifact_codec(artifact_path)
+            # a compressed artifact cannot be mapped, it is decompressed as it is read
+            if codec.name == "none":
+                return serializer.load_path(artifact_path, self.mmap_mode)
+
+            with open(artifact_path, "rb") as f:
+                stream = codec.reader(f)
+                try:
+                    return serializer.load(stream)
+                finally:
+                    if stream is not f:
+                        stream.close()
+
+        if self.artifact_cache is None:
+            return _load()
+        return self.artifact_cache.get_or_load(artifact_path, _load, kind=f"load_artifact:{serializer.name}:{self.mmap_mode}")
+
+    def artifact_serializer(self, artifact_path: str) -> Serializer:
+        return self.serializer if self.serializer is not None else serializer_for_path(artifact_path)
+
+    def get_cache_stats(self) -> Dict:
+        if self.artifact_cache is None:
+            return dict()
+        return self.artifact_cache.stats()
+
+    def artifact_codec(self, artifact_path: str) -> Codec:
+        """
+        Returns the codec the artifact was stored with: the codec recorded in the metadata store, 
+        or the codec matching the file extension if the file is not recorded.
+        """
+        entry = self.metadata_store.get_entry_by_location(self, artifact_path)
+        if entry is not None and entry.get("codec") is not None:
+            return get_codec(entry["codec"])
+        return codec_for_path(artifact_path)
+
+    @contextmanager
+    def open_artifact(self, artifact_path: str, mode: str = "rb") -> Iterator[io.IOBase]:
+        """
+        Opens the artifact for reading ('rb' or 'r' for UTF-8 text) and decompresses it as it is read,
+        so only the decompressed data that is read is held in memory.
+        """
+        if mode not in ("rb", "r"):
+            raise ValueError(f"mode must be either 'rb' or 'r', not '{mode}'.")
+
+        codec = self.artifact_codec(artifact_path)
+        with open(artifact_path, "rb") as f:
+            stream = codec.reader(f)
+            if mode == "r":
+                stream = io.TextIOWrapper(stream, encoding="utf-8")
+            try:
+                yield stream
+            finally:
+                if stream is not f:
+                    stream.close()
+
+    def iter_artifact_chunks(
+        self, artifact_path: str, chunk_size: int = 1024 * 1024, start: int = 0, end: int = None, decompress: bool = False
+    ) -> Iterator[bytes]:
+        """
+        Yields the bytes of the artifact from offset start up to offset end (the end of the file if end is None), chunk_size bytes at a time,
+        so an artifact of any size can be processed or streamed with bounded memory.
+        The stored bytes are read unless decompress is True, in which case start and end are offsets in the decompressed data.
+        Note: the resource lock is not held while the chunks are read, the file is only read.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, not '{chunk_size}'.")
+
+        with (self.open_artifact(artifact_path) if decompress is True else open(artifact_path, "rb")) as f:
+            if decompress is True:
+                # a compressed stream cannot seek, so the data before start is read and discarded
+                skipped = 0
+                while skipped < start:
+                    skipped_chunk = f.read(min(chunk_size, start - skipped))
+                    if len(skipped_chunk) == 0:
+                        break
+                    skipped += len(skipped_chunk)
+            else:
+                f.seek(start)
+            remaining = end - start if end is not None else None
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if len(chunk) == 0:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    @BaseResourceNode.log_exception
+    @BaseResourceNode.resource_accessor
+    def read_artifact_range(self, artifact_path: str, offset: int, length: int) -> bytes:
+        """
+        Returns up to length bytes of the artifact starting at offset; fewer bytes are returned if the file ends first.
+        """
+        with open(artifact_path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    @contextmanager
+    def mmap_artifact(self, artifact_path: str) -> Iterator[Union[mmap.mmap, bytes]]:
+        """
+        Maps the artifact into memory read-only for the duration of the with block; 
+        slicing the map or wrapping it in a memoryview reads the file without loading all of it into memory.
+        An empty file cannot be mapped, b"" is yielded instead.
+        Note: memoryviews of the map must be released before the with block ends.
+        """
+        with open(artifact_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
 
     def stop_monitoring(self) -> None:
         self.log(f"Beginning teardown for node '{self.name}'")
         self.observer_thread.join()
-        self.log(f"Observer stopped for node '{self.name}'")
\ No newline at end of file
+        self.scanner.close()
+        self.log(f"Observer stopped for node '{self.name}'")
+
+    def on_exit(self):
+        super().on_exit()
+        self.stop_prefetch()
+        if self.hash_pool is not None:
+            self.hash_pool.shutdown(wait=True)
+            self.hash_pool = None
\ No newline at end of file
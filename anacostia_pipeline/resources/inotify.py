@@ -0,0 +1,149 @@
+import os
+import sys
+import ctypes
+import ctypes.util
+import errno
+import select
+import struct
+from typing import Dict, List, Tuple
+
+
+
+# event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# note: a file should only be treated as complete once the writer closes it (IN_CLOSE_WRITE)
+# or once it is moved into the directory fully written (IN_MOVED_TO); this is how half-written files are kept out of the metadata store.
+# IN_CREATE is only in the mask so that newly created subdirectories can be watched, IN_CREATE events for files should be ignored.
+DEFAULT_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_init1.restype = ctypes.c_int
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_add_watch.restype = ctypes.c_int
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        libc.inotify_rm_watch.restype = ctypes.c_int
+        _libc = libc
+    return _libc
+
+
+def inotify_available() -> bool:
+    """
+    Returns True if the kernel inotify API can be used on this platform.
+    """
+    if sys.platform.startswith("linux") is False:
+        return False
+    try:
+        libc = _load_libc()
+        return hasattr(libc, "inotify_init1")
+    except (OSError, AttributeError):
+        return False
+
+
+class InotifyWatcher:
+    """
+    Thin wrapper around the Linux inotify API.
+    The watcher coalesces the events read in one call to read_events() by path,
+    so a file that was written and closed several times is only reported once.
+    """
+    def __init__(self, path: str, mask: int = DEFAULT_MASK) -> None:
+        self.mask = mask
+        self.watches: Dict[int, str] = dict()
+        self.libc = _load_libc()
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        try:
+            self.add_watch(path)
+        except BaseException:
+            # e.g., ENOSPC (fs.inotify.max_user_watches reached) or a missing directory; the caller never gets the watcher to close it
+            self.close()
+            raise
+
+    def add_watch(self, path: str) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for '{path}': {os.strerror(err)}")
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self, timeout: float = 0.1) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        Waits up to `timeout` seconds for events and returns a tuple (events, overflowed).
+        events is a list of (path, mask) tuples in order of first arrival, with the masks of repeated events for the same path OR'd together.
+        overflowed is True if the kernel event queue overflowed and events were dropped, in which case the caller must rescan the directory.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if len(readable) == 0:
+            return [], False
+
+        events: Dict[str, int] = dict()
+        overflowed = False
+        while True:
+            try:
+                buffer = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise e
+
+            if len(buffer) == 0:
+                break
+
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+
+                path = os.path.join(directory, os.fsdecode(name)) if len(name) > 0 else directory
+                events[path] = events.get(path, 0) | mask
+
+        return list(events.items()), overflowed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches.clear()
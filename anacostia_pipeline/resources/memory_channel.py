@@ -0,0 +1,223 @@
+import os
+import ctypes
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import RLock
+from logging import Logger
+from typing import Any, Dict, List, Tuple, Union
+
+from ..engine.base import BaseMetadataStoreNode, BaseResourceNode
+
+
+
+def _import_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError as e:
+        raise ImportError("Publishing NumPy arrays requires numpy, install it with 'pip install numpy'.") from e
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("Publishing Arrow batches requires pyarrow, install it with 'pip install pyarrow'.") from e
+
+
+def buffer_kind(buffer: Any) -> str:
+    """
+    Returns the kind of a buffer that can be published: 'bytes' (bytes, bytearray, memoryview), 'ndarray', or 'arrow' (RecordBatch or Table).
+    """
+    if isinstance(buffer, (bytes, bytearray, memoryview)):
+        return "bytes"
+
+    # numpy and pyarrow are only imported if the buffer comes from them
+    module = type(buffer).__module__.split(".")[0]
+    if module == "numpy" and type(buffer).__name__ == "ndarray":
+        return "ndarray"
+    if module == "pyarrow" and type(buffer).__name__ in ("RecordBatch", "Table"):
+        return "arrow"
+    raise TypeError(f"cannot publish a buffer of type '{type(buffer).__name__}', publish bytes, a NumPy array, or an Arrow RecordBatch or Table.")
+
+def view_shared_buffer(descriptor: Dict, shm: SharedMemory) -> Any:
+    """
+    Returns a read-only, zero-copy view of the buffer described by descriptor in the shared memory block shm.
+    Note: the view is only valid while shm is open.
+    """
+    # a slice of shm.buf does not hold an export of it, so shm.close() would unmap the memory under the slice;
+    # a ctypes array created from shm.buf does, so closing the block raises a BufferError for as long as a view is referenced
+    view = memoryview((ctypes.c_ubyte * descriptor["size"]).from_buffer(shm.buf)).cast("B").toreadonly()
+    if descriptor["kind"] == "bytes":
+        return view
+
+    if descriptor["kind"] == "ndarray":
+        numpy = _import_numpy()
+        return numpy.frombuffer(view, dtype=numpy.dtype(descriptor["dtype"])).reshape(descriptor["shape"])
+
+    pyarrow = _import_pyarrow()
+    table = pyarrow.ipc.open_stream(pyarrow.py_buffer(view)).read_all()
+    return table if descriptor["arrow_type"] == "Table" else table.to_batches()[0]
+
+def attach_shared_buffer(descriptor: Dict) -> Tuple[Any, SharedMemory]:
+    """
+    Attaches to a buffer published by a MemoryChannelNode with shared_memory=True, in this process or another one;
+    returns a read-only view of the buffer and the shared memory block, which must be closed once the view is no longer used.
+    """
+    shm = SharedMemory(name=descriptor["shm_name"])
+    if descriptor.get("pid") != os.getpid():
+        # attaching registers the block with the resource tracker of this process, which would unlink it when this process exits;
+        # the block belongs to the publisher, which unlinks it when the buffer is released
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return view_shared_buffer(descriptor, shm), shm
+
+
+class MemoryChannelNode(BaseResourceNode):
+    """
+    A resource node that passes buffers between the action nodes of a run without writing them to files.
+    An action node publishes a buffer (bytes, a NumPy array, or an Arrow RecordBatch or Table) under a key,
+    and its successors get a read-only view of the same memory with get(); nothing is copied or parsed between nodes.
+    The buffers belong to the run: they are released when the run ends.
+
+    With shared_memory=True, every buffer is copied once into a shared memory block when it is published,
+    and descriptor(key) returns a picklable description of the buffer that a node in another process attaches to with attach_shared_buffer().
+    Note: without shared memory, the channel holds a reference to the published buffer, so the publisher must not modify it afterwards.
+    """
+    def __init__(
+        self, name: str, metadata_store: BaseMetadataStoreNode, shared_memory: bool = False,
+        loggers: Union[Logger, List[Logger]] = None
+    ) -> None:
+        self.shared_memory = shared_memory
+        self.buffers: Dict[str, Any] = dict()
+        self.descriptors: Dict[str, Dict] = dict()
+        self.shared_blocks: Dict[str, SharedMemory] = dict()
+        # released blocks that could not be closed yet because a view of them was still referenced
+        self.retired_blocks: List[SharedMemory] = list()
+        self.channel_lock = RLock()
+
+        # the channel is not a directory, it does not need to be monitored
+        super().__init__(name=name, resource_path=f"memory://{name}", metadata_store=metadata_store, loggers=loggers, monitoring=False)
+
+    @BaseResourceNode.resource_accessor
+    def setup(self) -> None:
+        self.log(f"Setting up node '{self.name}'")
+        self.metadata_store.create_resource_tracker(self)
+        self.log(f"Node '{self.name}' setup complete.")
+
+    def record_new(self) -> None:
+        pass
+
+    def publish(self, key: str, buffer: Any) -> Dict:
+        """
+        Publishes buffer under key for the rest of the run, replacing the buffer previously published under key; returns its descriptor.
+        """
+        kind = buffer_kind(buffer)
+        descriptor = {"key": key, "kind": kind, "run_id": self.metadata_store.get_run_id(), "pid": os.getpid()}
+
+        if kind == "bytes":
+            view = memoryview(buffer).cast("B")
+            descriptor["size"] = view.nbytes
+        elif kind == "ndarray":
+            numpy = _import_numpy()
+            if self.shared_memory is True:
+                buffer = numpy.ascontiguousarray(buffer)
+            descriptor.update(size=buffer.nbytes, shape=list(buffer.shape), dtype=buffer.dtype.str)
+        else:
+            descriptor["arrow_type"] = type(buffer).__name__
+            descriptor["num_rows"] = buffer.num_rows
+
+        if self.shared_memory is True:
+            if kind == "arrow":
+                pyarrow = _import_pyarrow()
+                sink = pyarrow.BufferOutputStream()
+                with pyarrow.ipc.new_stream(sink, buffer.schema) as writer:
+                    writer.write(buffer)
+                view = memoryview(sink.getvalue()).cast("B")
+                descriptor["size"] = view.nbytes
+            elif kind == "ndarray":
+                view = memoryview(buffer).cast("B")
+
+            # a block cannot be empty, so an empty buffer gets a block of one byte
+            shm = SharedMemory(create=True, size=max(descriptor["size"], 1))
+            shm.buf[:descriptor["size"]] = view
+            descriptor["shm_name"] = shm.name
+            value = view_shared_buffer(descriptor, shm)
+        else:
+            shm = None
+            if kind == "bytes":
+                value = view.toreadonly()
+            elif kind == "ndarray":
+                value = buffer.view()
+                value.flags.writeable = False
+            else:
+                value = buffer
+
+        with self.channel_lock:
+            previous = self.shared_blocks.pop(key, None)
+            self.buffers[key] = value
+            self.descriptors[key] = descriptor
+            if shm is not None:
+                self.shared_blocks[key] = shm
+
+        if previous is not None:
+            self.release_block(previous)
+        return dict(descriptor)
+
+    def get(self, key: str) -> Any:
+        """
+        Returns a read-only view of the buffer published under key; raises a KeyError if nothing was published under key in this run.
+        """
+        with self.channel_lock:
+            return self.buffers[key]
+
+    def descriptor(self, key: str) -> Dict:
+        with self.channel_lock:
+            return dict(self.descriptors[key])
+
+    def keys(self) -> List[str]:
+        with self.channel_lock:
+            return list(self.buffers)
+
+    def get_num_artifacts(self, state: str = "current") -> int:
+        with self.channel_lock:
+            return len(self.buffers)
+
+    def release_block(self, shm: SharedMemory, unlink: bool = True) -> None:
+        if unlink is True:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                # the block was already unlinked, e.g., by the resource tracker of a process that attached to it
+                pass
+        try:
+            shm.close()
+        except BufferError:
+            # a view of the block is still referenced, closing the block is retried when the channel is cleared again
+            with self.channel_lock:
+                self.retired_blocks.append(shm)
+
+    def clear(self) -> None:
+        """
+        Releases every buffer of the channel; views that are still referenced stay valid until they are garbage collected.
+        """
+        with self.channel_lock:
+            blocks = list(self.shared_blocks.values())
+            retired_blocks = self.retired_blocks
+            self.buffers.clear()
+            self.descriptors.clear()
+            self.shared_blocks.clear()
+            self.retired_blocks = list()
+
+        for shm in blocks:
+            self.release_block(shm)
+        for shm in retired_blocks:
+            self.release_block(shm, unlink=False)
+
+    @BaseResourceNode.log_exception
+    def on_run_end(self) -> None:
+        self.clear()
+
+    def on_exit(self):
+        super().on_exit()
+        self.clear()
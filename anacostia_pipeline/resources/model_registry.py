@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Dict, List, Tuple
+
+from ..engine.base import BaseMetadataStoreNode, BaseResourceNode
+from .filesystem_store import FilesystemStoreNode
+
+
+
+class ModelRegistryNode(FilesystemStoreNode):
+    """
+    A FilesystemStoreNode whose artifacts are versions of a model: every recorded file that is not 'new' is a version,
+    ordered by the order in which the versions were recorded.
+    The keep_models newest versions stay deserialized in memory once they are loaded, across runs,
+    so get_model() only reads a model from disk the first time it is used after it was registered.
+    The resident models are refreshed whenever the versions change: a model is registered, a run starts, or retention removes old versions.
+
+    get_model() hands the same object to every caller, which must treat it as read-only;
+    models are stored with the 'mmap_pickle' serializer by default, and with the default mmap_mode='r',
+    the arrays of the models are read-only views of the mapped file.
+    serializer='auto' chooses the serializer of every version from its extension, so versions can be stored in different formats.
+    Other arguments are passed to FilesystemStoreNode; the artifact cache is disabled by default, the registry keeps its own models.
+    """
+    def __init__(
+        self, name: str, resource_path: str, metadata_store: BaseMetadataStoreNode,
+        keep_models: int = 1, serializer: str = "mmap_pickle", mmap_mode: str = "r", **kwargs
+    ) -> None:
+        if keep_models < 1:
+            raise ValueError(f"keep_models argument of ModelRegistryNode must be at least 1, not '{keep_models}'.")
+        self.keep_models = keep_models
+
+        # the paths of the versions, oldest first (None when they have to be read from the metadata store again),
+        # and the resident models by path
+        self.model_versions: List[str] = None
+        self.resident_models: OrderedDict[str, Any] = OrderedDict()
+        self.models_lock = RLock()
+        self.model_hits = 0
+        self.model_misses = 0
+
+        kwargs.setdefault("artifact_cache", False)
+        super().__init__(name, resource_path, metadata_store, serializer=serializer, mmap_mode=mmap_mode, **kwargs)
+
+    def list_versions(self) -> List[str]:
+        """
+        Returns the paths of the versions of the model, oldest first.
+        """
+        with self.models_lock:
+            if self.model_versions is None:
+                entries = [entry for entry in self.metadata_store.get_entries(self, "all") if entry["state"] != "new"]
+                entries.sort(key=lambda entry: entry["id"])
+                self.model_versions = [entry["location"] for entry in entries]
+            return list(self.model_versions)
+
+    def refresh_versions(self) -> None:
+        """
+        Reads the versions from the metadata store again and releases the resident models that are no longer among the keep_models newest versions.
+        """
+        with self.models_lock:
+            self.model_versions = None
+            newest = set(self.list_versions()[-self.keep_models:])
+            for path in [path for path in self.resident_models if path not in newest]:
+                del self.resident_models[path]
+
+    def register_model(self, model: Any, filename: str = None, serializer: str = None) -> str:
+        """
+        Saves model as the newest version and returns its path; with serializer='auto' and without a filename or serializer, the model is pickled.
+        """
+        if filename is None and serializer is None and self.serializer is None:
+            serializer = "mmap_pickle"
+        return self.save_artifact(model, filename=filename, serializer=serializer)
+
+    def get_model(self, version: int = -1) -> Any:
+        """
+        Returns the deserialized model of a version: an index into list_versions(), -1 (the default) is the newest version.
+        Note: the model is loaded without the lock held, so two threads missing the same version at once may both load it.
+        """
+        versions = self.list_versions()
+        if len(versions) == 0:
+            raise IndexError(f"no model has been registered in model registry '{self.name}'.")
+        path = versions[version]
+
+        with self.models_lock:
+            if path in self.resident_models:
+                self.model_hits += 1
+                return self.resident_models[path]
+            self.model_misses += 1
+
+        model = self.read_artifact(path)
+
+        with self.models_lock:
+            # the versions may have changed while the model was loaded; only one of the newest versions is kept
+            if self.model_versions is not None and path in self.model_versions[-self.keep_models:]:
+                self.resident_models[path] = model
+        return model
+
+    def get_model_stats(self) -> Dict[str, Any]:
+        with self.models_lock:
+            return {
+                "hits": self.model_hits, "misses": self.model_misses,
+                "resident": list(self.resident_models), "num_versions": len(self.model_versions) if self.model_versions is not None else None
+            }
+
+    def record_current(self, filepath: str) -> None:
+        super().record_current(filepath)
+        self.refresh_versions()
+
+    def commit_artifacts(self, artifacts: List[Tuple[str, str]], fsync: bool = True) -> None:
+        super().commit_artifacts(artifacts, fsync=fsync)
+        self.refresh_versions()
+
+    @BaseResourceNode.log_exception
+    def on_run_start(self) -> None:
+        # the 'new' versions became 'current' when the run was created
+        self.refresh_versions()
+        super().on_run_start()
+
+    @BaseResourceNode.log_exception
+    def on_run_end(self) -> None:
+        super().on_run_end()
+        self.refresh_versions()
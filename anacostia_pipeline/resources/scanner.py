@@ -0,0 +1,164 @@
+import os
+import time
+import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+
+
+class DirectoryScanner:
+    """
+    Scans a directory tree with os.scandir and yields the files it finds one directory at a time.
+
+    The scanner remembers the mtime of every directory it has listed (along with its subdirectories);
+    a directory whose mtime has not changed since the last scan has not had any files added or removed,
+    so its files are skipped and only its subdirectories are visited.
+    With workers > 1, directories are listed concurrently by a thread pool,
+    which allows very large trees to be split across several workers.
+    """
+    def __init__(
+        self, root: str, recursive: bool = False, include: List[str] = None, exclude: List[str] = None,
+        workers: int = 1, settle_time: float = 1.0
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f"workers argument of DirectoryScanner must be at least 1, not '{workers}'.")
+
+        self.root = os.path.abspath(root)
+        self.recursive = recursive
+        self.include = list(include) if include is not None else None
+        self.exclude = list(exclude) if exclude is not None else list()
+        self.workers = workers
+
+        # a directory modified less than settle_time seconds ago is not cached;
+        # this protects against filesystems with coarse timestamps, where a file added in the same tick would not change the mtime
+        self.settle_time_ns = int(settle_time * 1e9)
+
+        self._dir_cache: Dict[str, Tuple[int, List[str]]] = dict()
+        self._visited: Set[str] = set()
+        self._cache_lock = Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def relpath(self, path: str) -> str:
+        # the paths found by a scan are under the root, so the prefix can be cut off without normalizing the path
+        if path.startswith(self.root + os.sep):
+            return path[len(self.root) + 1:].replace(os.sep, "/")
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _matches_any(self, path: str, patterns: List[str]) -> bool:
+        if len(patterns) == 0:
+            return False
+        relpath = self.relpath(path)
+        name = os.path.basename(path)
+        return any(fnmatch.fnmatch(relpath, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    def matches_file(self, path: str) -> bool:
+        """
+        Returns True if the file passes the include and exclude patterns.
+        Patterns are matched against both the path relative to the root and the file name.
+        """
+        if self._matches_any(path, self.exclude) is True:
+            return False
+        if self.include is None:
+            return True
+        return self._matches_any(path, self.include)
+
+    def matches_directory(self, path: str) -> bool:
+        """
+        Returns True if the directory should be visited.
+        """
+        if os.path.abspath(path) == self.root:
+            return True
+        if self.recursive is False:
+            return False
+        return self._matches_any(path, self.exclude) is False
+
+    def _scan_dir(self, dirpath: str) -> Tuple[List[os.DirEntry], List[str]]:
+        try:
+            dir_stat = os.stat(dirpath)
+        except FileNotFoundError:
+            with self._cache_lock:
+                self._dir_cache.pop(dirpath, None)
+                self._visited.discard(dirpath)
+            return [], []
+
+        with self._cache_lock:
+            self._visited.add(dirpath)
+            cached = self._dir_cache.get(dirpath)
+
+        if cached is not None and cached[0] == dir_stat.st_mtime_ns:
+            return [], cached[1]
+
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.matches_directory(entry.path) is True:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        if self.matches_file(entry.path) is True:
+                            files.append(entry)
+        except FileNotFoundError:
+            return [], []
+
+        # the mtime is read before the directory is listed,
+        # so a file added while the directory is being listed changes the mtime and the directory is listed again on the next scan
+        if time.time_ns() - dir_stat.st_mtime_ns > self.settle_time_ns:
+            with self._cache_lock:
+                self._dir_cache[dirpath] = (dir_stat.st_mtime_ns, subdirs)
+
+        return files, subdirs
+
+    def scan(self, root: str = None) -> Iterator[List[os.DirEntry]]:
+        """
+        Yields lists of os.DirEntry objects for the files of each changed directory under root (defaults to the scanner root).
+        Unchanged directories are pruned, so the cost of a scan is proportional to the number of directories plus the number of files in changed directories.
+        """
+        root = os.path.abspath(root) if root is not None else self.root
+
+        if self.workers == 1:
+            frontier: Deque[str] = deque([root])
+            while len(frontier) > 0:
+                files, subdirs = self._scan_dir(frontier.popleft())
+                frontier.extend(subdirs)
+                if len(files) > 0:
+                    yield files
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="directory_scanner")
+
+        pending = {self._executor.submit(self._scan_dir, root)}
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(self._executor.submit(self._scan_dir, subdir))
+                if len(files) > 0:
+                    yield files
+
+    def directories(self) -> List[str]:
+        """
+        Returns the directories visited so far.
+        """
+        with self._cache_lock:
+            return list(self._visited)
+
+    def invalidate(self, dirpath: str = None) -> None:
+        """
+        Forgets the cached mtime of dirpath (or of every directory if dirpath is None) so the directory is listed again on the next scan.
+        """
+        with self._cache_lock:
+            if dirpath is None:
+                self._dir_cache.clear()
+            else:
+                self._dir_cache.pop(os.path.abspath(dirpath), None)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,297 @@
+import io
+import os
+import json
+import mmap
+import pickle
+import struct
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+from .codecs import codec_for_path
+
+
+
+def _import_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError as e:
+        raise ImportError("The 'npy' and 'npz' serializers require numpy, install it with 'pip install numpy'.") from e
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("The 'arrow' serializer requires pyarrow, install it with 'pip install pyarrow'.") from e
+
+
+MMAP_MODES = (None, "r", "c")
+
+
+class Serializer:
+    """
+    Converts artifacts to and from the bytes stored in a file.
+    dump() writes an object to a binary file opened for writing (possibly wrapped by a codec);
+    load() reads an object back from a binary file opened for reading.
+    load_path() reads an uncompressed file by path; serializers that support it map the file into memory when mmap_mode is given
+    ('r' for read-only, 'c' for copy-on-write), so large arrays are paged in lazily instead of being copied into the heap.
+    """
+    name: str = None
+    extensions: Tuple[str, ...] = ()
+
+    def available(self) -> bool:
+        return True
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        raise NotImplementedError
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        raise NotImplementedError
+
+    def load_path(self, path: str, mmap_mode: str = None) -> Any:
+        with open(path, "rb") as f:
+            return self.load(f)
+
+
+class TextSerializer(Serializer):
+    """
+    Stores a str as UTF-8 (bytes are stored as is) and loads a str; used for files whose extension no other serializer claims.
+    """
+    name = "text"
+    extensions = (".txt",)
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        fileobj.write(obj.encode("utf-8") if isinstance(obj, str) else obj)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        wrapper = io.TextIOWrapper(fileobj, encoding="utf-8")
+        try:
+            return wrapper.read()
+        finally:
+            # the file belongs to the caller, it must not be closed with the wrapper
+            wrapper.detach()
+
+
+class BytesSerializer(Serializer):
+    name = "bytes"
+    extensions = (".bin",)
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        fileobj.write(obj.encode("utf-8") if isinstance(obj, str) else obj)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        return fileobj.read()
+
+
+class JsonSerializer(Serializer):
+    name = "json"
+    extensions = (".json",)
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        fileobj.write(json.dumps(obj).encode("utf-8"))
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        return json.load(fileobj)
+
+
+class PickleSerializer(Serializer):
+    """
+    Stores a standard pickle (protocol 5), which pickle.load() reads back; mmap_mode is ignored, use 'mmap_pickle' to map large arrays.
+    Note: only load pickles from trusted sources, unpickling can run arbitrary code.
+    """
+    name = "pickle"
+    extensions = (".pkl", ".pickle")
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        pickle.dump(obj, fileobj, protocol=5)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        return pickle.load(fileobj)
+
+
+class MappedPickleSerializer(Serializer):
+    """
+    Pickles with protocol 5 and stores the out-of-band buffers (e.g., the data of NumPy arrays) after the pickle, aligned to 64 bytes:
+    MAGIC, the number of buffers, the size of every buffer, the size of the pickle, the pickle, and the buffers.
+    Loaded with mmap_mode, the buffers are views of the mapped file, so the arrays of an estimator are not copied into the heap.
+    The file is not a pickle that pickle.load() can read, so it gets its own extension; plain pickles (without MAGIC) are loaded as well.
+    Note: only load pickles from trusted sources, unpickling can run arbitrary code.
+    """
+    name = "mmap_pickle"
+    extensions = (".apkl",)
+
+    MAGIC = b"ANAPKL5\x00"
+    ALIGNMENT = 64
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        buffers: List[pickle.PickleBuffer] = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buffer.raw() for buffer in buffers]
+
+        header = self.MAGIC + struct.pack("<Q", len(raw_buffers))
+        header += b"".join(struct.pack("<Q", raw.nbytes) for raw in raw_buffers)
+        header += struct.pack("<Q", len(data))
+        fileobj.write(header)
+        fileobj.write(data)
+
+        offset = len(header) + len(data)
+        for raw in raw_buffers:
+            padding = -offset % self.ALIGNMENT
+            fileobj.write(b"\x00" * padding)
+            fileobj.write(raw)
+            offset += padding + raw.nbytes
+
+    def loads(self, data: memoryview) -> Any:
+        if bytes(data[:len(self.MAGIC)]) != self.MAGIC:
+            return pickle.loads(data)
+
+        offset = len(self.MAGIC)
+        num_buffers, = struct.unpack_from("<Q", data, offset)
+        sizes = struct.unpack_from(f"<{num_buffers}Q", data, offset + 8)
+        offset += 8 + 8 * num_buffers
+        pickle_size, = struct.unpack_from("<Q", data, offset)
+        offset += 8
+        pickled = data[offset:offset + pickle_size]
+        offset += pickle_size
+
+        buffers = []
+        for size in sizes:
+            offset += -offset % self.ALIGNMENT
+            buffers.append(data[offset:offset + size])
+            offset += size
+        return pickle.loads(pickled, buffers=buffers)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        return self.loads(memoryview(fileobj.read()))
+
+    def load_path(self, path: str, mmap_mode: str = None) -> Any:
+        if mmap_mode is None:
+            return super().load_path(path)
+
+        with open(path, "rb") as f:
+            # the map is not closed here, the loaded buffers keep it alive until they are garbage collected
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if mmap_mode == "r" else mmap.ACCESS_COPY)
+        return self.loads(memoryview(mapped))
+
+
+class NpySerializer(Serializer):
+    """
+    Stores one NumPy array in the .npy format; loaded with mmap_mode, the array is a numpy.memmap of the file.
+    """
+    name = "npy"
+    extensions = (".npy",)
+
+    def available(self) -> bool:
+        try:
+            _import_numpy()
+            return True
+        except ImportError:
+            return False
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        numpy = _import_numpy()
+        numpy.save(fileobj, numpy.asanyarray(obj), allow_pickle=False)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        numpy = _import_numpy()
+        # a decompressing stream cannot seek back to the start of the header, so the file is read into memory first
+        return numpy.load(io.BytesIO(fileobj.read()), allow_pickle=False)
+
+    def load_path(self, path: str, mmap_mode: str = None) -> Any:
+        numpy = _import_numpy()
+        return numpy.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+
+
+class NpzSerializer(NpySerializer):
+    """
+    Stores a dictionary of NumPy arrays (or a single array, loaded as {'arr_0': array}) in the .npz format and loads a dictionary.
+    Note: NumPy cannot map the members of an .npz archive, so mmap_mode is ignored; use one .npy file per array to map them.
+    """
+    name = "npz"
+    extensions = (".npz",)
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        numpy = _import_numpy()
+        if isinstance(obj, dict):
+            numpy.savez(fileobj, **obj)
+        else:
+            numpy.savez(fileobj, obj)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        numpy = _import_numpy()
+        with numpy.load(io.BytesIO(fileobj.read()), allow_pickle=False) as archive:
+            return {key: archive[key] for key in archive.files}
+
+    def load_path(self, path: str, mmap_mode: str = None) -> Any:
+        with open(path, "rb") as f:
+            return self.load(f)
+
+
+class ArrowSerializer(Serializer):
+    """
+    Stores an Arrow Table or RecordBatch in the Arrow IPC file format and loads a Table;
+    loaded with mmap_mode, the columns of the table are views of the mapped file.
+    """
+    name = "arrow"
+    extensions = (".arrow", ".feather")
+
+    def available(self) -> bool:
+        try:
+            _import_pyarrow()
+            return True
+        except ImportError:
+            return False
+
+    def dump(self, obj: Any, fileobj: BinaryIO) -> None:
+        pyarrow = _import_pyarrow()
+        with pyarrow.ipc.new_file(fileobj, obj.schema) as writer:
+            writer.write(obj)
+
+    def load(self, fileobj: BinaryIO) -> Any:
+        pyarrow = _import_pyarrow()
+        return pyarrow.ipc.open_file(pyarrow.py_buffer(fileobj.read())).read_all()
+
+    def load_path(self, path: str, mmap_mode: str = None) -> Any:
+        pyarrow = _import_pyarrow()
+        source = pyarrow.memory_map(path, "r") if mmap_mode is not None else pyarrow.OSFile(path, "rb")
+        return pyarrow.ipc.open_file(source).read_all()
+
+
+SERIALIZERS: Dict[str, Serializer] = {
+    serializer.name: serializer
+    for serializer in (
+        TextSerializer(), BytesSerializer(), JsonSerializer(), PickleSerializer(), MappedPickleSerializer(),
+        NpySerializer(), NpzSerializer(), ArrowSerializer()
+    )
+}
+
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Returns the serializer called name; raises a ValueError if the serializer is unknown or its dependencies are not installed.
+    """
+    serializer = SERIALIZERS.get(name)
+    if serializer is None:
+        raise ValueError(f"serializer must be one of {sorted(SERIALIZERS)}, not '{name}'.")
+    if serializer.available() is False:
+        raise ValueError(f"serializer '{name}' is not available, available serializers are {available_serializers()}.")
+    return serializer
+
+def available_serializers() -> List[str]:
+    return [name for name, serializer in SERIALIZERS.items() if serializer.available() is True]
+
+def serializer_for_path(path: str) -> Serializer:
+    """
+    Returns the serializer of a file from its extension, ignoring the extension of its codec (e.g., '.npy' for 'weights.npy.gz');
+    the text serializer for an extension no serializer uses.
+    """
+    codec = codec_for_path(path)
+    if codec.extension != "":
+        path = path[:-len(codec.extension)]
+
+    extension = os.path.splitext(path)[1]
+    for serializer in SERIALIZERS.values():
+        if extension in serializer.extensions:
+            return serializer
+    return SERIALIZERS["text"]
@@ -0,0 +1,49 @@
+import gzip
+
+import pytest
+
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.resources.filesystem_store import FilesystemStoreNode
+
+
+# compressed artifacts are hashed as they are stored, so the same content must always compress to the same bytes
+# for content-hash deduplication to recognize it.
+
+def create_store(tmp_path, codec: str):
+    metadata_store = InMemoryMetadataStore("metadata_store")
+    data_store = FilesystemStoreNode("data_store", str(tmp_path / "data"), metadata_store, monitoring=False, codec=codec)
+    metadata_store.successors = [data_store]
+    metadata_store.setup()
+    data_store.setup()
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    return metadata_store, data_store
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd", "lz4"])
+def test_same_payload_compresses_to_same_hash(codec, tmp_path):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    if codec == "lz4":
+        pytest.importorskip("lz4.frame")
+
+    _, data_store = create_store(tmp_path, codec)
+    payload = "the same payload\n" * 1000
+    first = data_store.save_artifact(payload)
+    second = data_store.save_artifact(payload)
+
+    assert first != second
+    assert data_store.hash_file(first) == data_store.hash_file(second)
+    assert data_store.load_artifact(second) == payload
+
+
+def test_gzip_header_has_no_file_name(tmp_path):
+    _, data_store = create_store(tmp_path, "gzip")
+    path = data_store.save_artifact("payload")
+
+    with open(path, "rb") as f:
+        header = f.read(10)
+    # FLG.FNAME is bit 3 of the flags byte
+    assert header[3] & 0x08 == 0
+    with gzip.open(path, "rt") as f:
+        assert f.read() == "payload"
@@ -0,0 +1,68 @@
+import pytest
+
+from anacostia_pipeline.metadata.export import RunHistoryExporter
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.metadata.sql_metadata_store import SqliteMetadataStore
+from anacostia_pipeline.resources.filesystem_store import FilesystemStoreNode
+
+
+pytest.importorskip("pyarrow")
+
+
+# the nullable columns of the two exported runs differ: the first run has metrics without steps and samples without hashes or codecs,
+# the second run has a metric series and hashed, compressed samples; both partitions must be readable as one dataset.
+
+def create_store(kind: str, tmp_path, monkeypatch):
+    if kind == "sqlite":
+        # the sqlite database is created relative to tmp_path
+        monkeypatch.chdir(tmp_path)
+        return SqliteMetadataStore("metadata_store", "sqlite:///db/metadata.db")
+    return InMemoryMetadataStore("metadata_store")
+
+
+def run_pipeline(metadata_store, data_store, tmp_path) -> None:
+    metadata_store.create_entry(data_store, str(tmp_path / "data" / "file0.txt"))
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    metadata_store.log_metrics(loss=0.5)
+    metadata_store.log_params(learning_rate=0.1)
+    metadata_store.set_tags(model="baseline")
+    metadata_store.add_end_time()
+    metadata_store.end_run()
+
+    metadata_store.create_entry(data_store, str(tmp_path / "data" / "file1.txt.gz"), content_hash="ab" * 32, codec="gzip")
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    metadata_store.log_metric_series("loss", [0.4, 0.3, 0.2])
+    metadata_store.log_params(learning_rate=0.01)
+    metadata_store.add_end_time()
+    metadata_store.end_run()
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_export_runs_with_different_nullable_columns(kind, tmp_path, monkeypatch):
+    metadata_store = create_store(kind, tmp_path, monkeypatch)
+    data_store = FilesystemStoreNode("data_store", str(tmp_path / "data"), metadata_store, monitoring=False)
+    metadata_store.successors = [data_store]
+    metadata_store.setup()
+    data_store.setup()
+    run_pipeline(metadata_store, data_store, tmp_path)
+
+    exporter = RunHistoryExporter(metadata_store, str(tmp_path / "export"))
+    counts = exporter.export()
+    assert counts["runs"] == 2
+    assert counts["samples"] == 2
+
+    samples = exporter.read_table("samples").sort_by("id")
+    assert samples["content_hash"].to_pylist() == [None, "ab" * 32]
+    assert samples["codec"].to_pylist() == [None, "gzip"]
+
+    metrics = exporter.read_table("metrics").sort_by("id")
+    assert metrics["step"].to_pylist() == [None, 0, 1, 2]
+
+    best = exporter.best_metric_per_run("loss")
+    assert best["run_id"].to_pylist() == [1, 2]
+    assert best["value"].to_pylist() == pytest.approx([0.5, 0.2])
+
+    sweep = exporter.param_sweep("loss")
+    assert sweep["learning_rate"].to_pylist() == pytest.approx([0.1, 0.01])
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from anacostia_pipeline.engine.constants import Status
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.resources.filesystem_store import FilesystemStoreNode, TEMP_FILE_SUFFIX
+
+
+# artifacts are written to temporary files that are renamed into place once they are recorded;
+# a save that fails must not leave its temporary files behind.
+
+def create_store(tmp_path, start_run: bool = True, **kwargs):
+    metadata_store = InMemoryMetadataStore("metadata_store")
+    data_store = FilesystemStoreNode("data_store", str(tmp_path / "data"), metadata_store, monitoring=False, **kwargs)
+    metadata_store.successors = [data_store]
+    metadata_store.setup()
+    data_store.setup()
+    if start_run is True:
+        metadata_store.start_run()
+        metadata_store.add_run_id()
+    return metadata_store, data_store
+
+
+def temp_files(data_store: FilesystemStoreNode):
+    return [name for name in os.listdir(data_store.path) if name.endswith(TEMP_FILE_SUFFIX)]
+
+
+def test_save_without_run_writes_nothing(tmp_path):
+    metadata_store, data_store = create_store(tmp_path, start_run=False, codec="gzip")
+
+    assert data_store.save_artifact("content") is None
+    assert data_store.status == Status.ERROR
+    assert os.listdir(data_store.path) == []
+    assert metadata_store.get_num_entries(data_store, "all") == 0
+
+
+def test_batch_committed_after_run_ended_removes_temp_files(tmp_path):
+    metadata_store, data_store = create_store(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        with data_store.artifact_batch():
+            data_store.save_artifact("first")
+            data_store.save_artifact("second")
+            metadata_store.add_end_time()
+            metadata_store.end_run()
+    assert os.listdir(data_store.path) == []
+    assert metadata_store.get_num_entries(data_store, "all") == 0
+
+
+def test_failed_batch_removes_temp_files(tmp_path, monkeypatch):
+    metadata_store, data_store = create_store(tmp_path)
+
+    with pytest.raises(ValueError):
+        with data_store.artifact_batch():
+            data_store.save_artifact("first")
+            data_store.save_artifact("second")
+            raise ValueError("the batch failed")
+    assert os.listdir(data_store.path) == []
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("metadata store is unavailable")
+    monkeypatch.setattr(metadata_store, "create_entries", fail)
+
+    with pytest.raises(RuntimeError):
+        with data_store.artifact_batch():
+            data_store.save_artifact("first")
+            data_store.save_artifact("second")
+    assert temp_files(data_store) == []
+
+
+def test_failed_serialization_removes_temp_file(tmp_path):
+    metadata_store, data_store = create_store(tmp_path, serializer="json")
+
+    assert data_store.save_artifact({"not serializable": object()}) is None
+    assert temp_files(data_store) == []
+    assert metadata_store.get_num_entries(data_store, "all") == 0
+
+
+def test_batch_records_artifacts_once_in_place(tmp_path):
+    metadata_store, data_store = create_store(tmp_path)
+
+    with data_store.artifact_batch():
+        first = data_store.save_artifact("first")
+        second = data_store.save_artifact("second")
+        assert os.path.exists(first) is False
+
+    assert temp_files(data_store) == []
+    assert [entry["location"] for entry in metadata_store.get_entries(data_store, "current")] == [first, second]
+    assert data_store.load_artifact(second) == "second"
+
+
+@pytest.mark.parametrize("dedup", ["skip", "link"])
+def test_duplicate_files_are_not_recorded(dedup, tmp_path):
+    data_path = tmp_path / "data"
+    os.makedirs(data_path)
+    for name, content in (("a.txt", "same"), ("b.txt", "same"), ("c.txt", "other")):
+        with open(data_path / name, "w") as f:
+            f.write(content)
+
+    # the files found by the backfill are deduplicated among themselves
+    metadata_store, data_store = create_store(tmp_path, start_run=False, dedup=dedup)
+    entries = metadata_store.get_entries(data_store, "new")
+    # which of a.txt and b.txt is kept depends on the order of the directory listing
+    names = sorted(os.path.basename(entry["location"]) for entry in entries)
+    assert len(names) == 2 and names[0] in ("a.txt", "b.txt") and names[1] == "c.txt"
+    assert all(entry["content_hash"] is not None for entry in entries)
+
+    # and a file detected later is deduplicated against the recorded files
+    with open(data_path / "d.txt", "w") as f:
+        f.write("other")
+    data_store.record_detected_files([str(data_path / "d.txt")])
+    assert metadata_store.get_num_entries(data_store, "new") == 2
+    if dedup == "link":
+        assert os.path.samefile(data_path / "d.txt", data_path / "c.txt")
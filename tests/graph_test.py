@@ -36,18 +36,7 @@ class ModelRegistryNode(FilesystemStoreNode):
         super().__init__(name, resource_path, metadata_store, init_state="new", max_old_samples=None, monitoring=False)
     
     def create_filename(self) -> str:
-        return f"processed_data_file{self.get_num_artifacts('all')}.txt"
-
-    def save_artifact(self, content: str) -> None:
-        filename = self.create_filename()
-        filepath = os.path.join(self.path, filename)
-
-        # note: for monitoring-enabled resource nodes, record_artifact should be called before create_file;
-        # that way, the Observer can see the file is already logged and ignore it
-        self.record_current(filepath)
-        with open(filepath, 'w') as f:
-            f.write(content)
-        self.log(f"Saved preprocessed {filepath}", level="INFO")
+        return f"processed_data_file{self.next_sequence()}.txt"
 
 
 class PlotsStoreNode(FilesystemStoreNode):
@@ -76,6 +65,9 @@ class ModelRetrainingNode(BaseActionNode):
         
         for filepath in self.data_store.list_artifacts("old"):
             self.log(f"Already trained on {filepath}", level="INFO")
+
+        model_path = self.model_registry.save_artifact(f"model trained on {self.data_store.get_num_artifacts('current')} files")
+        self.log(f"Saved model {model_path}", level="INFO")
         
         self.metadata_store.log_metrics(acc=1.00)
         
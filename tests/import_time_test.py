@@ -0,0 +1,51 @@
+import sys
+import json
+import subprocess
+
+
+# importing the engine, the resource nodes, and the metadata stores must not load the dashboard (FastAPI, Starlette);
+# the dashboard is only imported when get_app() or run_background_webserver is used.
+# each check runs in a fresh interpreter so that modules imported by other tests do not hide a regression.
+
+IMPORT_TIME_BUDGET_SECONDS = 2.0
+
+HEADLESS_IMPORTS = """
+import sys, time, json
+start = time.perf_counter()
+import anacostia_pipeline.engine.pipeline
+import anacostia_pipeline.resources.filesystem_store
+import anacostia_pipeline.metadata.sql_metadata_store
+import anacostia_pipeline.metadata.memory_metadata_store
+elapsed = time.perf_counter() - start
+web_modules = sorted(name for name in sys.modules if name.split(".")[0] in ("fastapi", "starlette", "uvicorn"))
+print(json.dumps({"elapsed": elapsed, "web_modules": web_modules}))
+"""
+
+DASHBOARD_IMPORTS = """
+import sys, json
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+app = InMemoryMetadataStore("metadata_store").get_app()
+print(json.dumps({"fastapi_loaded": "fastapi" in sys.modules, "app": type(app).__name__}))
+"""
+
+
+def run_python(code: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_headless_import_does_not_load_dashboard():
+    result = run_python(HEADLESS_IMPORTS)
+    assert result["web_modules"] == [], f"headless imports loaded the web stack: {result['web_modules']}"
+
+
+def test_headless_import_time_budget():
+    result = run_python(HEADLESS_IMPORTS)
+    assert result["elapsed"] < IMPORT_TIME_BUDGET_SECONDS, \
+        f"headless imports took {result['elapsed']:.2f}s, the budget is {IMPORT_TIME_BUDGET_SECONDS}s"
+
+
+def test_get_app_loads_dashboard():
+    result = run_python(DASHBOARD_IMPORTS)
+    assert result["fastapi_loaded"] is True
+    assert result["app"] == "SqliteMetadataStoreApp"
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from anacostia_pipeline.resources.inotify import InotifyWatcher, inotify_available
+
+
+pytestmark = pytest.mark.skipif(inotify_available() is False, reason="inotify is only available on Linux")
+
+
+def open_fds():
+    return set(os.listdir("/proc/self/fd"))
+
+
+def test_failed_watch_closes_inotify_fd(tmp_path):
+    before = open_fds()
+    for _ in range(10):
+        with pytest.raises(OSError):
+            InotifyWatcher(str(tmp_path / "missing"))
+    assert open_fds() == before
+
+
+def test_watcher_reports_created_file(tmp_path):
+    watcher = InotifyWatcher(str(tmp_path))
+    try:
+        with open(tmp_path / "file0.txt", "w") as f:
+            f.write("content")
+        events, overflowed = watcher.read_events(timeout=1.0)
+        assert overflowed is False
+        assert str(tmp_path / "file0.txt") in [path for path, _ in events]
+    finally:
+        watcher.close()
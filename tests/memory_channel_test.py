@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from anacostia_pipeline.engine.constants import Status
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.resources.memory_channel import MemoryChannelNode
+
+
+# a consumer in another process attaches to a published block, reads it, and exits;
+# the block must outlive the consumer and be released by the publisher at the end of the run.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONSUMER = """
+import sys, json
+from anacostia_pipeline.resources.memory_channel import attach_shared_buffer
+view, shm = attach_shared_buffer(json.loads(sys.argv[1]))
+print(json.dumps({"content": bytes(view).decode("utf-8")}))
+del view
+shm.close()
+"""
+
+
+def create_channel():
+    metadata_store = InMemoryMetadataStore("metadata_store")
+    channel = MemoryChannelNode("channel", metadata_store, shared_memory=True)
+    metadata_store.successors = [channel]
+    metadata_store.setup()
+    channel.setup()
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    return metadata_store, channel
+
+
+def test_block_attached_by_another_process_is_released_by_publisher():
+    _, channel = create_channel()
+    descriptor = channel.publish("features", b"shared features")
+
+    result = subprocess.run(
+        [sys.executable, "-c", CONSUMER, json.dumps(descriptor)], capture_output=True, text=True, check=True, cwd=REPO_ROOT
+    )
+    assert json.loads(result.stdout.strip().splitlines()[-1])["content"] == "shared features"
+
+    # the consumer has exited, its resource tracker must not have unlinked the block
+    shm = SharedMemory(name=descriptor["shm_name"])
+    shm.close()
+
+    channel.on_run_end()
+    assert channel.status != Status.ERROR
+    assert channel.keys() == []
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=descriptor["shm_name"])
+
+
+def test_release_of_block_unlinked_elsewhere_does_not_fail():
+    _, channel = create_channel()
+    descriptor = channel.publish("features", b"shared features")
+
+    # another process unlinked the block first
+    shm = SharedMemory(name=descriptor["shm_name"])
+    shm.unlink()
+    shm.close()
+
+    channel.on_run_end()
+    assert channel.status != Status.ERROR
+    assert channel.keys() == []
@@ -0,0 +1,51 @@
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.resources.filesystem_store import FilesystemStoreNode
+
+
+# samples move between the indexes of the store when their state changes;
+# entries and pages must still be returned in id order, without skipping or repeating a sample.
+
+def create_store(tmp_path, num_samples: int = 3):
+    metadata_store = InMemoryMetadataStore("metadata_store")
+    data_store = FilesystemStoreNode("data_store", str(tmp_path / "data"), metadata_store, monitoring=False)
+    metadata_store.successors = [data_store]
+    metadata_store.setup()
+    data_store.setup()
+    for i in range(num_samples):
+        metadata_store.create_entry(data_store, str(tmp_path / "data" / f"file{i}.txt"))
+    return metadata_store, data_store
+
+
+def set_state(metadata_store: InMemoryMetadataStore, sample_id: int, state: str) -> None:
+    metadata_store.update_sample(metadata_store.tables["samples"][sample_id], state=state)
+
+
+def test_entries_stay_in_id_order_after_state_change(tmp_path):
+    metadata_store, data_store = create_store(tmp_path)
+    set_state(metadata_store, 3, "old")
+    set_state(metadata_store, 1, "old")
+
+    assert [entry["id"] for entry in metadata_store.get_entries(data_store)] == [1, 2, 3]
+    assert [entry["id"] for entry in metadata_store.get_entries(data_store, "old")] == [1, 3]
+
+
+def test_pages_with_state_changes_between_pages(tmp_path):
+    metadata_store, data_store = create_store(tmp_path)
+
+    seen = []
+    cursor = None
+    while True:
+        page = metadata_store.query_entries(data_store, after_id=cursor, limit=1)
+        seen.extend(entry["id"] for entry in page["rows"])
+        if page["next_cursor"] is None:
+            break
+        cursor = page["next_cursor"]
+        # the sample of the page moves to another state before the next page is read
+        set_state(metadata_store, cursor, "old")
+    assert seen == [1, 2, 3]
+
+    set_state(metadata_store, 2, "current")
+    page = metadata_store.query_entries(data_store, limit=2, descending=True)
+    assert [entry["id"] for entry in page["rows"]] == [3, 2]
+    page = metadata_store.query_entries(data_store, after_id=page["next_cursor"], limit=2, descending=True)
+    assert [entry["id"] for entry in page["rows"]] == [1]
@@ -0,0 +1,107 @@
+import os
+import time
+import shutil
+import logging
+from datetime import datetime
+
+from anacostia_pipeline.engine.base import BaseResourceNode
+from anacostia_pipeline.metadata.sql_metadata_store import SqliteMetadataStore, Node, Sample, Metric, scoped_session_manager
+
+
+# Compares the rows per second of the hot SqliteMetadataStore calls (which run on prebuilt SQLAlchemy Core statements)
+# against the ORM code path they replaced (query ORM objects, then convert each one with as_dict()).
+# Run with: python tests/metadata_benchmark.py
+
+benchmark_path = "./testing_artifacts/metadata_benchmark"
+NUM_SAMPLES = 5000
+NUM_LOOKUPS = 2000
+NUM_METRICS = 2000
+
+if os.path.exists(benchmark_path) is True:
+    shutil.rmtree(benchmark_path)
+os.makedirs(benchmark_path)
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class BenchmarkResourceNode(BaseResourceNode):
+    def __init__(self, name: str, metadata_store: SqliteMetadataStore) -> None:
+        super().__init__(name, benchmark_path, metadata_store, monitoring=False)
+
+
+# the ORM implementations of the hot calls, as they were before the Core fast path
+def orm_create_entry(store: SqliteMetadataStore, resource_node: BaseResourceNode, filepath: str) -> None:
+    with scoped_session_manager(store.session_factory, resource_node) as session:
+        node_id = session.query(Node).filter_by(name=resource_node.name).first().id
+        session.add(Sample(node_id=node_id, location=filepath, state="new"))
+        session.commit()
+
+def orm_entry_exists(store: SqliteMetadataStore, resource_node: BaseResourceNode, filepath: str) -> bool:
+    with scoped_session_manager(store.session_factory, resource_node) as session:
+        node_id = session.query(Node).filter_by(name=resource_node.name).first().id
+        return session.query(Sample).filter_by(node_id=node_id, location=filepath).count() > 0
+
+def orm_get_entries(store: SqliteMetadataStore, resource_node: BaseResourceNode, state: str):
+    with scoped_session_manager(store.session_factory, resource_node) as session:
+        node_id = session.query(Node).filter_by(name=resource_node.name).first().id
+        return [sample.as_dict() for sample in session.query(Sample).filter_by(node_id=node_id, state=state).all()]
+
+def orm_get_num_entries(store: SqliteMetadataStore, resource_node: BaseResourceNode, state: str) -> int:
+    with scoped_session_manager(store.session_factory, resource_node) as session:
+        node_id = session.query(Node).filter_by(name=resource_node.name).first().id
+        return session.query(Sample).filter_by(node_id=node_id, state=state).count()
+
+def orm_log_metrics(store: SqliteMetadataStore, **kwargs) -> None:
+    with scoped_session_manager(store.session_factory, store) as session:
+        run_id = store.get_run_id()
+        for key, value in kwargs.items():
+            session.add(Metric(run_id=run_id, key=key, value=value, wall_time=time.time()))
+        session.commit()
+
+
+def rows_per_second(func, num_rows: int) -> float:
+    start = time.perf_counter()
+    func()
+    return num_rows / (time.perf_counter() - start)
+
+def report(name: str, orm_rate: float, core_rate: float) -> None:
+    print(f"{name:<18} ORM {orm_rate:>12,.0f} rows/s    Core {core_rate:>12,.0f} rows/s    speedup {core_rate / orm_rate:5.1f}x")
+
+
+if __name__ == "__main__":
+    results = []
+    for path in ("orm", "core"):
+        store = SqliteMetadataStore(f"{path}_store", uri=f"sqlite:///{benchmark_path}/{path}.db")
+        node = BenchmarkResourceNode(f"{path}_node", store)
+        store.successors = [node]
+        store.setup()
+        store.create_resource_tracker(node)
+        store.start_run()
+
+        paths = [f"{benchmark_path}/file_{i}.txt" for i in range(NUM_SAMPLES)]
+        lookups = paths[-NUM_LOOKUPS:]
+
+        if path == "orm":
+            rates = {
+                "create_entry": rows_per_second(lambda: [orm_create_entry(store, node, p) for p in paths], NUM_SAMPLES),
+                "entry_exists": rows_per_second(lambda: [orm_entry_exists(store, node, p) for p in lookups], NUM_LOOKUPS),
+                "get_entries": rows_per_second(lambda: [orm_get_entries(store, node, "new") for _ in range(10)], 10 * NUM_SAMPLES),
+                "get_num_entries": rows_per_second(lambda: [orm_get_num_entries(store, node, "new") for _ in range(NUM_LOOKUPS)], NUM_LOOKUPS),
+                "log_metrics": rows_per_second(lambda: [orm_log_metrics(store, loss=float(i)) for i in range(NUM_METRICS)], NUM_METRICS),
+            }
+        else:
+            rates = {
+                "create_entry": rows_per_second(lambda: [store.create_entry(node, p) for p in paths], NUM_SAMPLES),
+                "entry_exists": rows_per_second(lambda: [store.entry_exists(node, p) for p in lookups], NUM_LOOKUPS),
+                "get_entries": rows_per_second(lambda: [store.get_entries(node, "new") for _ in range(10)], 10 * NUM_SAMPLES),
+                "get_num_entries": rows_per_second(lambda: [store.get_num_entries(node, "new") for _ in range(NUM_LOOKUPS)], NUM_LOOKUPS),
+                "log_metrics": rows_per_second(lambda: [store.log_metrics(loss=float(i)) for i in range(NUM_METRICS)], NUM_METRICS),
+            }
+
+        store.end_run()
+        store.on_exit()
+        results.append(rates)
+
+    print(f"SqliteMetadataStore hot paths ({datetime.now():%Y-%m-%d %H:%M:%S})")
+    for name in results[0]:
+        report(name, results[0][name], results[1][name])
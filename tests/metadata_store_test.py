@@ -0,0 +1,109 @@
+import pytest
+
+from anacostia_pipeline.metadata.memory_metadata_store import InMemoryMetadataStore
+from anacostia_pipeline.metadata.sql_metadata_store import SqliteMetadataStore
+from anacostia_pipeline.resources.filesystem_store import FilesystemStoreNode
+
+
+# every metadata store (and both state models of SqliteMetadataStore) must report the same states, pages, and changes.
+
+STORES = ["memory", "sqlite", "sqlite_run_range"]
+
+
+def create_store(kind: str, tmp_path, monkeypatch, **kwargs):
+    # the sqlite database is created relative to tmp_path
+    monkeypatch.chdir(tmp_path)
+    if kind == "memory":
+        metadata_store = InMemoryMetadataStore("metadata_store", **kwargs)
+    else:
+        state_model = "run_range" if kind == "sqlite_run_range" else "column"
+        metadata_store = SqliteMetadataStore("metadata_store", "sqlite:///db/metadata.db", state_model=state_model, **kwargs)
+
+    data_store = FilesystemStoreNode("data_store", str(tmp_path / "data"), metadata_store, monitoring=False)
+    metadata_store.successors = [data_store]
+    metadata_store.setup()
+    data_store.setup()
+    return metadata_store, data_store
+
+
+def run_two_runs(metadata_store, data_store, tmp_path) -> None:
+    def path(i: int) -> str:
+        return str(tmp_path / "data" / f"file{i}.txt")
+
+    for i in range(3):
+        metadata_store.create_entry(data_store, path(i))
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    metadata_store.create_entry(data_store, path(3), state="current", run_id=metadata_store.get_run_id())
+    metadata_store.create_entry(data_store, path(4))
+    metadata_store.add_end_time()
+    metadata_store.end_run()
+
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    metadata_store.create_entry(data_store, path(5))
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_sample_states_across_runs(kind, tmp_path, monkeypatch):
+    metadata_store, data_store = create_store(kind, tmp_path, monkeypatch)
+    run_two_runs(metadata_store, data_store, tmp_path)
+
+    expected = {"old": ([1, 2, 3, 4], 1), "current": ([5], 2), "new": ([6], None)}
+    for state, (ids, run_id) in expected.items():
+        entries = metadata_store.get_entries(data_store, state)
+        assert [entry["id"] for entry in entries] == ids
+        assert {entry["state"] for entry in entries} == {state}
+        assert {entry["run_id"] for entry in entries} == {run_id}
+        assert metadata_store.get_num_entries(data_store, state) == len(ids)
+    assert metadata_store.get_num_entries(data_store, "all") == 6
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_keyset_pages(kind, tmp_path, monkeypatch):
+    metadata_store, data_store = create_store(kind, tmp_path, monkeypatch)
+    run_two_runs(metadata_store, data_store, tmp_path)
+
+    for descending, expected in ((False, [1, 2, 3, 4, 5, 6]), (True, [6, 5, 4, 3, 2, 1])):
+        ids = []
+        cursor = None
+        while True:
+            page = metadata_store.query_entries(data_store, after_id=cursor, limit=4, descending=descending)
+            ids.extend(entry["id"] for entry in page["rows"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert ids == expected
+
+    page = metadata_store.query_entries(data_store, run_range=(2, 2))
+    assert [entry["id"] for entry in page["rows"]] == [5]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_change_feed_coalesces_metrics(kind, tmp_path, monkeypatch):
+    metadata_store, data_store = create_store(kind, tmp_path, monkeypatch)
+    metadata_store.start_run()
+    metadata_store.add_run_id()
+    cursor = metadata_store.latest_change_cursor()
+
+    metadata_store.log_metric_series("loss", [1.0 / (step + 1) for step in range(100)])
+    metadata_store.log_metrics(accuracy=0.9)
+    metadata_store.create_entry(data_store, str(tmp_path / "data" / "file0.txt"))
+
+    feed = metadata_store.changes_since(cursor)
+    assert [(change["table_name"], change["operation"]) for change in feed["changes"]] == [("metrics", "insert"), ("samples", "insert")]
+    assert metadata_store.changes_since(feed["cursor"])["changes"] == []
+    assert len(metadata_store.get_metric_series(metadata_store.get_run_id(), "loss")["value"]) == 100
+
+
+@pytest.mark.parametrize("kind", STORES)
+def test_change_log_is_pruned(kind, tmp_path, monkeypatch):
+    metadata_store, data_store = create_store(kind, tmp_path, monkeypatch, max_changes=5)
+    for i in range(20):
+        metadata_store.create_entry(data_store, str(tmp_path / "data" / f"file{i}.txt"))
+    metadata_store.prune_changes()
+
+    changes = metadata_store.changes_since(0)["changes"]
+    assert len(changes) == 5
+    assert changes[-1]["id"] == metadata_store.latest_change_cursor()